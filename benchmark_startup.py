@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark for PipePipe Metadata Tool
+
+Measures cold start: the wall time from launching the tool until its window
+has been drawn. The tool exits right after the first draw when the
+PIPEPIPE_STARTUP_BENCHMARK environment variable is set.
+
+Usage:
+  python benchmark_startup.py                     # run from source
+  python benchmark_startup.py <path to .exe>      # run a frozen build
+  python benchmark_startup.py --import-only       # module import only (no display needed)
+
+Options:
+  --runs N    Number of measured launches (default 10)
+"""
+
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def build_command(target, import_only):
+    """Return the command line that launches the tool once."""
+    if import_only:
+        return [sys.executable, '-c', 'import newpipe_metadata_tool']
+    if target:
+        return [target]
+    return [sys.executable, os.path.join(SCRIPT_DIR, 'newpipe_metadata_tool.py')]
+
+
+def measure(cmd, runs):
+    """Launch the command runs times and return the wall times in seconds."""
+    env = dict(os.environ, PIPEPIPE_STARTUP_BENCHMARK='1')
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = subprocess.run(cmd, cwd=SCRIPT_DIR, env=env, capture_output=True, text=True)
+        elapsed = time.perf_counter() - start
+        if result.returncode != 0:
+            raise RuntimeError(f"Launch failed: {result.stderr.strip()}")
+        timings.append(elapsed)
+    return timings
+
+
+def main():
+    """Run the startup benchmark and print a summary."""
+    args = sys.argv[1:]
+    import_only = '--import-only' in args
+    runs = 10
+    if '--runs' in args:
+        runs = int(args[args.index('--runs') + 1])
+    target = next((a for a in args if not a.startswith('--') and not a.isdigit()), None)
+
+    cmd = build_command(target, import_only)
+    print(f"Benchmarking startup: {' '.join(cmd)}")
+
+    # One warm-up launch so file system caches do not skew the first run
+    measure(cmd, 1)
+    timings = measure(cmd, runs)
+
+    print(f"  Runs:   {runs}")
+    print(f"  Min:    {min(timings) * 1000:.0f} ms")
+    print(f"  Median: {statistics.median(timings) * 1000:.0f} ms")
+    print(f"  Max:    {max(timings) * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
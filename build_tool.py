@@ -2,6 +2,12 @@
 """
 Build script for PipePipe Metadata Tool
 Creates a standalone executable using PyInstaller
+
+Usage: python build_tool.py [--onedir]
+
+The default profile builds a single-file executable (pipepipe_tool.spec).
+--onedir builds the lightweight profile (pipepipe_tool_onedir.spec): an
+uncompressed folder that starts without unpacking the bundle first.
 """
 
 import os
@@ -10,6 +16,13 @@ import subprocess
 import shutil
 from datetime import datetime
 
+# Build profiles: spec file and the executable it produces
+BUILD_PROFILES = {
+    'onefile': ('pipepipe_tool.spec', os.path.join('dist', 'PipePipe_Metadata_Tool.exe')),
+    'onedir': ('pipepipe_tool_onedir.spec',
+               os.path.join('dist', 'PipePipe_Metadata_Tool', 'PipePipe_Metadata_Tool.exe')),
+}
+
 def check_dependencies():
     """Check if required dependencies are installed"""
     print("Checking dependencies...")
@@ -52,12 +65,13 @@ def clean_build():
             shutil.rmtree(dir_name)
             print(f"  Removed: {dir_name}")
 
-def build_executable():
+def build_executable(profile='onefile'):
     """Build the executable using PyInstaller"""
-    print("Building executable...")
+    print(f"Building executable ({profile})...")
+    spec_file, exe_path = BUILD_PROFILES[profile]
     
     # Run PyInstaller
-    cmd = ['pyinstaller', 'pipepipe_tool.spec']
+    cmd = ['pyinstaller', spec_file]
     result = subprocess.run(cmd, capture_output=True, text=True)
     
     if result.returncode != 0:
@@ -69,7 +83,6 @@ def build_executable():
     print("✓ Build completed successfully!")
     
     # Check if executable was created
-    exe_path = os.path.join('dist', 'PipePipe_Metadata_Tool.exe')
     if os.path.exists(exe_path):
         size = os.path.getsize(exe_path)
         print(f"✓ Executable created: {exe_path} ({size:,} bytes)")
@@ -78,17 +91,24 @@ def build_executable():
         print("✗ Executable not found in expected location")
         return False
 
-def create_distribution():
+def create_distribution(profile='onefile'):
     """Create distribution package"""
     print("Creating distribution package...")
     
     timestamp = datetime.now().strftime("%Y%m%d")
-    dist_name = f"PipePipe_Metadata_Tool_v1.0_{timestamp}"
+    suffix = '_onedir' if profile == 'onedir' else ''
+    dist_name = f"PipePipe_Metadata_Tool_v1.0{suffix}_{timestamp}"
     
     # Create distribution directory
     dist_dir = f"dist/{dist_name}"
     os.makedirs(dist_dir, exist_ok=True)
     
+    # The one-dir build is a whole folder; copy it as-is
+    if profile == 'onedir':
+        shutil.copytree('dist/PipePipe_Metadata_Tool', f'{dist_dir}/PipePipe_Metadata_Tool',
+                        dirs_exist_ok=True)
+        print(f"  Copied: dist/PipePipe_Metadata_Tool -> {dist_dir}/PipePipe_Metadata_Tool")
+    
     # Copy files
     files_to_copy = [
         ('dist/PipePipe_Metadata_Tool.exe', f'{dist_dir}/PipePipe_Metadata_Tool.exe'),
@@ -124,6 +144,8 @@ def main():
     print("PipePipe Metadata Tool - Build Script")
     print("=" * 40)
     
+    profile = 'onedir' if '--onedir' in sys.argv[1:] else 'onefile'
+    
     # Check dependencies
     if not check_dependencies():
         print("\n✗ Build failed - missing dependencies")
@@ -133,19 +155,19 @@ def main():
     clean_build()
     
     # Build executable
-    if not build_executable():
+    if not build_executable(profile):
         print("\n✗ Build failed")
         sys.exit(1)
     
     # Create distribution
-    if not create_distribution():
+    if not create_distribution(profile):
         print("\n✗ Distribution creation failed")
         sys.exit(1)
     
     print("\n" + "=" * 40)
     print("✓ Build completed successfully!")
     print("\nFiles created:")
-    print("  - dist/PipePipe_Metadata_Tool.exe")
+    print(f"  - {BUILD_PROFILES[profile][1]}")
     print("  - dist/PipePipe_Metadata_Tool_v1.0_*.zip")
     print("\nReady for distribution!")
 
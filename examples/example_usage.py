@@ -8,9 +8,13 @@ import os
 import sys
 import tempfile
 import zipfile
-import sqlite3
-import subprocess
-import time
+
+# The tool's modules live in the repository root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from pipepipe_async import AsyncYtDlpResolver
+from pipepipe_stats import library_stats
+from pipepipe_update import update_streams
 
 def extract_backup(backup_file, work_dir):
     """Extract PipePipe backup to working directory"""
@@ -33,123 +37,30 @@ def extract_backup(backup_file, work_dir):
 
 def get_video_stats(db_path):
     """Get statistics about videos in the database"""
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    
-    # Total videos
-    cursor.execute("SELECT COUNT(*) FROM streams")
-    total_videos = cursor.fetchone()[0]
-    
-    # Videos needing metadata updates
-    cursor.execute("""
-        SELECT COUNT(DISTINCT s.uid)
-        FROM streams s 
-        JOIN playlist_stream_join psj ON s.uid = psj.stream_id 
-        JOIN playlists p ON psj.playlist_id = p.uid 
-        WHERE p.name IN ('Titta senare (PipePipe)', 'Videor som jag gillat (PipePipe)') 
-        AND s.title = 'YouTube Video' 
-        AND s.uploader = 'YouTube Creator'
-    """)
-    needs_update = cursor.fetchone()[0]
-    
-    conn.close()
+    # One aggregated pass; see pipepipe_stats for the full report
+    report = library_stats(db_path)
     
     return {
-        'total_videos': total_videos,
-        'needs_update': needs_update
+        'total_videos': report['streams']['total'],
+        'needs_update': report['streams']['needs_update'],
+        'duplicates': report['streams']['duplicate_rows'],
+        'orphans': report['streams']['orphans'],
+        'estimated_seconds': report['update_estimate']['seconds'],
     }
 
 def update_video_metadata(db_path, cookies_file=None, max_videos=None):
     """Update metadata for videos that need it"""
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    
-    query = """
-    SELECT DISTINCT s.uid, s.url, s.title, s.uploader 
-    FROM streams s 
-    JOIN playlist_stream_join psj ON s.uid = psj.stream_id 
-    JOIN playlists p ON psj.playlist_id = p.uid 
-    WHERE p.name IN ('Titta senare (PipePipe)', 'Videor som jag gillat (PipePipe)') 
-    AND s.title = 'YouTube Video' 
-    AND s.uploader = 'YouTube Creator'
-    ORDER BY s.uid
-    """
-    
-    if max_videos:
-        query += f" LIMIT {max_videos}"
-    
-    cursor.execute(query)
-    videos_to_update = cursor.fetchall()
-    
-    updated_count = 0
-    error_count = 0
-    
-    print(f"Found {len(videos_to_update)} videos to update")
-    
-    for i, (uid, url, old_title, old_uploader) in enumerate(videos_to_update, 1):
-        print(f"Processing {i}/{len(videos_to_update)}: {url}")
-        
-        try:
-            # Build yt-dlp command
-            cmd = [
-                'yt-dlp', 
-                '--print', 
-                '%(title)s|||%(uploader)s|||%(duration)s|||%(view_count)s|||%(upload_date)s|||%(thumbnail)s',
-                '--no-download', 
-                url
-            ]
-            
-            if cookies_file:
-                cmd.extend(['--cookies', cookies_file])
-            
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
-            
-            if result.returncode == 0:
-                output = result.stdout.strip()
-                parts = output.split('|||')
-                
-                if len(parts) >= 4:
-                    title = parts[0] if parts[0] and parts[0] != 'NA' else "YouTube Video"
-                    uploader = parts[1] if parts[1] and parts[1] != 'NA' else "YouTube Creator"
-                    duration = int(parts[2]) if parts[2] and parts[2] != 'NA' and parts[2].isdigit() else 0
-                    view_count = int(parts[3]) if parts[3] and parts[3] != 'NA' and parts[3].isdigit() else None
-                    upload_date = parts[4] if len(parts) > 4 and parts[4] and parts[4] != 'NA' else None
-                    thumbnail_url = parts[5] if len(parts) > 5 and parts[5] and parts[5] != 'NA' else None
-                    
-                    # Update database
-                    update_query = """
-                    UPDATE streams 
-                    SET title = ?, uploader = ?, duration = ?, view_count = ?, thumbnail_url = ?
-                    WHERE uid = ?
-                    """
-                    
-                    cursor.execute(update_query, (
-                        title, uploader, duration, view_count, thumbnail_url, uid
-                    ))
-                    
-                    updated_count += 1
-                    print(f"  ✓ Updated: {title[:50]}...")
-                else:
-                    error_count += 1
-                    print(f"  ✗ Invalid response format")
-            else:
-                error_count += 1
-                print(f"  ✗ yt-dlp error: {result.stderr.strip()[:100]}")
-                
-        except Exception as e:
-            error_count += 1
-            print(f"  ✗ Error: {str(e)}")
-        
-        conn.commit()
-        time.sleep(0.5)  # Rate limiting
-    
-    conn.close()
+    # Lookups run concurrently: one event loop drives several yt-dlp processes
+    resolver = AsyncYtDlpResolver(cookies_file=cookies_file)
+    result = update_streams(db_path, resolver, limit=max_videos)
     
     print(f"\nMetadata update complete:")
-    print(f"  Updated: {updated_count}")
-    print(f"  Errors: {error_count}")
+    print(f"  Updated: {result['updated']}")
+    print(f"  Errors: {result['errors']}")
+    for kind, count in sorted(result['error_kinds'].items()):
+        print(f"    {kind}: {count}")
     
-    return updated_count, error_count
+    return result['updated'], result['errors']
 
 def create_backup(work_dir, output_path):
     """Create new backup file"""
@@ -192,6 +103,9 @@ def main():
             print(f"\nDatabase statistics:")
             print(f"  Total videos: {stats['total_videos']}")
             print(f"  Need metadata update: {stats['needs_update']}")
+            print(f"  Duplicate rows: {stats['duplicates']}")
+            print(f"  Not in any playlist: {stats['orphans']}")
+            print(f"  Estimated update time: {stats['estimated_seconds']:.0f} s")
             
             if stats['needs_update'] == 0:
                 print("No videos need updating!")
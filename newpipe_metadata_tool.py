@@ -13,16 +13,14 @@ Version: 1.0
 """
 
 import tkinter as tk
-from tkinter import ttk, filedialog, messagebox, scrolledtext
-import zipfile
+from tkinter import ttk, scrolledtext
 import os
-import tempfile
-import shutil
-import subprocess
-import sqlite3
 import threading
 from datetime import datetime
-import sys
+
+# Heavier modules (zipfile, sqlite3, file dialogs and the pipepipe_* processing
+# modules) are imported inside the methods that use them, so the window can be
+# shown before they are loaded.
 
 # Language texts
 LANGUAGES = {
@@ -32,11 +30,24 @@ LANGUAGES = {
         'files': 'Files',
         'backup_label': 'PipePipe Backup (.zip):',
         'cookies_label': 'Cookies.txt (optional):',
+        'old_backup_label': 'Older backup (optional):',
+        'workspace_label': 'Work folder (optional):',
         'browse': 'Browse',
         'actions': 'Actions',
         'update_metadata': '🔄 Update Metadata',
         'clean_unavailable': '🧹 Clean Unavailable',
         'do_both': '✨ Do Both',
+        'group_by_channel': 'Look up videos per channel (fewer requests)',
+        'merge_duplicates': 'Merge duplicate videos (same video under several URLs)',
+        'time_budget_label': 'Time limit in minutes (optional):',
+        'skip_unchanged': 'Skip videos unchanged since an earlier run',
+        'fingerprint_result': '✓ {} videos unchanged since an earlier run, not looked up again',
+        'cache_result': '✓ {} videos filled from the metadata cache',
+        'library_summary': '📊 {} videos, {} need metadata, {} duplicate rows, estimated lookup time {} min',
+        'budget_skipped': '⏱ Time limit reached, {} videos left for the next run',
+        'pause': '⏸ Pause',
+        'resume': '▶ Resume',
+        'cancel': '⏹ Cancel',
         'status': 'Status',
         'ready': 'Ready to start',
         'language': 'Language:',
@@ -44,28 +55,46 @@ LANGUAGES = {
         'upload_backup': 'Upload your backup.zip to begin.',
         'backup_selected': 'Backup selected: {}',
         'cookies_selected': 'Cookies selected: {}',
+        'old_backup_selected': 'Older backup selected: {}',
+        'merging_old_backup': 'Copying known metadata from older backup...',
+        'merge_result': '✓ {} videos filled from older backup, {} left for online update',
+        'dedup_result': '✓ {} duplicate rows merged into {} videos',
+        'merge_error': '✗ Could not merge older backup: {}',
         'select_backup_first': 'Select a backup file first!',
         'error': 'Error',
         'creating_workdir': 'Creating work directory: {}',
+        'reusing_workdir': 'Reusing work directory from an earlier run: {}',
+        'workspace_selected': 'Work folder selected: {}',
         'db_not_found': 'PipePipe.db not found in backup!',
         'settings_not_found': 'PipePipe.settings not found in backup!',
         'backup_extracted': '✓ Backup extracted successfully',
         'extract_error': 'Could not extract backup: {}',
+        'backup_checked': '✓ Backup checked ({:.1f} s)',
+        'backup_invalid': 'The backup failed its integrity check:\n{}',
         'updating_metadata': 'Updating metadata...',
         'metadata_updated': '✓ Metadata updated successfully!',
         'update_error': '✗ Error during update:',
         'cleaning_unavailable': 'Cleaning unavailable videos...',
         'unavailable_removed': '✓ {} unavailable videos removed!',
         'clean_error': '✗ Error: {}',
+        'cancelling': 'Cancelling, finishing current step...',
+        'paused': 'Paused',
+        'resumed': 'Resumed',
+        'update_cancelled': 'Update cancelled after {} videos. Run it again on the same backup to continue from here.',
+        'clean_cancelled': 'Cleanup cancelled, no videos were removed',
+        'backup_cancelled': 'Backup cancelled, no file was written',
         'done': 'Done',
         'full_processing': 'Starting full processing...',
         'save_backup': 'Save updated backup',
         'backup_saved': '✓ Backup saved: {}',
         'backup_save_error': '✗ Error creating backup: {}',
+        'saved_backup_invalid': '✗ The written backup failed its integrity check and was removed:\n{}',
         'finished': 'Finished!',
         'backup_saved_msg': 'Updated backup saved:\n{}',
         'select_pipepipe_backup': 'Select PipePipe backup',
         'select_cookies': 'Select cookies.txt',
+        'select_old_backup': 'Select older PipePipe backup',
+        'select_workspace': 'Select work folder',
         'zip_files': 'ZIP files',
         'text_files': 'Text files',
         'all_files': 'All files'
@@ -76,11 +105,24 @@ LANGUAGES = {
         'files': 'Filer',
         'backup_label': 'PipePipe Backup (.zip):',
         'cookies_label': 'Cookies.txt (valfritt):',
+        'old_backup_label': 'Äldre backup (valfritt):',
+        'workspace_label': 'Arbetsmapp (valfritt):',
         'browse': 'Bläddra',
         'actions': 'Åtgärder',
         'update_metadata': '🔄 Uppdatera Metadata',
         'clean_unavailable': '🧹 Rensa Otillgängliga',
         'do_both': '✨ Gör Båda',
+        'group_by_channel': 'Hämta videor per kanal (färre anrop)',
+        'merge_duplicates': 'Slå ihop dubbletter (samma video under flera adresser)',
+        'time_budget_label': 'Tidsgräns i minuter (valfritt):',
+        'skip_unchanged': 'Hoppa över videor som är oförändrade sedan en tidigare körning',
+        'fingerprint_result': '✓ {} videor oförändrade sedan en tidigare körning, hämtas inte igen',
+        'cache_result': '✓ {} videor fyllda från metadatacachen',
+        'library_summary': '📊 {} videor, {} saknar metadata, {} dubblettrader, uppskattad hämtningstid {} min',
+        'budget_skipped': '⏱ Tidsgränsen nådd, {} videor kvar till nästa körning',
+        'pause': '⏸ Pausa',
+        'resume': '▶ Fortsätt',
+        'cancel': '⏹ Avbryt',
         'status': 'Status',
         'ready': 'Redo att börja',
         'language': 'Språk:',
@@ -88,28 +130,46 @@ LANGUAGES = {
         'upload_backup': 'Ladda upp din backup.zip för att börja.',
         'backup_selected': 'Backup vald: {}',
         'cookies_selected': 'Cookies vald: {}',
+        'old_backup_selected': 'Äldre backup vald: {}',
+        'merging_old_backup': 'Kopierar känd metadata från äldre backup...',
+        'merge_result': '✓ {} videor fyllda från äldre backup, {} kvar för onlineuppdatering',
+        'dedup_result': '✓ {} dubblettrader sammanslagna till {} videor',
+        'merge_error': '✗ Kunde inte slå ihop äldre backup: {}',
         'select_backup_first': 'Välj en backup-fil först!',
         'error': 'Fel',
         'creating_workdir': 'Skapar arbetsmapp: {}',
+        'reusing_workdir': 'Återanvänder arbetsmapp från en tidigare körning: {}',
+        'workspace_selected': 'Arbetsmapp vald: {}',
         'db_not_found': 'PipePipe.db hittades inte i backup!',
         'settings_not_found': 'PipePipe.settings hittades inte i backup!',
         'backup_extracted': '✓ Backup extraherad framgångsrikt',
         'extract_error': 'Kunde inte extrahera backup: {}',
+        'backup_checked': '✓ Backup kontrollerad ({:.1f} s)',
+        'backup_invalid': 'Backupen klarade inte integritetskontrollen:\n{}',
         'updating_metadata': 'Uppdaterar metadata...',
         'metadata_updated': '✓ Metadata uppdaterad framgångsrikt!',
         'update_error': '✗ Fel vid uppdatering:',
         'cleaning_unavailable': 'Rensar otillgängliga videor...',
         'unavailable_removed': '✓ {} otillgängliga videor borttagna!',
         'clean_error': '✗ Fel: {}',
+        'cancelling': 'Avbryter, slutför pågående steg...',
+        'paused': 'Pausad',
+        'resumed': 'Fortsätter',
+        'update_cancelled': 'Uppdatering avbruten efter {} videor. Kör igen på samma backup för att fortsätta härifrån.',
+        'clean_cancelled': 'Rensning avbruten, inga videor togs bort',
+        'backup_cancelled': 'Backup avbruten, ingen fil skrevs',
         'done': 'Klar',
         'full_processing': 'Startar fullständig bearbetning...',
         'save_backup': 'Spara uppdaterad backup',
         'backup_saved': '✓ Backup sparad: {}',
         'backup_save_error': '✗ Fel vid skapande av backup: {}',
+        'saved_backup_invalid': '✗ Den skrivna backupen klarade inte integritetskontrollen och togs bort:\n{}',
         'finished': 'Klart!',
         'backup_saved_msg': 'Uppdaterad backup sparad:\n{}',
         'select_pipepipe_backup': 'Välj PipePipe backup',
         'select_cookies': 'Välj cookies.txt',
+        'select_old_backup': 'Välj äldre PipePipe backup',
+        'select_workspace': 'Välj arbetsmapp',
         'zip_files': 'ZIP filer',
         'text_files': 'Text filer',
         'all_files': 'Alla filer'
@@ -128,7 +188,7 @@ class PipePipeMetadataTool:
         """Initialize the application with the main window."""
         self.root = root
         self.root.title("PipePipe Metadata Tool")
-        self.root.geometry("600x500")
+        self.root.geometry("600x650")
         self.root.configure(bg='#f0f0f0')
         
         # Language settings - defaults to English
@@ -137,8 +197,17 @@ class PipePipeMetadataTool:
         # File path variables
         self.backup_file = tk.StringVar()
         self.cookies_file = tk.StringVar()
+        self.old_backup_file = tk.StringVar()
+        self.workspace_dir = tk.StringVar()
+        self.group_by_channel = tk.BooleanVar(value=False)
+        self.merge_duplicates = tk.BooleanVar(value=False)
+        self.time_budget = tk.StringVar()
+        self.skip_unchanged = tk.BooleanVar(value=False)
         self.working_dir = None
         
+        # Cancel/pause control of the running operation
+        self.control = None
+        
         # UI components that need updating when language changes
         self.ui_components = {}
         
@@ -173,10 +242,18 @@ class PipePipeMetadataTool:
             self.ui_components['backup_label'].config(text=self.get_text('backup_label'))
         if 'cookies_label' in self.ui_components:
             self.ui_components['cookies_label'].config(text=self.get_text('cookies_label'))
+        if 'old_backup_label' in self.ui_components:
+            self.ui_components['old_backup_label'].config(text=self.get_text('old_backup_label'))
         if 'browse_backup_btn' in self.ui_components:
             self.ui_components['browse_backup_btn'].config(text=self.get_text('browse'))
         if 'browse_cookies_btn' in self.ui_components:
             self.ui_components['browse_cookies_btn'].config(text=self.get_text('browse'))
+        if 'workspace_label' in self.ui_components:
+            self.ui_components['workspace_label'].config(text=self.get_text('workspace_label'))
+        if 'browse_workspace_btn' in self.ui_components:
+            self.ui_components['browse_workspace_btn'].config(text=self.get_text('browse'))
+        if 'browse_old_backup_btn' in self.ui_components:
+            self.ui_components['browse_old_backup_btn'].config(text=self.get_text('browse'))
         if 'action_frame' in self.ui_components:
             self.ui_components['action_frame'].config(text=self.get_text('actions'))
         if 'update_btn' in self.ui_components:
@@ -185,6 +262,19 @@ class PipePipeMetadataTool:
             self.ui_components['clean_btn'].config(text=self.get_text('clean_unavailable'))
         if 'both_btn' in self.ui_components:
             self.ui_components['both_btn'].config(text=self.get_text('do_both'))
+        if 'pause_btn' in self.ui_components:
+            paused = self.control is not None and self.control.paused
+            self.ui_components['pause_btn'].config(text=self.get_text('resume' if paused else 'pause'))
+        if 'cancel_btn' in self.ui_components:
+            self.ui_components['cancel_btn'].config(text=self.get_text('cancel'))
+        if 'group_by_channel_check' in self.ui_components:
+            self.ui_components['group_by_channel_check'].config(text=self.get_text('group_by_channel'))
+        if 'merge_duplicates_check' in self.ui_components:
+            self.ui_components['merge_duplicates_check'].config(text=self.get_text('merge_duplicates'))
+        if 'skip_unchanged_check' in self.ui_components:
+            self.ui_components['skip_unchanged_check'].config(text=self.get_text('skip_unchanged'))
+        if 'time_budget_label' in self.ui_components:
+            self.ui_components['time_budget_label'].config(text=self.get_text('time_budget_label'))
         if 'status_label' in self.ui_components:
             self.ui_components['status_label'].config(text=self.get_text('ready'))
         if 'log_frame' in self.ui_components:
@@ -244,6 +334,28 @@ class PipePipeMetadataTool:
                   command=self.browse_cookies)
         self.ui_components['browse_cookies_btn'].pack(side='left')
         
+        # Older backup selection (optional, used as offline metadata source)
+        old_backup_row = ttk.Frame(self.ui_components['file_frame'])
+        old_backup_row.pack(fill='x', pady=5)
+        
+        self.ui_components['old_backup_label'] = ttk.Label(old_backup_row, text=self.get_text('old_backup_label'))
+        self.ui_components['old_backup_label'].pack(side='left')
+        ttk.Entry(old_backup_row, textvariable=self.old_backup_file, width=40).pack(side='left', padx=5)
+        self.ui_components['browse_old_backup_btn'] = ttk.Button(old_backup_row, text=self.get_text('browse'), 
+                  command=self.browse_old_backup)
+        self.ui_components['browse_old_backup_btn'].pack(side='left')
+        
+        # Work folder selection (optional, e.g. a RAM disk or fast SSD)
+        workspace_row = ttk.Frame(self.ui_components['file_frame'])
+        workspace_row.pack(fill='x', pady=5)
+        
+        self.ui_components['workspace_label'] = ttk.Label(workspace_row, text=self.get_text('workspace_label'))
+        self.ui_components['workspace_label'].pack(side='left')
+        ttk.Entry(workspace_row, textvariable=self.workspace_dir, width=40).pack(side='left', padx=5)
+        self.ui_components['browse_workspace_btn'] = ttk.Button(workspace_row, text=self.get_text('browse'), 
+                  command=self.browse_workspace)
+        self.ui_components['browse_workspace_btn'].pack(side='left')
+        
         # Actions section
         self.ui_components['action_frame'] = ttk.LabelFrame(self.root, text=self.get_text('actions'), padding=10)
         self.ui_components['action_frame'].pack(fill='x', padx=20, pady=10)
@@ -264,10 +376,45 @@ class PipePipeMetadataTool:
                                   command=self.do_both, width=20)
         self.ui_components['both_btn'].pack(side='left', padx=5, pady=5)
         
+        # Cancel/pause for the running operation
+        control_frame = ttk.Frame(self.ui_components['action_frame'])
+        control_frame.pack()
+        
+        self.ui_components['pause_btn'] = ttk.Button(control_frame, text=self.get_text('pause'), 
+                                   command=self.toggle_pause, width=20, state='disabled')
+        self.ui_components['pause_btn'].pack(side='left', padx=5, pady=5)
+        
+        self.ui_components['cancel_btn'] = ttk.Button(control_frame, text=self.get_text('cancel'), 
+                                    command=self.cancel_operation, width=20, state='disabled')
+        self.ui_components['cancel_btn'].pack(side='left', padx=5, pady=5)
+        
+        # Update options
+        self.ui_components['group_by_channel_check'] = ttk.Checkbutton(
+            self.ui_components['action_frame'], text=self.get_text('group_by_channel'),
+            variable=self.group_by_channel)
+        self.ui_components['group_by_channel_check'].pack(anchor='w')
+        self.ui_components['merge_duplicates_check'] = ttk.Checkbutton(
+            self.ui_components['action_frame'], text=self.get_text('merge_duplicates'),
+            variable=self.merge_duplicates)
+        self.ui_components['merge_duplicates_check'].pack(anchor='w')
+        self.ui_components['skip_unchanged_check'] = ttk.Checkbutton(
+            self.ui_components['action_frame'], text=self.get_text('skip_unchanged'),
+            variable=self.skip_unchanged)
+        self.ui_components['skip_unchanged_check'].pack(anchor='w')
+        
+        # Time limit for lookups; the most visible videos are looked up first
+        time_budget_row = ttk.Frame(self.ui_components['action_frame'])
+        time_budget_row.pack(anchor='w', pady=(5, 0))
+        self.ui_components['time_budget_label'] = ttk.Label(time_budget_row, text=self.get_text('time_budget_label'))
+        self.ui_components['time_budget_label'].pack(side='left')
+        ttk.Entry(time_budget_row, textvariable=self.time_budget, width=6).pack(side='left', padx=5)
+        
         # Store button references for state management
         self.update_btn = self.ui_components['update_btn']
         self.clean_btn = self.ui_components['clean_btn']
         self.both_btn = self.ui_components['both_btn']
+        self.pause_btn = self.ui_components['pause_btn']
+        self.cancel_btn = self.ui_components['cancel_btn']
         
         # Progress bar for long-running operations
         self.progress = ttk.Progressbar(self.root, mode='indeterminate')
@@ -300,6 +447,8 @@ class PipePipeMetadataTool:
         
     def browse_backup(self):
         """Browse for a PipePipe backup file."""
+        from tkinter import filedialog
+
         filename = filedialog.askopenfilename(
             title=self.get_text('select_pipepipe_backup'),
             filetypes=[(self.get_text('zip_files'), "*.zip"), (self.get_text('all_files'), "*.*")]
@@ -310,6 +459,8 @@ class PipePipeMetadataTool:
             
     def browse_cookies(self):
         """Browse for a cookies.txt file (optional for bypassing restrictions)."""
+        from tkinter import filedialog
+
         filename = filedialog.askopenfilename(
             title=self.get_text('select_cookies'),
             filetypes=[(self.get_text('text_files'), "*.txt"), (self.get_text('all_files'), "*.*")]
@@ -318,46 +469,148 @@ class PipePipeMetadataTool:
             self.cookies_file.set(filename)
             self.log(self.get_text('cookies_selected').format(os.path.basename(filename)))
             
+    def browse_old_backup(self):
+        """Browse for an older PipePipe backup to copy known metadata from."""
+        from tkinter import filedialog
+
+        filename = filedialog.askopenfilename(
+            title=self.get_text('select_old_backup'),
+            filetypes=[(self.get_text('zip_files'), "*.zip"), (self.get_text('all_files'), "*.*")]
+        )
+        if filename:
+            self.old_backup_file.set(filename)
+            self.log(self.get_text('old_backup_selected').format(os.path.basename(filename)))
+            
+    def browse_workspace(self):
+        """Browse for the folder working copies are kept in."""
+        from tkinter import filedialog
+
+        dirname = filedialog.askdirectory(title=self.get_text('select_workspace'))
+        if dirname:
+            self.workspace_dir.set(dirname)
+            self.log(self.get_text('workspace_selected').format(dirname))
+            
+    def get_time_budget(self):
+        """Return the time limit in seconds, or None when no valid limit is entered."""
+        try:
+            minutes = float(self.time_budget.get().replace(',', '.'))
+        except ValueError:
+            return None
+        return minutes * 60 if minutes > 0 else None
+        
+    def open_fingerprints(self):
+        """Return the fingerprint store in the work folder root, or None when not enabled."""
+        from pipepipe_fingerprint import FingerprintStore
+
+        if not self.skip_unchanged.get():
+            return None
+        return FingerprintStore.in_directory(self.get_workspace_manager().root)
+        
+    def get_workspace_manager(self):
+        """Return the workspace manager for the selected (or default) work folder."""
+        from pipepipe_workspace import WorkspaceManager
+
+        return WorkspaceManager(self.workspace_dir.get() or None)
+        
     def extract_backup(self):
-        """Extract the backup file to a temporary working directory."""
+        """Extract the backup file to its working directory (reused for the same backup)."""
+        from tkinter import messagebox
+        from pipepipe_validate import validate_backup
+
         if not self.backup_file.get():
             messagebox.showerror(self.get_text('error'), self.get_text('select_backup_first'))
             return False
             
         try:
-            # Create temporary working directory
-            self.working_dir = tempfile.mkdtemp()
-            self.log(self.get_text('creating_workdir').format(self.working_dir))
+            workspaces = self.get_workspace_manager()
+            # The work folder stays leased until another backup is extracted
+            if self.working_dir:
+                workspaces.release(self.working_dir)
+                self.working_dir = None
+            self.working_dir, reused = workspaces.acquire(self.backup_file.get())
+            if reused:
+                self.log(self.get_text('reusing_workdir').format(self.working_dir))
+            else:
+                self.log(self.get_text('creating_workdir').format(self.working_dir))
+                self.log(self.get_text('backup_extracted'))
+
+            # Extraction verified the CRCs; check the settings and the working database
+            report = validate_backup(self.backup_file.get(),
+                                     db_path=os.path.join(self.working_dir, 'PipePipe.db'),
+                                     check_crc=False)
+            if not report['ok']:
+                workspaces.discard(self.working_dir)
+                self.working_dir = None
+                messagebox.showerror(self.get_text('error'),
+                                     self.get_text('backup_invalid').format('\n'.join(report['problems'])))
+                return False
+            self.log(self.get_text('backup_checked').format(report['seconds']))
+            return True
             
-            # Extract backup file
-            with zipfile.ZipFile(self.backup_file.get(), 'r') as zip_ref:
-                zip_ref.extractall(self.working_dir)
-                
+        except FileNotFoundError as e:
             # Verify required files exist
-            db_path = os.path.join(self.working_dir, 'PipePipe.db')
-            settings_path = os.path.join(self.working_dir, 'PipePipe.settings')
-            
-            if not os.path.exists(db_path):
+            if e.filename == 'PipePipe.db':
                 messagebox.showerror(self.get_text('error'), self.get_text('db_not_found'))
-                return False
-                
-            if not os.path.exists(settings_path):
+            elif e.filename == 'PipePipe.settings':
                 messagebox.showerror(self.get_text('error'), self.get_text('settings_not_found'))
-                return False
-                
-            self.log(self.get_text('backup_extracted'))
-            return True
+            else:
+                messagebox.showerror(self.get_text('error'), self.get_text('extract_error').format(str(e)))
+            return False
             
         except Exception as e:
             messagebox.showerror(self.get_text('error'), self.get_text('extract_error').format(str(e)))
             return False
             
+    def extract_old_database(self):
+        """Extract PipePipe.db from the older backup; returns its path, or None."""
+        import zipfile
+
+        if not self.old_backup_file.get():
+            return None
+            
+        try:
+            self.log(self.get_text('merging_old_backup'))
+            
+            # Only the database is needed from the older backup
+            old_dir = os.path.join(self.working_dir, 'older_backup')
+            with zipfile.ZipFile(self.old_backup_file.get(), 'r') as zip_ref:
+                zip_ref.extract('PipePipe.db', old_dir)
+            return os.path.join(old_dir, 'PipePipe.db')
+            
+        except Exception as e:
+            self.log(self.get_text('merge_error').format(str(e)))
+            return None
+            
+    def merge_old_backup(self):
+        """Fill placeholder metadata from the older backup, if one is selected."""
+        from pipepipe_merge import merge_databases
+
+        source_db = self.extract_old_database()
+        if not source_db:
+            return
+            
+        try:
+            report = merge_databases(os.path.join(self.working_dir, 'PipePipe.db'), source_db)
+            self.log(self.get_text('merge_result').format(report['filled'], len(report['unfilled'])))
+            
+        except Exception as e:
+            self.log(self.get_text('merge_error').format(str(e)))
+            
     def update_metadata(self):
         """Start metadata update process in background thread."""
         self.run_in_background(self._update_metadata)
         
     def _update_metadata(self):
         """Update video metadata using yt-dlp (runs in background thread)."""
+        from pipepipe_cache import MetadataCache
+        from pipepipe_dedup import consolidate_duplicates
+        from pipepipe_routing import ServiceRouter
+        from pipepipe_search import update_index
+        from pipepipe_session import create_resolver
+        from pipepipe_stats import record_throughput
+        from pipepipe_update import update_streams
+        from pipepipe_workspace import open_database, save_database
+
         if not self.extract_backup():
             return
             
@@ -365,123 +618,55 @@ class PipePipeMetadataTool:
             self.update_status(self.get_text('updating_metadata'))
             self.progress.start()
             
-            # Create metadata update script dynamically
-            update_script = """
-import sqlite3
-import subprocess
-import time
-from datetime import datetime
-
-def get_video_metadata(url, cookies_file=None):
-    \"\"\"Fetch video metadata using yt-dlp.\"\"\"
-    try:
-        cmd = ['yt-dlp', '--print', '%(title)s|||%(uploader)s|||%(duration)s|||%(view_count)s|||%(upload_date)s|||%(thumbnail)s', '--no-download', url]
-        if cookies_file:
-            cmd.extend(['--cookies', cookies_file])
-            
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
-        
-        if result.returncode == 0:
-            output = result.stdout.strip()
-            parts = output.split('|||')
-            
-            if len(parts) >= 4:
-                title = parts[0] if parts[0] and parts[0] != 'NA' else "YouTube Video"
-                uploader = parts[1] if parts[1] and parts[1] != 'NA' else "YouTube Creator"
-                duration = int(parts[2]) if parts[2] and parts[2] != 'NA' and parts[2].isdigit() else 0
-                view_count = int(parts[3]) if parts[3] and parts[3] != 'NA' and parts[3].isdigit() else None
-                upload_date = parts[4] if len(parts) > 4 and parts[4] and parts[4] != 'NA' else None
-                thumbnail_url = parts[5] if len(parts) > 5 and parts[5] and parts[5] != 'NA' else None
-                
-                return {
-                    'title': title,
-                    'uploader': uploader,
-                    'duration': duration,
-                    'view_count': view_count,
-                    'upload_date': upload_date,
-                    'thumbnail_url': thumbnail_url
-                }
-        return None
-    except:
-        return None
-
-# Update database with fresh metadata
-conn = sqlite3.connect('PipePipe.db')
-cursor = conn.cursor()
-
-# Find videos in local playlists that need metadata updates
-query = \"\"\"
-SELECT DISTINCT s.uid, s.url, s.title, s.uploader 
-FROM streams s 
-JOIN playlist_stream_join psj ON s.uid = psj.stream_id 
-JOIN playlists p ON psj.playlist_id = p.uid 
-WHERE p.name IN ('Titta senare (PipePipe)', 'Videor som jag gillat (PipePipe)') 
-AND s.title = 'YouTube Video' 
-AND s.uploader = 'YouTube Creator'
-ORDER BY s.uid
-\"\"\"
-
-cursor.execute(query)
-videos_to_update = cursor.fetchall()
-
-updated_count = 0
-error_count = 0
-cookies_file = COOKIES_FILE_PLACEHOLDER
-
-for uid, url, old_title, old_uploader in videos_to_update:
-    metadata = get_video_metadata(url, cookies_file)
-    
-    if metadata:
-        update_query = \"\"\"
-        UPDATE streams 
-        SET title = ?, uploader = ?, duration = ?, view_count = ?, thumbnail_url = ?
-        WHERE uid = ?
-        \"\"\"
-        
-        cursor.execute(update_query, (
-            metadata['title'],
-            metadata['uploader'], 
-            metadata['duration'],
-            metadata['view_count'],
-            metadata['thumbnail_url'],
-            uid
-        ))
-        
-        updated_count += 1
-    else:
-        error_count += 1
-    
-    conn.commit()
-    time.sleep(0.5)  # Rate limiting
-
-conn.close()
-
-print(f"Updated: {updated_count}, Errors: {error_count}")
-"""
+            # Offline pass first, so only the remainder is fetched online
+            self.merge_old_backup()
             
-            # Configure cookies file path in script
-            cookies_placeholder = "None"
-            if self.cookies_file.get():
-                cookies_placeholder = f"'{self.cookies_file.get()}'"
-            update_script = update_script.replace("COOKIES_FILE_PLACEHOLDER", cookies_placeholder)
+            # Small databases are updated in memory and written back once
+            db_path = os.path.join(self.working_dir, 'PipePipe.db')
+            conn = open_database(db_path)
+            fingerprints = self.open_fingerprints()
+            cache = MetadataCache.in_directory(self.get_workspace_manager().root)
+            # The cookies file is read once and shared by all lookups
+            resolver = ServiceRouter(create_resolver(self.cookies_file.get() or None))
+            try:
+                # One row per video, so each video is only looked up once
+                if self.merge_duplicates.get():
+                    dedup = consolidate_duplicates(conn, control=self.control)
+                    if dedup:
+                        self.log(self.get_text('dedup_result').format(dedup['removed'], dedup['videos']))
+                result = update_streams(conn, resolver,
+                                        group_by_channel=self.group_by_channel.get(),
+                                        time_budget=self.get_time_budget(),
+                                        fingerprints=fingerprints, cache=cache,
+                                        log=self.log, control=self.control)
+                save_database(conn, db_path)
+            finally:
+                conn.close()
+                cache.close()
+                resolver.close()
+                if fingerprints:
+                    fingerprints.close()
+            # Measured lookup speed feeds the update time estimate of the statistics report
+            record_throughput(result, self.get_workspace_manager().root)
+            update_index(db_path)
             
-            # Write and execute the update script
-            script_path = os.path.join(self.working_dir, 'update_script.py')
-            with open(script_path, 'w', encoding='utf-8') as f:
-                f.write(update_script)
+            if result['cancelled']:
+                # What was resolved stays in the work folder, which the next run reuses
+                self.log(self.get_text('update_cancelled').format(result['updated']))
+                return
                 
-            # Run the script
-            result = subprocess.run([sys.executable, script_path], 
-                                  cwd=self.working_dir, 
-                                  capture_output=True, 
-                                  text=True)
-            
-            if result.returncode == 0:
-                self.log(self.get_text('metadata_updated'))
-                self.log(result.stdout)
-            else:
-                self.log(self.get_text('update_error'))
-                self.log(result.stderr)
+            self.log(self.get_text('metadata_updated'))
+            self.log(f"Updated: {result['updated']}, Errors: {result['errors']}, "
+                     f"Lookups: {result['resolver_calls']}, Retries: {result['retries']}")
+            if result['error_kinds']:
+                self.log("Errors by type: " + ", ".join(
+                    f"{kind}: {count}" for kind, count in sorted(result['error_kinds'].items())))
+            if result['skipped']:
+                self.log(self.get_text('budget_skipped').format(result['skipped']))
+            if result['from_fingerprints']:
+                self.log(self.get_text('fingerprint_result').format(result['from_fingerprints']))
+            if result['from_cache']:
+                self.log(self.get_text('cache_result').format(result['from_cache']))
                 
         except Exception as e:
             self.log(f"{self.get_text('update_error')} {str(e)}")
@@ -495,6 +680,8 @@ print(f"Updated: {updated_count}, Errors: {error_count}")
         
     def _clean_unavailable(self):
         """Remove unavailable videos from local playlists (runs in background thread)."""
+        from pipepipe_clean import clean_unavailable
+
         if not self.extract_backup():
             return
             
@@ -502,53 +689,14 @@ print(f"Updated: {updated_count}, Errors: {error_count}")
             self.update_status(self.get_text('cleaning_unavailable'))
             self.progress.start()
             
-            # Connect to database
-            db_path = os.path.join(self.working_dir, 'PipePipe.db')
-            conn = sqlite3.connect(db_path)
-            cursor = conn.cursor()
-            
-            # Find videos that couldn't be updated (still have default metadata)
-            query = '''
-            SELECT DISTINCT s.uid, s.url
-            FROM streams s 
-            JOIN playlist_stream_join psj ON s.uid = psj.stream_id 
-            JOIN playlists p ON psj.playlist_id = p.uid 
-            WHERE p.name IN ('Titta senare (PipePipe)', 'Videor som jag gillat (PipePipe)') 
-            AND s.title = 'YouTube Video' 
-            AND s.uploader = 'YouTube Creator'
-            '''
-            
-            cursor.execute(query)
-            videos_to_remove = cursor.fetchall()
-            
-            removed_count = 0
-            
-            for uid, url in videos_to_remove:
-                # Remove from local playlists only
-                delete_query = '''
-                DELETE FROM playlist_stream_join 
-                WHERE stream_id = ? 
-                AND playlist_id IN (
-                    SELECT uid FROM playlists 
-                    WHERE name IN ('Titta senare (PipePipe)', 'Videor som jag gillat (PipePipe)')
-                )
-                '''
-                cursor.execute(delete_query, (uid,))
-                
-                # Check if video is used in other playlists
-                check_query = 'SELECT COUNT(*) FROM playlist_stream_join WHERE stream_id = ?'
-                cursor.execute(check_query, (uid,))
-                remaining_references = cursor.fetchone()[0]
-                
-                # Only delete from streams table if not referenced elsewhere
-                if remaining_references == 0:
-                    cursor.execute('DELETE FROM streams WHERE uid = ?', (uid,))
-                    
-                removed_count += 1
-                conn.commit()
-                
-            conn.close()
+            # Videos that couldn't be updated (still have default metadata)
+            removed_count = clean_unavailable(os.path.join(self.working_dir, 'PipePipe.db'),
+                                              control=self.control)
             
+            if removed_count is None:
+                self.log(self.get_text('clean_cancelled'))
+                return
+                
             self.log(self.get_text('unavailable_removed').format(removed_count))
             
         except Exception as e:
@@ -562,14 +710,93 @@ print(f"Updated: {updated_count}, Errors: {error_count}")
         self.run_in_background(self._do_both)
         
     def _do_both(self):
-        """Perform both operations and create final backup (runs in background thread)."""
+        """Update, clean and create final backup in a single pass (runs in background thread)."""
+        from pipepipe_cache import MetadataCache
+        from pipepipe_pipeline import process_database
+        from pipepipe_routing import ServiceRouter
+        from pipepipe_session import create_resolver
+        from pipepipe_stats import load_throughput, record_throughput
+
         self.log(self.get_text('full_processing'))
-        self._update_metadata()
-        self._clean_unavailable()
-        self.create_final_backup()
+        if not self.extract_backup():
+            return
+            
+        try:
+            self.update_status(self.get_text('updating_metadata'))
+            self.progress.start()
+            
+            # One working copy: merge, update and clean without re-extracting
+            source_db = self.extract_old_database()
+            resolver = ServiceRouter(create_resolver(self.cookies_file.get() or None))
+            fingerprints = self.open_fingerprints()
+            cache = MetadataCache.in_directory(self.get_workspace_manager().root)
+            try:
+                result = process_database(os.path.join(self.working_dir, 'PipePipe.db'), resolver,
+                                          source_db=source_db,
+                                          dedup=self.merge_duplicates.get(),
+                                          time_budget=self.get_time_budget(),
+                                          fingerprints=fingerprints, cache=cache,
+                                          stats=True,
+                                          throughput=load_throughput(self.get_workspace_manager().root),
+                                          group_by_channel=self.group_by_channel.get(),
+                                          log=self.log, control=self.control)
+            finally:
+                cache.close()
+                resolver.close()
+                if fingerprints:
+                    fingerprints.close()
+            
+            if result['stats']:
+                streams = result['stats']['streams']
+                self.log(self.get_text('library_summary').format(
+                    streams['total'], streams['needs_update'], streams['duplicate_rows'],
+                    round(result['stats']['update_estimate']['seconds'] / 60)))
+            if result['dedup']:
+                self.log(self.get_text('dedup_result').format(result['dedup']['removed'],
+                                                              result['dedup']['videos']))
+            if result['merge']:
+                self.log(self.get_text('merge_result').format(result['merge']['filled'],
+                                                              len(result['merge']['unfilled'])))
+                
+            update = result['update']
+            record_throughput(update, self.get_workspace_manager().root)
+            if update['cancelled']:
+                self.log(self.get_text('update_cancelled').format(update['updated']))
+                return
+                
+            self.log(self.get_text('metadata_updated'))
+            self.log(f"Updated: {update['updated']}, Errors: {update['errors']}, "
+                     f"Lookups: {update['resolver_calls']}, Retries: {update['retries']}")
+            if update['error_kinds']:
+                self.log("Errors by type: " + ", ".join(
+                    f"{kind}: {count}" for kind, count in sorted(update['error_kinds'].items())))
+            if update['skipped']:
+                self.log(self.get_text('budget_skipped').format(update['skipped']))
+            if update['from_fingerprints']:
+                self.log(self.get_text('fingerprint_result').format(update['from_fingerprints']))
+            if update['from_cache']:
+                self.log(self.get_text('cache_result').format(update['from_cache']))
+            
+            if result['removed'] is None:
+                self.log(self.get_text('clean_cancelled'))
+                return
+            self.log(self.get_text('unavailable_removed').format(result['removed']))
+            
+        except Exception as e:
+            self.log(f"{self.get_text('update_error')} {str(e)}")
+            return
+        finally:
+            self.progress.stop()
+            self.update_status(self.get_text('done'))
+            
+        self.create_final_backup(self.control)
         
-    def create_final_backup(self):
+    def create_final_backup(self, control=None):
         """Create updated backup file with processed data."""
+        from tkinter import filedialog, messagebox
+        from pipepipe_backup import write_backup
+        from pipepipe_validate import validate_backup
+
         try:
             if not self.working_dir:
                 return
@@ -585,9 +812,18 @@ print(f"Updated: {updated_count}, Errors: {error_count}")
             )
             
             if save_path:
-                with zipfile.ZipFile(save_path, 'w') as zipf:
-                    zipf.write(os.path.join(self.working_dir, 'PipePipe.db'), 'PipePipe.db')
-                    zipf.write(os.path.join(self.working_dir, 'PipePipe.settings'), 'PipePipe.settings')
+                if not write_backup(self.working_dir, save_path, control):
+                    self.log(self.get_text('backup_cancelled'))
+                    return
+
+                report = validate_backup(save_path, db_path=os.path.join(self.working_dir, 'PipePipe.db'))
+                if not report['ok']:
+                    os.remove(save_path)
+                    problems = '\n'.join(report['problems'])
+                    self.log(self.get_text('saved_backup_invalid').format(problems))
+                    messagebox.showerror(self.get_text('error'),
+                                         self.get_text('saved_backup_invalid').format(problems))
+                    return
                     
                 self.log(self.get_text('backup_saved').format(save_path))
                 messagebox.showinfo(self.get_text('finished'), 
@@ -596,6 +832,27 @@ print(f"Updated: {updated_count}, Errors: {error_count}")
         except Exception as e:
             self.log(self.get_text('backup_save_error').format(str(e)))
             
+    def cancel_operation(self):
+        """Ask the running operation to stop at its next checkpoint."""
+        if self.control:
+            self.control.cancel()
+            self.cancel_btn.config(state='disabled')
+            self.pause_btn.config(state='disabled')
+            self.log(self.get_text('cancelling'))
+            
+    def toggle_pause(self):
+        """Pause or resume the running operation."""
+        if not self.control:
+            return
+        if self.control.paused:
+            self.control.resume()
+            self.pause_btn.config(text=self.get_text('pause'))
+            self.log(self.get_text('resumed'))
+        else:
+            self.control.pause()
+            self.pause_btn.config(text=self.get_text('resume'))
+            self.log(self.get_text('paused'))
+            
     def update_status(self, status):
         """Update the status label text."""
         self.status_label.config(text=status)
@@ -603,11 +860,18 @@ print(f"Updated: {updated_count}, Errors: {error_count}")
         
     def run_in_background(self, func):
         """Execute a function in a background thread to keep UI responsive."""
+        from pipepipe_control import OperationControl
+
         # Disable action buttons during operation
         self.update_btn.config(state='disabled')
         self.clean_btn.config(state='disabled') 
         self.both_btn.config(state='disabled')
         
+        # Cancel/pause apply to this operation only
+        self.control = OperationControl()
+        self.cancel_btn.config(state='normal')
+        self.pause_btn.config(state='normal', text=self.get_text('pause'))
+        
         def worker():
             try:
                 func()
@@ -616,6 +880,9 @@ print(f"Updated: {updated_count}, Errors: {error_count}")
                 self.root.after(0, lambda: self.update_btn.config(state='normal'))
                 self.root.after(0, lambda: self.clean_btn.config(state='normal'))
                 self.root.after(0, lambda: self.both_btn.config(state='normal'))
+                self.root.after(0, lambda: self.cancel_btn.config(state='disabled'))
+                self.root.after(0, lambda: self.pause_btn.config(state='disabled',
+                                                                 text=self.get_text('pause')))
                 
         thread = threading.Thread(target=worker)
         thread.daemon = True
@@ -625,6 +892,13 @@ def main():
     """Main entry point for the application."""
     root = tk.Tk()
     app = PipePipeMetadataTool(root)
+    
+    # Startup benchmark (see benchmark_startup.py): exit once the window is drawn
+    if os.environ.get('PIPEPIPE_STARTUP_BENCHMARK'):
+        root.update()
+        root.destroy()
+        return
+        
     root.mainloop()
 
 if __name__ == "__main__":
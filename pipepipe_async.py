@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+PipePipe async resolver - many concurrent yt-dlp lookups from one event loop
+
+AsyncYtDlpResolver runs yt-dlp children with asyncio.create_subprocess_exec
+instead of one blocking subprocess.run() per thread. A single event loop
+drives up to max_processes children at once, reads their output as it
+arrives and kills children that exceed their timeout.
+
+run_async() drives a RetryScheduler (see pipepipe_retry) with such a
+resolver. The event loop runs on a helper thread and results are handed
+back through a queue, so callers consume them exactly like the sequential
+RetryScheduler.run(): pausing stops new children from being started, and
+cancelling lets running children finish before OperationCancelled is
+raised.
+
+Resolvers that route lookups to lanes (see pipepipe_routing) provide
+service_for(url, service_id) and accepts(service); the driver then groups
+the tasks by service, only takes tasks of services with room to start
+another and hands each lookup its service with fetch_async(url, timeout,
+service).
+
+Author: GitHub Community
+License: MIT
+"""
+
+import asyncio
+import queue
+import threading
+import time
+
+from pipepipe_control import OperationCancelled
+from pipepipe_resolver import (
+    ERROR_NETWORK,
+    ERROR_UNKNOWN,
+    METADATA_TEMPLATE,
+    ResolveError,
+    YtDlpResolver,
+    classify_error,
+    parse_metadata,
+)
+
+# Default number of yt-dlp children running at the same time
+DEFAULT_MAX_PROCESSES = 8
+
+# Default minimum time between starting two children, in seconds
+DEFAULT_START_INTERVAL = 0.1
+
+_DONE = object()
+
+
+class AsyncYtDlpResolver(YtDlpResolver):
+    """
+    yt-dlp resolver with an asyncio lookup, fetch_async(url, timeout).
+
+    The blocking resolve(), fetch() and list_flat() of YtDlpResolver remain
+    available.
+    """
+
+    def __init__(self, cookies_file=None, timeout=30, executable='yt-dlp',
+                 max_processes=DEFAULT_MAX_PROCESSES, start_interval=DEFAULT_START_INTERVAL):
+        """Configure the resolver; max_processes caps the open yt-dlp children."""
+        super().__init__(cookies_file, timeout, executable)
+        self.max_processes = max_processes
+        self.start_interval = start_interval
+
+    async def fetch_async(self, url, timeout=None):
+        """Fetch metadata for a single video; raises ResolveError on failure."""
+        cmd = self.build_command(['--print', METADATA_TEMPLATE, '--no-download', url])
+        process = await asyncio.create_subprocess_exec(
+            *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+
+        async def read_stdout():
+            # The metadata line arrives before yt-dlp exits; keep the first one
+            first_line = b''
+            while True:
+                line = await process.stdout.readline()
+                if not line:
+                    return first_line
+                if not first_line.strip():
+                    first_line = line
+
+        try:
+            stdout, stderr = await asyncio.wait_for(
+                asyncio.gather(read_stdout(), process.stderr.read()), timeout or self.timeout)
+            await process.wait()
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            raise ResolveError(ERROR_NETWORK, 'timed out', timed_out=True)
+        except asyncio.CancelledError:
+            process.kill()
+            await process.wait()
+            raise
+
+        if process.returncode != 0:
+            message = stderr.decode('utf-8', 'replace')
+            raise ResolveError(classify_error(message), message.strip()[-200:])
+
+        metadata = parse_metadata(stdout.decode('utf-8', 'replace'))
+        if metadata is None:
+            raise ResolveError(ERROR_UNKNOWN, 'invalid response format')
+        return metadata
+
+
+async def _drive(scheduler, resolver, emit, control, stop):
+    """Run the scheduler's tasks with up to resolver.max_processes lookups at once."""
+    limit = getattr(resolver, 'max_processes', DEFAULT_MAX_PROCESSES)
+    interval = getattr(resolver, 'start_interval', DEFAULT_START_INTERVAL)
+    accept = getattr(resolver, 'accepts', None)
+    routed = hasattr(resolver, 'service_for')
+    if routed:
+        scheduler.group_by(resolver.service_for)
+    running = {}
+    last_start = 0.0
+
+    async def attempt(task, lookup):
+        started = time.monotonic()
+        try:
+            metadata = await lookup
+            return scheduler.finish(task, metadata, duration=time.monotonic() - started)
+        except ResolveError as e:
+            return scheduler.finish(task, error=e)
+
+    while True:
+        cancelled = stop.is_set() or (control is not None and control.cancelled)
+        paused = control is not None and control.paused
+
+        # Start new lookups unless paused or cancelled
+        while not cancelled and not paused and len(running) < limit:
+            task = scheduler.take(accept)
+            if task is None:
+                break
+            wait = last_start + interval - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            last_start = time.monotonic()
+            if routed:
+                lookup = resolver.fetch_async(task['url'], scheduler.start(task), task['group'])
+            else:
+                lookup = resolver.fetch_async(task['url'], scheduler.start(task))
+            running[asyncio.ensure_future(attempt(task, lookup))] = task
+
+        if not running:
+            if cancelled:
+                emit(OperationCancelled())
+                return
+            if not scheduler.pending():
+                return
+            # Paused with nothing in flight, or waiting for a backoff to expire
+            next_due = scheduler.next_due()
+            await asyncio.sleep(0.2 if paused or next_due is None else min(1.0, next_due))
+            continue
+
+        done, pending = await asyncio.wait(list(running), timeout=0.5,
+                                           return_when=asyncio.FIRST_COMPLETED)
+        for future in done:
+            running.pop(future)
+            outcome = future.result()
+            if outcome is not None:
+                emit(outcome)
+
+
+def run_async(scheduler, resolver, control=None):
+    """
+    Run the scheduler's lookups concurrently and yield (key, url, metadata, error kind).
+
+    resolver must provide fetch_async(url, timeout). Raises
+    OperationCancelled after the running lookups have finished when
+    cancelled through control.
+    """
+    results = queue.Queue()
+    stop = threading.Event()
+
+    def worker():
+        try:
+            asyncio.run(_drive(scheduler, resolver, results.put, control, stop))
+        except BaseException as e:
+            results.put(e)
+        finally:
+            results.put(_DONE)
+
+    thread = threading.Thread(target=worker, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = results.get()
+            if item is _DONE:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        # Also reached when the caller stops early: let running lookups finish
+        stop.set()
+        thread.join()
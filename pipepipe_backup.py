@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+PipePipe backup files - writing the processed backup zip
+
+A PipePipe backup is a zip holding PipePipe.db and PipePipe.settings. The
+zip is written in chunks with cancellation checkpoints in between, so a
+multi-GB database can be cancelled mid-write; a cancelled write removes the
+partial file. library_database() gives read-only tools the database of a
+backup without a workspace.
+
+Author: GitHub Community
+License: MIT
+"""
+
+import os
+import shutil
+import tempfile
+import zipfile
+from contextlib import contextmanager
+
+from pipepipe_control import OperationCancelled, checkpoint
+
+# Files every PipePipe backup must contain
+BACKUP_FILES = ('PipePipe.db', 'PipePipe.settings')
+
+CHUNK_SIZE = 1024 * 1024
+
+
+@contextmanager
+def library_database(path, prefix='pipepipe_'):
+    """
+    Yield the path of the PipePipe.db of a backup zip or a PipePipe.db file.
+
+    A backup's database is extracted to a temporary folder named with
+    prefix, which is removed again on exit.
+    """
+    if not zipfile.is_zipfile(path):
+        yield path
+        return
+
+    work_dir = tempfile.mkdtemp(prefix=prefix)
+    try:
+        with zipfile.ZipFile(path, 'r') as zip_ref:
+            yield zip_ref.extract('PipePipe.db', work_dir)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def write_backup(working_dir, output_path, control=None):
+    """
+    Zip the backup files from working_dir into output_path.
+
+    Returns True when the backup was written, False when it was cancelled
+    through control.
+    """
+    try:
+        with zipfile.ZipFile(output_path, 'w') as zipf:
+            for name in BACKUP_FILES:
+                path = os.path.join(working_dir, name)
+                info = zipfile.ZipInfo.from_file(path, name)
+                with open(path, 'rb') as source, zipf.open(info, 'w', force_zip64=True) as target:
+                    while True:
+                        checkpoint(control)
+                        chunk = source.read(CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        target.write(chunk)
+        return True
+    except OperationCancelled:
+        os.remove(output_path)
+        return False
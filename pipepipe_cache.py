@@ -0,0 +1,446 @@
+#!/usr/bin/env python3
+"""
+PipePipe metadata cache - metadata found by earlier lookups
+
+Every successful lookup is stored under the video's canonical video ID with
+the time it was fetched. Later runs use the cache in two ways:
+- placeholder videos with a cached entry are filled without a lookup
+- the refresh mode (see pipepipe_refresh) decides from the fetch time which
+  videos are stale and copies fresh entries into backups that lack them
+
+Entries are kept by a cache backend, which stores text values with their
+fetch time under string keys and reads and writes them in batches:
+- FileCacheBackend: a small SQLite file, by default in the work folder root
+  (see pipepipe_workspace), shared by all backups processed there
+- NetworkCacheBackend: a cache server shared by several machines, spoken to
+  over HTTP with one request per batch on a kept-alive connection
+- TieredCacheBackend: the local file first, the cache server for misses
+
+With PIPEPIPE_CACHE_URL set (e.g. http://cachehost:8766), the cache in the
+work folder is backed by that server, so a video resolved on one machine is
+a cache hit for runs on every other machine. Run the server with:
+
+    python pipepipe_cache.py [--host 0.0.0.0] [--port 8766] [--file cache.db]
+
+PIPEPIPE_CACHE_TOKEN, when set on the server and the clients, is required
+with every request. When the server cannot be reached, lookups go on
+without it and it is tried again a minute later.
+
+Author: GitHub Community
+License: MIT
+"""
+
+import hmac
+import http.client
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+CACHE_FILE = 'metadata_cache.db'
+
+# Video IDs per query when reading many entries at once
+LOOKUP_CHUNK = 500
+
+# Entries per request to a cache server
+NETWORK_BATCH = 1000
+
+DEFAULT_TIMEOUT = 10
+
+# Seconds a cache server is left alone after a failed request
+RETRY_AFTER = 60
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8766
+
+# Largest accepted request body
+MAX_REQUEST_BYTES = 64 * 1024 * 1024
+
+TOKEN_HEADER = 'X-Cache-Token'
+
+
+class FileCacheBackend:
+    """Cache entries in an SQLite file."""
+
+    def __init__(self, path):
+        """Open (or create) the cache file at path."""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        # Shared by the worker threads of concurrent jobs (see pipepipe_daemon)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.conn.execute("""
+        CREATE TABLE IF NOT EXISTS metadata (
+            video_id TEXT PRIMARY KEY,
+            metadata TEXT NOT NULL,
+            fetched_at REAL NOT NULL
+        )
+        """)
+        self.conn.commit()
+
+    def get_many(self, keys):
+        """Return a dict of key -> (value, fetched_at) for the stored keys."""
+        entries = {}
+        keys = list(keys)
+        with self.lock:
+            for start in range(0, len(keys), LOOKUP_CHUNK):
+                chunk = keys[start:start + LOOKUP_CHUNK]
+                marks = ', '.join('?' for _ in chunk)
+                cursor = self.conn.execute(
+                    f"SELECT video_id, metadata, fetched_at FROM metadata WHERE video_id IN ({marks})", chunk)
+                for key, value, fetched_at in cursor:
+                    entries[key] = (value, fetched_at)
+        return entries
+
+    def put_many(self, entries):
+        """Store (key, value, fetched_at) entries; an entry never replaces a newer one."""
+        with self.lock:
+            self.conn.executemany("""
+            INSERT INTO metadata (video_id, metadata, fetched_at) VALUES (?, ?, ?)
+            ON CONFLICT(video_id) DO UPDATE SET metadata = excluded.metadata, fetched_at = excluded.fetched_at
+            WHERE excluded.fetched_at >= metadata.fetched_at
+            """, entries)
+            self.conn.commit()
+
+    def count(self):
+        """Return the number of stored entries."""
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM metadata").fetchone()[0]
+
+    def close(self):
+        """Close the cache file."""
+        self.conn.close()
+
+
+class CacheServerError(Exception):
+    """A cache server request failed."""
+
+
+class NetworkCacheBackend:
+    """
+    Cache entries on a cache server (see CacheRequestHandler).
+
+    Requests are batched and sent over one kept-alive connection. A failed
+    request is not raised: reads return no entries and writes are dropped,
+    and the server is skipped for RETRY_AFTER seconds.
+    """
+
+    def __init__(self, url, token=None, timeout=DEFAULT_TIMEOUT, batch_size=NETWORK_BATCH,
+                 retry_after=RETRY_AFTER, clock=time.monotonic):
+        """Use the cache server at url (http:// or https://)."""
+        parts = urlsplit(url)
+        if parts.scheme not in ('http', 'https') or not parts.hostname:
+            raise ValueError(f"Not a cache server URL: {url}")
+        self.url = url
+        self.scheme = parts.scheme
+        self.host = parts.hostname
+        self.port = parts.port
+        self.base_path = parts.path.rstrip('/')
+        self.token = token
+        self.timeout = timeout
+        self.batch_size = batch_size
+        self.retry_after = retry_after
+        self.clock = clock
+        self.connection = None
+        self.lock = threading.Lock()
+        self.unavailable_until = 0
+        self.errors = 0
+        self.last_error = None
+
+    def connect(self):
+        """Open a new connection to the server."""
+        if self.scheme == 'https':
+            return http.client.HTTPSConnection(self.host, self.port, timeout=self.timeout)
+        return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+    def send(self, path, payload):
+        """POST payload as JSON and return the decoded response; raises CacheServerError."""
+        body = json.dumps(payload).encode('utf-8')
+        headers = {'Content-Type': 'application/json'}
+        if self.token:
+            headers[TOKEN_HEADER] = self.token
+        # A kept-alive connection may have been closed by the server; retry once on a new one
+        for attempt in range(2):
+            reused = self.connection is not None
+            if self.connection is None:
+                self.connection = self.connect()
+            try:
+                self.connection.request('POST', self.base_path + path, body, headers)
+                response = self.connection.getresponse()
+                data = response.read()
+            except (OSError, http.client.HTTPException) as e:
+                self.connection.close()
+                self.connection = None
+                if reused and attempt == 0:
+                    continue
+                raise CacheServerError(str(e))
+            if response.status != 200:
+                raise CacheServerError(f"HTTP {response.status}")
+            try:
+                return json.loads(data.decode('utf-8'))
+            except ValueError:
+                raise CacheServerError('invalid response')
+
+    def call(self, path, payload):
+        """Send one request unless the server is being skipped; returns the response or None."""
+        with self.lock:
+            if self.clock() < self.unavailable_until:
+                return None
+            try:
+                return self.send(path, payload)
+            except CacheServerError as e:
+                self.errors += 1
+                self.last_error = str(e)
+                self.unavailable_until = self.clock() + self.retry_after
+                return None
+
+    def get_many(self, keys):
+        """Return a dict of key -> (value, fetched_at) for the keys the server has."""
+        entries = {}
+        keys = list(keys)
+        for start in range(0, len(keys), self.batch_size):
+            response = self.call('/get', {'keys': keys[start:start + self.batch_size]})
+            if response is None:
+                break
+            for key, (value, fetched_at) in response.get('entries', {}).items():
+                entries[key] = (value, fetched_at)
+        return entries
+
+    def put_many(self, entries):
+        """Send (key, value, fetched_at) entries to the server."""
+        entries = [list(entry) for entry in entries]
+        for start in range(0, len(entries), self.batch_size):
+            if self.call('/put', {'entries': entries[start:start + self.batch_size]}) is None:
+                break
+
+    def close(self):
+        """Close the connection."""
+        with self.lock:
+            if self.connection is not None:
+                self.connection.close()
+                self.connection = None
+
+
+class TieredCacheBackend:
+    """A local backend in front of a shared one: reads go to the shared one only for misses."""
+
+    def __init__(self, local, shared):
+        """Combine a local backend (e.g. a file) and a shared one (e.g. a cache server)."""
+        self.local = local
+        self.shared = shared
+
+    def get_many(self, keys):
+        """Return local entries, completed with (and stored from) the shared backend."""
+        keys = list(keys)
+        entries = self.local.get_many(keys)
+        missing = [key for key in keys if key not in entries]
+        if missing:
+            found = self.shared.get_many(missing)
+            if found:
+                self.local.put_many((key, value, fetched_at) for key, (value, fetched_at) in found.items())
+                entries.update(found)
+        return entries
+
+    def put_many(self, entries):
+        """Store entries in both backends."""
+        entries = list(entries)
+        self.local.put_many(entries)
+        self.shared.put_many(entries)
+
+    def close(self):
+        """Close both backends."""
+        self.local.close()
+        self.shared.close()
+
+
+class MetadataCache:
+    """Metadata dicts with their fetch time, keyed by canonical video ID."""
+
+    def __init__(self, backend):
+        """Keep entries in the given cache backend."""
+        self.backend = backend
+
+    @classmethod
+    def in_directory(cls, directory, url=None, token=None):
+        """
+        Open the cache kept in the given directory, e.g. the work folder root.
+
+        With a cache server url (default: PIPEPIPE_CACHE_URL), the file in
+        the directory is backed by the server.
+        """
+        backend = FileCacheBackend(os.path.join(directory, CACHE_FILE))
+        url = url or os.environ.get('PIPEPIPE_CACHE_URL')
+        if url:
+            token = token or os.environ.get('PIPEPIPE_CACHE_TOKEN')
+            backend = TieredCacheBackend(backend, NetworkCacheBackend(url, token=token))
+        return cls(backend)
+
+    def get_many(self, video_ids):
+        """
+        Return a dict of video ID -> (metadata, fetched_at) for the cached IDs.
+
+        Entries that do not hold a JSON object (a damaged cache file or a
+        bad answer from a cache server) are left out, so those videos are
+        looked up again and their entries replaced.
+        """
+        video_ids = [video_id for video_id in set(video_ids) if video_id is not None]
+        entries = {}
+        for video_id, (value, fetched_at) in self.backend.get_many(video_ids).items():
+            try:
+                metadata = json.loads(value)
+            except (TypeError, ValueError):
+                continue
+            if isinstance(metadata, dict):
+                entries[video_id] = (metadata, fetched_at)
+        return entries
+
+    def put_many(self, items, fetched_at=None):
+        """Store (video ID, metadata) pairs, fetched at the given time (default: now)."""
+        fetched_at = time.time() if fetched_at is None else fetched_at
+        entries = [(video_id, json.dumps(metadata), fetched_at)
+                   for video_id, metadata in items if video_id is not None]
+        if entries:
+            self.backend.put_many(entries)
+
+    def close(self):
+        """Close the cache."""
+        self.backend.close()
+
+
+class CacheRequestHandler(BaseHTTPRequestHandler):
+    """
+    Cache server for NetworkCacheBackend, over the backend in self.server.backend.
+
+    POST /get {"keys": [...]} answers {"entries": {key: [value, fetched_at]}};
+    POST /put {"entries": [[key, value, fetched_at], ...]} answers
+    {"stored": n}; GET /health answers {"entries": n}.
+    """
+
+    server_version = 'PipePipeCache/1.0'
+    # Keeps connections open between a client's batches
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        """Keep request logs off stderr."""
+
+    def send_json(self, status, body):
+        """Send a JSON response."""
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def authorized(self):
+        """Check the request's token against the server's; answers 403 when it does not match."""
+        token = self.server.token
+        given = self.headers.get(TOKEN_HEADER) or ''
+        # Compared in constant time, so response times do not give the token away
+        if token and not hmac.compare_digest(given.encode('utf-8'), token.encode('utf-8')):
+            # The request body is left unread
+            self.close_connection = True
+            self.send_json(403, {'error': 'invalid token'})
+            return False
+        return True
+
+    def read_json(self):
+        """Return the JSON request body, or None after answering 400/413."""
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            self.close_connection = True
+            self.send_json(400, {'error': 'invalid Content-Length'})
+            return None
+        if length > MAX_REQUEST_BYTES:
+            self.close_connection = True
+            self.send_json(413, {'error': 'request too large'})
+            return None
+        try:
+            return json.loads(self.rfile.read(length).decode('utf-8'))
+        except ValueError:
+            self.send_json(400, {'error': 'invalid JSON'})
+            return None
+
+    def do_GET(self):
+        """Health check with the number of entries."""
+        if self.path.split('?')[0].rstrip('/') != '/health':
+            self.send_json(404, {'error': 'not found'})
+        elif self.authorized():
+            self.send_json(200, {'entries': self.server.backend.count()})
+
+    def do_POST(self):
+        """Batched reads and writes."""
+        path = self.path.split('?')[0].rstrip('/')
+        if path not in ('/get', '/put'):
+            self.close_connection = True
+            self.send_json(404, {'error': 'not found'})
+            return
+        if not self.authorized():
+            return
+        request = self.read_json()
+        if request is None:
+            return
+        try:
+            if path == '/get':
+                keys = [str(key) for key in request['keys']]
+                entries = self.server.backend.get_many(keys)
+                self.send_json(200, {'entries': {key: list(entry) for key, entry in entries.items()}})
+            else:
+                entries = [(str(key), str(value), float(fetched_at))
+                           for key, value, fetched_at in request['entries']]
+                self.server.backend.put_many(entries)
+                self.send_json(200, {'stored': len(entries)})
+        except (KeyError, TypeError, ValueError):
+            self.send_json(400, {'error': 'malformed request'})
+
+
+def serve(backend, host=DEFAULT_HOST, port=DEFAULT_PORT, token=None):
+    """Return a ThreadingHTTPServer for backend; call serve_forever() on it."""
+    httpd = ThreadingHTTPServer((host, port), CacheRequestHandler)
+    httpd.daemon_threads = True
+    httpd.backend = backend
+    httpd.token = token
+    return httpd
+
+
+def main():
+    """Run a cache server until interrupted."""
+    args = sys.argv[1:]
+    options = {'--host': DEFAULT_HOST, '--port': DEFAULT_PORT, '--file': None}
+    for name in list(options):
+        if name in args:
+            index = args.index(name)
+            value = args[index + 1]
+            options[name] = int(value) if name == '--port' else value
+            del args[index:index + 2]
+    if args:
+        print("Usage: python pipepipe_cache.py [--host 127.0.0.1] [--port 8766] [--file cache.db]")
+        sys.exit(1)
+
+    if options['--file']:
+        backend = FileCacheBackend(options['--file'])
+    else:
+        from pipepipe_workspace import WorkspaceManager
+
+        backend = FileCacheBackend(os.path.join(WorkspaceManager().root, 'shared_' + CACHE_FILE))
+    httpd = serve(backend, options['--host'], options['--port'],
+                  token=os.environ.get('PIPEPIPE_CACHE_TOKEN'))
+    print(f"Serving {backend.path} on http://{options['--host']}:{httpd.server_address[1]}")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        httpd.server_close()
+        backend.close()
+
+
+if __name__ == "__main__":
+    main()
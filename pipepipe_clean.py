@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+PipePipe cleanup - removes unavailable videos from the local playlists
+
+Videos that still have placeholder metadata after an update are treated as
+unavailable. They are removed from the local playlists with set-based SQL in
+a single transaction; stream rows are deleted only when no other playlist
+still references them.
+
+Author: GitHub Community
+License: MIT
+"""
+
+from pipepipe_control import OperationCancelled, checkpoint
+from pipepipe_db import database, local_playlist_filter, select_placeholder_streams
+
+
+def remove_streams_from_local_playlists(conn, uids):
+    """
+    Remove the given stream uids from the local playlists.
+
+    Stream rows left without any playlist reference are deleted as well.
+    Runs inside the caller's transaction; nothing is committed here.
+    """
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS clean_uids (uid INTEGER PRIMARY KEY)")
+    conn.execute("DELETE FROM temp.clean_uids")
+    conn.executemany("INSERT OR IGNORE INTO temp.clean_uids (uid) VALUES (?)",
+                     ((uid,) for uid in uids))
+
+    playlist_condition, params = local_playlist_filter('name')
+    conn.execute(f"""
+    DELETE FROM playlist_stream_join
+    WHERE stream_id IN (SELECT uid FROM temp.clean_uids)
+    AND playlist_id IN (SELECT uid FROM playlists WHERE {playlist_condition})
+    """, params)
+
+    # Only delete from streams table if not referenced elsewhere
+    conn.execute("""
+    DELETE FROM streams
+    WHERE uid IN (SELECT uid FROM temp.clean_uids)
+    AND NOT EXISTS (SELECT 1 FROM playlist_stream_join psj WHERE psj.stream_id = streams.uid)
+    """)
+
+    conn.execute("DROP TABLE temp.clean_uids")
+
+
+def clean_unavailable(db, uids=None, control=None):
+    """
+    Remove unavailable videos from the local playlists.
+
+    db is a database path or an open connection (see pipepipe_db.database).
+    uids defaults to every local playlist video that still has placeholder
+    metadata. Returns the number of videos removed, or None when the cleanup
+    was cancelled through control; a cancelled cleanup is rolled back and
+    leaves the database unchanged.
+    """
+    with database(db) as conn:
+        try:
+            checkpoint(control)
+            if uids is None:
+                uids = [row[0] for row in select_placeholder_streams(conn)]
+
+            remove_streams_from_local_playlists(conn, uids)
+
+            # Last chance to back out before the removal becomes permanent
+            checkpoint(control)
+            conn.commit()
+            return len(uids)
+        except OperationCancelled:
+            conn.rollback()
+            return None
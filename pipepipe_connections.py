@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+PipePipe connections - one writer and a pool of readers for a working copy
+
+A ConnectionManager opens the working copy of PipePipe.db in WAL mode with
+one writer connection and a pool of read-only connections. Readers see a
+consistent snapshot and are not blocked by the batched writer, so
+statistics, planning and candidate queries can run on other threads while
+an update is writing.
+
+WAL mode is a setting stored in the database file, so close() checkpoints
+the log back into the file and switches the journal mode back to DELETE;
+the database is then a single file again, ready to be zipped into a backup.
+
+In-memory databases (see pipepipe_workspace) cannot be shared between
+connections and are used through a single connection instead.
+
+Author: GitHub Community
+License: MIT
+"""
+
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from urllib.parse import quote
+
+from pipepipe_db import canonical_video_id, connect
+
+DEFAULT_READERS = 4
+
+
+class ConnectionManager:
+    """One writer connection and a pool of read-only connections to a database file."""
+
+    def __init__(self, db_path, readers=DEFAULT_READERS):
+        """Open the writer and switch the database to WAL mode; readers are opened on demand."""
+        self.db_path = db_path
+        self.max_readers = readers
+        self.writer = connect(db_path)
+        self.writer.execute("PRAGMA journal_mode=WAL")
+        # WAL only needs a sync at checkpoints to stay consistent
+        self.writer.execute("PRAGMA synchronous=NORMAL")
+        self.idle = queue.LifoQueue()
+        self.opened = 0
+        self.lock = threading.Lock()
+        self.closed = False
+
+    def open_reader(self):
+        """Open a new read-only connection with the tool's SQL functions registered."""
+        uri = f"file:{quote(self.db_path)}?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        conn.create_function('canonical_id', 1, canonical_video_id)
+        return conn
+
+    @contextmanager
+    def reader(self):
+        """
+        Yield a read-only connection from the pool.
+
+        A new connection is opened while fewer than the pool size exist;
+        otherwise this waits for one to be returned.
+        """
+        try:
+            conn = self.idle.get_nowait()
+        except queue.Empty:
+            with self.lock:
+                can_open = self.opened < self.max_readers
+                if can_open:
+                    self.opened += 1
+            conn = self.open_reader() if can_open else self.idle.get()
+        try:
+            yield conn
+        finally:
+            # End the read transaction, so the writer can checkpoint past it
+            conn.rollback()
+            self.idle.put(conn)
+
+    def close(self):
+        """Close all connections and turn the database back into a single file."""
+        if self.closed:
+            return
+        self.closed = True
+        while self.opened:
+            self.idle.get().close()
+            self.opened -= 1
+        self.writer.commit()
+        self.writer.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        self.writer.execute("PRAGMA journal_mode=DELETE")
+        self.writer.close()
@@ -0,0 +1,430 @@
+#!/usr/bin/env python3
+"""
+PipePipe watch folder - process backups as they appear in a folder
+
+Runs as a long-lived process that watches a folder (for example one synced
+from the phones) for PipePipe backup zips. Every new backup goes through the
+whole "Do Both" processing (see pipepipe_pipeline.process_backup) and the
+result is written to an output folder as <name>_updated.zip.
+
+- The folder is watched with inotify on Linux and polled elsewhere (or
+  with --poll). Events only trigger a rescan of the folder.
+- A zip counts as complete once its size and modification time have not
+  changed for a settle time and its central directory can be read, so
+  backups still being copied or synced are not picked up half-written.
+- Backups are queued into a bounded job scheduler with a fixed number of
+  workers. When the queue is full, new backups wait in the folder until
+  there is room.
+- All jobs share one resolver (with its per-service lanes, see
+  pipepipe_routing), the metadata cache and the fingerprint store, so a
+  video looked up for one device is not looked up again for the next.
+
+    python pipepipe_daemon.py <watch folder> <output folder> [--workers N]
+        [--cookies cookies.txt] [--settle seconds] [--poll]
+
+Author: GitHub Community
+License: MIT
+"""
+
+import ctypes
+import ctypes.util
+import os
+import queue
+import select
+import sys
+import threading
+import time
+import zipfile
+
+from pipepipe_control import OperationCancelled, OperationControl
+from pipepipe_pipeline import process_backup
+from pipepipe_workspace import WorkspaceManager, backup_key
+
+# Seconds a zip must stay unchanged before it is processed
+DEFAULT_SETTLE = 5.0
+
+# Seconds between rescans without inotify, and while zips are settling
+DEFAULT_POLL_INTERVAL = 2.0
+
+# Seconds to wait for inotify events when nothing is settling
+IDLE_WAIT = 30.0
+
+DEFAULT_WORKERS = 1
+DEFAULT_MAX_QUEUED = 8
+
+OUTPUT_SUFFIX = '_updated.zip'
+
+# inotify event masks (linux/inotify.h)
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+
+
+def open_inotify(directory):
+    """Return an inotify descriptor watching directory, or None where inotify is not available."""
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+    except (OSError, AttributeError):
+        return None
+    if fd < 0:
+        return None
+    mask = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+    if libc.inotify_add_watch(fd, os.fsencode(directory), mask) < 0:
+        os.close(fd)
+        return None
+    return fd
+
+
+class FolderWatcher:
+    """Finds complete backup zips in a folder, debouncing files still being written."""
+
+    def __init__(self, directory, settle=DEFAULT_SETTLE, poll_interval=DEFAULT_POLL_INTERVAL,
+                 use_inotify=True, clock=time.monotonic):
+        """Watch directory; without inotify (or with use_inotify=False) it is polled."""
+        self.directory = directory
+        self.settle = settle
+        self.poll_interval = poll_interval
+        self.clock = clock
+        self.fd = open_inotify(directory) if use_inotify else None
+        # path -> (size, mtime, unchanged since) for zips not handed out yet
+        self.settling = {}
+        # path -> (size, mtime) of zips handed out
+        self.seen = {}
+
+    @property
+    def uses_inotify(self):
+        """Whether the folder is watched with inotify rather than polled."""
+        return self.fd is not None
+
+    def scan(self):
+        """Rescan the folder and return the zips that are complete and not handed out yet."""
+        now = self.clock()
+        present = set()
+        ready = []
+        for entry in os.scandir(self.directory):
+            if not entry.name.lower().endswith('.zip') or not entry.is_file():
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            path = entry.path
+            present.add(path)
+            state = (stat.st_size, stat.st_mtime_ns)
+            if self.seen.get(path) == state:
+                continue
+            settling = self.settling.get(path)
+            if settling is None or settling[:2] != state:
+                self.settling[path] = state + (now,)
+            elif now - settling[2] >= self.settle and zipfile.is_zipfile(path):
+                ready.append(path)
+
+        for path in list(self.settling):
+            if path not in present:
+                del self.settling[path]
+        for path in list(self.seen):
+            if path not in present:
+                del self.seen[path]
+        ready.sort(key=lambda path: self.settling[path][2])
+        return ready
+
+    def mark(self, path):
+        """Hand out a zip returned by scan(); it is returned again only if it changes."""
+        size, mtime, since = self.settling.pop(path)
+        self.seen[path] = (size, mtime)
+
+    def wait(self, stop):
+        """Wait for a change in the folder, the next rescan or stop being set."""
+        timeout = self.poll_interval if self.settling or self.fd is None else IDLE_WAIT
+        if self.fd is None:
+            stop.wait(timeout)
+            return
+        deadline = self.clock() + timeout
+        while not stop.is_set():
+            remaining = deadline - self.clock()
+            if remaining <= 0:
+                return
+            readable, _, _ = select.select([self.fd], [], [], min(remaining, 1.0))
+            if readable:
+                # The events only say that something changed; scan() finds out what
+                try:
+                    while os.read(self.fd, 65536):
+                        pass
+                except BlockingIOError:
+                    pass
+                return
+
+    def close(self):
+        """Stop watching."""
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+class JobScheduler:
+    """A bounded queue of jobs run by a fixed number of worker threads."""
+
+    def __init__(self, run_job, workers=DEFAULT_WORKERS, max_queued=DEFAULT_MAX_QUEUED, log=print):
+        """
+        Start the workers; run_job(job) is called for every submitted job.
+
+        A job that raises OperationCancelled is counted as cancelled, any
+        other exception counts it as failed.
+        """
+        self.run_job = run_job
+        self.log = log
+        self.jobs = queue.Queue(maxsize=max_queued)
+        self.active = set()
+        self.lock = threading.Lock()
+        self.completed = 0
+        self.failed = 0
+        self.cancelled = 0
+        self.threads = [threading.Thread(target=self.worker, daemon=True) for _ in range(workers)]
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, job):
+        """
+        Queue a job; returns False when the queue is full.
+
+        A job already queued or running is not added again.
+        """
+        with self.lock:
+            if job in self.active:
+                return True
+            try:
+                self.jobs.put_nowait(job)
+            except queue.Full:
+                return False
+            self.active.add(job)
+            return True
+
+    def cancel(self, job):
+        """
+        Take a queued job off the queue, freeing its slot; counts it as cancelled.
+
+        Returns False when the job is not queued (running, finished or unknown).
+        """
+        with self.lock, self.jobs.mutex:
+            try:
+                self.jobs.queue.remove(job)
+            except ValueError:
+                return False
+            self.jobs.not_full.notify()
+            self.active.discard(job)
+            self.cancelled += 1
+            return True
+
+    def full(self):
+        """Whether the queue is full, so submit() would fail."""
+        return self.jobs.full()
+
+    def pending(self):
+        """Number of jobs queued or running."""
+        with self.lock:
+            return len(self.active)
+
+    def worker(self):
+        """Run queued jobs until close() is called."""
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                return
+            outcome = 'completed'
+            try:
+                self.run_job(job)
+            except OperationCancelled:
+                outcome = 'cancelled'
+            except Exception as e:
+                outcome = 'failed'
+                self.log(f"Job failed: {job}: {e}")
+            with self.lock:
+                self.active.discard(job)
+                if outcome == 'failed':
+                    self.failed += 1
+                elif outcome == 'cancelled':
+                    self.cancelled += 1
+                else:
+                    self.completed += 1
+
+    def close(self):
+        """Let queued jobs finish, then stop the workers."""
+        for _ in self.threads:
+            self.jobs.put(None)
+        for thread in self.threads:
+            thread.join()
+
+
+class BackupProcessor:
+    """
+    Processes backups with one resolver, metadata cache and fingerprint store.
+
+    Shared by all jobs of a long-running process (this daemon, or the job
+    server in pipepipe_server), so lookups of one job are cache hits for the
+    next and all jobs go through the same per-service lanes.
+    """
+
+    def __init__(self, resolver=None, workspaces=None, dedup=False, time_budget=None, cookies_file=None):
+        """Open the shared cache and fingerprint store in the work folder root."""
+        from pipepipe_cache import MetadataCache
+        from pipepipe_fingerprint import FingerprintStore
+        from pipepipe_routing import ServiceRouter
+        from pipepipe_session import create_resolver
+
+        self.dedup = dedup
+        self.time_budget = time_budget
+        self.workspaces = workspaces or WorkspaceManager()
+        self.resolver = resolver or ServiceRouter(create_resolver(cookies_file))
+        self.cache = MetadataCache.in_directory(self.workspaces.root)
+        self.fingerprints = FingerprintStore.in_directory(self.workspaces.root)
+        # Backups with the same content share a work folder, so they must not run at the same time
+        self.key_locks = {}
+        self.lock = threading.Lock()
+
+    def process(self, backup_path, output_path, log=print, control=None, progress=None):
+        """Run process_backup() for one backup; see pipepipe_pipeline."""
+        with self.lock:
+            key_lock = self.key_locks.setdefault(backup_key(backup_path), threading.Lock())
+        with key_lock:
+            return process_backup(backup_path, output_path, self.resolver, workspaces=self.workspaces,
+                                  dedup=self.dedup, time_budget=self.time_budget,
+                                  fingerprints=self.fingerprints, cache=self.cache, log=log,
+                                  control=control, progress=progress)
+
+    def close(self):
+        """Close the shared resolver, cache and fingerprint store."""
+        self.resolver.close()
+        self.cache.close()
+        self.fingerprints.close()
+
+
+class WatchFolderDaemon:
+    """Watches a folder and processes every new backup into the output folder."""
+
+    def __init__(self, input_dir, output_dir, processor=None, workers=DEFAULT_WORKERS,
+                 max_queued=DEFAULT_MAX_QUEUED, settle=DEFAULT_SETTLE,
+                 poll_interval=DEFAULT_POLL_INTERVAL, use_inotify=True, log=print):
+        """
+        Set up the watcher and the job scheduler; processor defaults to a new BackupProcessor.
+
+        Raises ValueError when the output folder is the watched folder, as
+        the results would be picked up as new backups.
+        """
+        if os.path.abspath(input_dir) == os.path.abspath(output_dir):
+            raise ValueError("The output folder must differ from the watched folder")
+        os.makedirs(output_dir, exist_ok=True)
+        self.input_dir = input_dir
+        self.output_dir = output_dir
+        self.log = log
+        self.processor = processor or BackupProcessor()
+        self.control = OperationControl()
+        self.watcher = FolderWatcher(input_dir, settle, poll_interval, use_inotify)
+        self.scheduler = JobScheduler(self.run_job, workers, max_queued, log)
+
+    def output_path(self, backup_path):
+        """Return the output zip path for a backup."""
+        name = os.path.splitext(os.path.basename(backup_path))[0]
+        return os.path.join(self.output_dir, name + OUTPUT_SUFFIX)
+
+    def run_job(self, backup_path):
+        """Process one backup (called on a worker thread)."""
+        name = os.path.basename(backup_path)
+
+        def log(message):
+            self.log(f"[{name}] {message}")
+
+        log("Processing")
+        started = time.monotonic()
+        result = self.processor.process(backup_path, self.output_path(backup_path), log=log,
+                                        control=self.control)
+        if result['output'] is None:
+            log("Cancelled, continuing on the next start")
+            return
+        update = result['update']
+        log(f"Saved {result['output']} in {time.monotonic() - started:.0f} s: "
+            f"updated {update['updated']}, errors {update['errors']}, removed {result['removed'] or 0}")
+
+    def is_processed(self, backup_path):
+        """Whether an output newer than the backup already exists, e.g. from before a restart."""
+        output = self.output_path(backup_path)
+        return os.path.exists(output) and os.path.getmtime(output) >= os.path.getmtime(backup_path)
+
+    def poll(self):
+        """Scan the folder once and queue the complete backups; returns the number queued."""
+        queued = 0
+        for path in self.watcher.scan():
+            if self.is_processed(path):
+                self.watcher.mark(path)
+                continue
+            if not self.scheduler.submit(path):
+                # Queue full: the backup stays in the folder and is picked up later
+                break
+            self.watcher.mark(path)
+            self.log(f"Queued {os.path.basename(path)}")
+            queued += 1
+        return queued
+
+    def run(self, stop=None):
+        """Watch the folder until stop (a threading.Event) is set."""
+        stop = stop or threading.Event()
+        mode = 'inotify' if self.watcher.uses_inotify else 'polling'
+        self.log(f"Watching {self.input_dir} ({mode}), writing to {self.output_dir}")
+        while not stop.is_set():
+            self.poll()
+            self.watcher.wait(stop)
+
+    def close(self, cancel=False):
+        """Stop the workers, after cancelling running jobs if cancel, and close the shared resources."""
+        if cancel:
+            self.control.cancel()
+        self.scheduler.close()
+        self.watcher.close()
+        self.processor.close()
+
+
+def main():
+    """Watch a folder and process new backups until interrupted."""
+    args = sys.argv[1:]
+    options = {'--workers': DEFAULT_WORKERS, '--cookies': None, '--settle': DEFAULT_SETTLE}
+    for name in list(options):
+        if name in args:
+            index = args.index(name)
+            value = args[index + 1]
+            options[name] = {'--workers': int, '--settle': float}.get(name, str)(value)
+            del args[index:index + 2]
+    use_inotify = '--poll' not in args
+    if not use_inotify:
+        args.remove('--poll')
+    if len(args) != 2:
+        print("Usage: python pipepipe_daemon.py <watch folder> <output folder> [--workers N] "
+              "[--cookies cookies.txt] [--settle seconds] [--poll]")
+        sys.exit(1)
+
+    input_dir, output_dir = args
+    if not os.path.isdir(input_dir):
+        print(f"Error: Folder not found: {input_dir}")
+        sys.exit(1)
+
+    if os.path.abspath(input_dir) == os.path.abspath(output_dir):
+        print("Error: The output folder must differ from the watched folder")
+        sys.exit(1)
+
+    daemon = WatchFolderDaemon(input_dir, output_dir, BackupProcessor(cookies_file=options['--cookies']),
+                               workers=options['--workers'], settle=options['--settle'],
+                               use_inotify=use_inotify)
+
+    try:
+        daemon.run()
+    except KeyboardInterrupt:
+        print("Stopping, running jobs keep what they resolved so far")
+        daemon.close(cancel=True)
+    else:
+        daemon.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+PipePipe database helpers - shared SQL and database operations
+
+This module holds the pieces of PipePipe.db handling that are shared between
+the GUI and the other tool modules:
+- Names of the local playlists and the placeholder metadata values
+- Canonical video IDs, so the same video can be matched across URL forms
+- Connection setup with the SQL helper functions registered
+
+Author: GitHub Community
+License: MIT
+"""
+
+import re
+import sqlite3
+from contextlib import contextmanager
+from urllib.parse import urlparse, parse_qs
+
+# Local playlists the tool works on
+LOCAL_PLAYLISTS = ('Titta senare (PipePipe)', 'Videor som jag gillat (PipePipe)')
+
+# Local playlists PipePipe appends to, so their most recent videos are at the end
+NEWEST_LAST_PLAYLISTS = ('Videor som jag gillat (PipePipe)',)
+
+# Metadata PipePipe stores for videos it could not resolve on import
+PLACEHOLDER_TITLE = 'YouTube Video'
+PLACEHOLDER_UPLOADER = 'YouTube Creator'
+
+YOUTUBE_HOSTS = ('youtube.com', 'youtube-nocookie.com', 'youtu.be')
+YOUTUBE_PATH_PREFIXES = ('/shorts/', '/embed/', '/live/', '/v/')
+
+# The two most common URL forms, matched without a full URL parse
+_FAST_YOUTUBE_URL = re.compile(
+    r'https?://(?:(?:www\.|m\.|music\.)?youtube\.com/watch\?v=([A-Za-z0-9_-]+)(?:[&#]|$)'
+    r'|youtu\.be/([A-Za-z0-9_-]+)(?:[?#]|$))')
+
+
+def canonical_video_id(url):
+    """
+    Return a canonical ID for a stream URL.
+
+    YouTube URLs in any of their forms (watch, youtu.be, shorts, embed,
+    music/mobile hosts) map to 'youtube:<video id>'. Other URLs map to a
+    normalized host + path + query string.
+    """
+    if not url:
+        return None
+
+    match = _FAST_YOUTUBE_URL.match(url)
+    if match:
+        return f"youtube:{match.group(1) or match.group(2)}"
+
+    parsed = urlparse(url.strip())
+    host = parsed.netloc.lower().split(':')[0]
+    for prefix in ('www.', 'm.', 'music.'):
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+            break
+    path = parsed.path.rstrip('/')
+
+    if host in YOUTUBE_HOSTS:
+        video_id = None
+        if host == 'youtu.be':
+            video_id = path.lstrip('/')
+        elif path == '/watch':
+            video_id = parse_qs(parsed.query).get('v', [None])[0]
+        else:
+            for prefix in YOUTUBE_PATH_PREFIXES:
+                if path.startswith(prefix):
+                    video_id = path[len(prefix):].split('/')[0]
+                    break
+        if video_id:
+            return f"youtube:{video_id}"
+
+    canonical = host + path
+    if parsed.query:
+        canonical += '?' + parsed.query
+    return canonical
+
+
+def connect(db_path):
+    """Open a PipePipe database with the tool's SQL functions registered."""
+    conn = sqlite3.connect(db_path)
+    conn.create_function('canonical_id', 1, canonical_video_id)
+    return conn
+
+
+@contextmanager
+def database(db):
+    """
+    Yield a connection for db, which is either a path or an open connection.
+
+    Connections opened here are closed afterwards; a connection passed in is
+    left open for the caller.
+    """
+    if isinstance(db, sqlite3.Connection):
+        yield db
+        return
+    conn = connect(db)
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+def table_columns(conn, table, schema='main'):
+    """Return the column names of a table in the given schema."""
+    cursor = conn.execute(f"PRAGMA {schema}.table_info({table})")
+    return [row[1] for row in cursor.fetchall()]
+
+
+def local_playlist_filter(column='p.name'):
+    """Return an SQL condition and parameters matching the local playlists."""
+    marks = ', '.join('?' for _ in LOCAL_PLAYLISTS)
+    return f"{column} IN ({marks})", list(LOCAL_PLAYLISTS)
+
+
+def select_placeholder_streams(conn, extra_columns=()):
+    """
+    Return rows of streams in local playlists that still have placeholder metadata.
+
+    Each row is (uid, url) followed by any extra stream columns requested.
+    """
+    playlist_condition, params = local_playlist_filter()
+    columns = ''.join(f", s.{column}" for column in extra_columns)
+    query = f"""
+    SELECT DISTINCT s.uid, s.url{columns}
+    FROM streams s
+    JOIN playlist_stream_join psj ON s.uid = psj.stream_id
+    JOIN playlists p ON psj.playlist_id = p.uid
+    WHERE {playlist_condition}
+    AND s.title = ?
+    AND s.uploader = ?
+    ORDER BY s.uid
+    """
+    cursor = conn.execute(query, params + [PLACEHOLDER_TITLE, PLACEHOLDER_UPLOADER])
+    return cursor.fetchall()
+
+
+def stream_priorities(conn):
+    """
+    Return a dict of stream uid -> priority for videos in the local playlists.
+
+    Lower values come first: a video's priority is its best position in any
+    local playlist, counted from the top of Watch Later and from the most
+    recent like, so the videos the user sees first are looked up first.
+    Videos in several local playlists come before others at the same position.
+    """
+    playlist_condition, params = local_playlist_filter()
+    marks = ', '.join('?' for _ in NEWEST_LAST_PLAYLISTS)
+    cursor = conn.execute(f"""
+    SELECT stream_id, MIN(position), COUNT(*)
+    FROM (
+        SELECT psj.stream_id, ROW_NUMBER() OVER (
+            PARTITION BY psj.playlist_id
+            ORDER BY CASE WHEN p.name IN ({marks}) THEN -psj.join_index ELSE psj.join_index END
+        ) AS position
+        FROM playlist_stream_join psj
+        JOIN playlists p ON psj.playlist_id = p.uid
+        WHERE {playlist_condition}
+    )
+    GROUP BY stream_id
+    """, list(NEWEST_LAST_PLAYLISTS) + params)
+    return {uid: (position, -memberships) for uid, position, memberships in cursor}
+
+
+class StreamWriter:
+    """
+    Buffers stream metadata updates and writes them in batches.
+
+    Updates are applied with one executemany() and one commit per batch
+    instead of a commit per video.
+    """
+
+    UPDATE_QUERY = """
+    UPDATE streams
+    SET title = ?, uploader = ?, duration = ?, view_count = ?, thumbnail_url = ?
+    WHERE uid = ?
+    """
+
+    def __init__(self, conn, batch_size=50):
+        """Create a writer on an open connection."""
+        self.conn = conn
+        self.batch_size = batch_size
+        self.pending = []
+        self.written = 0
+
+    def write(self, uid, metadata):
+        """Queue a metadata update for one stream row."""
+        self.pending.append((
+            metadata['title'],
+            metadata['uploader'],
+            metadata['duration'],
+            metadata['view_count'],
+            metadata['thumbnail_url'],
+            uid
+        ))
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Write and commit all queued updates."""
+        if not self.pending:
+            return
+        self.conn.executemany(self.UPDATE_QUERY, self.pending)
+        self.conn.commit()
+        self.written += len(self.pending)
+        self.pending = []
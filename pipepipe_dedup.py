@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+PipePipe duplicate consolidation - one stream row per video
+
+The same video can be stored as several stream rows (different URL forms,
+or imported more than once), so playlists point at different copies and
+the metadata update looks each copy up separately. This module groups the
+rows by canonical video ID, keeps one surviving row per video and, in bulk
+SQL within a single transaction:
+- repoints playlist_stream_join entries to the surviving row, keeping each
+  entry's join_index so playlist order is unchanged; when a playlist ends
+  up with the same video twice, only its first entry is kept
+- repoints other tables that reference streams (watch history, playback
+  state, feed), keeping the surviving row's entry where both have one
+- deletes the redundant stream rows
+
+The surviving row is the one with real metadata when there is one, and the
+lowest uid otherwise.
+
+Author: GitHub Community
+License: MIT
+"""
+
+import os
+import sys
+
+from pipepipe_control import OperationCancelled, checkpoint
+from pipepipe_db import PLACEHOLDER_TITLE, PLACEHOLDER_UPLOADER, database
+
+
+def stream_references(conn):
+    """Return (table, column) for every column other than playlist_stream_join's referencing streams."""
+    references = []
+    tables = [row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'")]
+    for table in tables:
+        if table == 'playlist_stream_join':
+            continue
+        for row in conn.execute(f"PRAGMA foreign_key_list({table})"):
+            if row[2] == 'streams':
+                references.append((table, row[3]))
+    return references
+
+
+def consolidate_duplicates(db, control=None):
+    """
+    Merge duplicate stream rows into one row per canonical video ID.
+
+    db is a database path or an open connection (see pipepipe_db.database).
+    Returns a dict with the number of videos that had duplicates ('videos'),
+    stream rows removed ('removed'), playlist entries repointed
+    ('repointed') and duplicate playlist entries dropped ('dropped'), or
+    None when cancelled through control; a cancelled run is rolled back.
+    """
+    with database(db) as conn:
+        try:
+            checkpoint(control)
+
+            # Rank the rows of each video: real metadata first, then lowest uid
+            conn.execute("""
+            CREATE TEMP TABLE dedup_map (uid INTEGER PRIMARY KEY, survivor INTEGER NOT NULL)
+            """)
+            conn.execute("""
+            INSERT INTO dedup_map (uid, survivor)
+            SELECT uid, survivor FROM (
+                SELECT uid, FIRST_VALUE(uid) OVER (
+                    PARTITION BY cid ORDER BY placeholder, uid) AS survivor
+                FROM (
+                    SELECT uid, canonical_id(url) AS cid, title = ? AND uploader = ? AS placeholder
+                    FROM streams
+                    WHERE url IS NOT NULL AND url != ''
+                )
+            )
+            WHERE uid != survivor
+            """, (PLACEHOLDER_TITLE, PLACEHOLDER_UPLOADER))
+            videos = conn.execute("SELECT COUNT(DISTINCT survivor) FROM temp.dedup_map").fetchone()[0]
+
+            repointed = conn.execute("""
+            UPDATE playlist_stream_join
+            SET stream_id = (SELECT survivor FROM temp.dedup_map WHERE uid = playlist_stream_join.stream_id)
+            WHERE stream_id IN (SELECT uid FROM temp.dedup_map)
+            """).rowcount
+
+            # A playlist that held several copies keeps the video at its first position
+            dropped = conn.execute("""
+            DELETE FROM playlist_stream_join
+            WHERE rowid IN (
+                SELECT entry FROM (
+                    SELECT rowid AS entry, ROW_NUMBER() OVER (
+                        PARTITION BY playlist_id, stream_id ORDER BY join_index) AS position
+                    FROM playlist_stream_join
+                    WHERE stream_id IN (SELECT survivor FROM temp.dedup_map)
+                )
+                WHERE position > 1
+            )
+            """).rowcount
+
+            for table, column in stream_references(conn):
+                conn.execute(f"""
+                UPDATE OR IGNORE {table}
+                SET {column} = (SELECT survivor FROM temp.dedup_map WHERE uid = {table}.{column})
+                WHERE {column} IN (SELECT uid FROM temp.dedup_map)
+                """)
+                # Entries that clashed with the surviving row's own entry
+                conn.execute(f"DELETE FROM {table} WHERE {column} IN (SELECT uid FROM temp.dedup_map)")
+
+            removed = conn.execute("""
+            DELETE FROM streams WHERE uid IN (SELECT uid FROM temp.dedup_map)
+            """).rowcount
+            conn.execute("DROP TABLE temp.dedup_map")
+
+            # Last chance to back out before the changes become permanent
+            checkpoint(control)
+            conn.commit()
+            return {
+                'videos': videos,
+                'removed': removed,
+                'repointed': repointed,
+                'dropped': dropped,
+            }
+        except OperationCancelled:
+            conn.rollback()
+            return None
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            # A cancelled or failed run leaves nothing behind, not even the temp table
+            conn.execute("DROP TABLE IF EXISTS temp.dedup_map")
+
+
+def main():
+    """Consolidate duplicate stream rows in a PipePipe.db."""
+    if len(sys.argv) < 2:
+        print("Usage: python pipepipe_dedup.py <PipePipe.db>")
+        sys.exit(1)
+
+    db_path = sys.argv[1]
+    if not os.path.exists(db_path):
+        print(f"Error: Database not found: {db_path}")
+        sys.exit(1)
+
+    report = consolidate_duplicates(db_path)
+    print(f"Videos with duplicates: {report['videos']}")
+    print(f"Duplicate rows removed: {report['removed']}")
+    print(f"Playlist entries repointed: {report['repointed']}")
+    print(f"Duplicate playlist entries dropped: {report['dropped']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+PipePipe export - library snapshots as JSONL, CSV or columnar chunks
+
+Streams the streams table joined with the playlists each video is in, one
+row per playlist entry (videos in no playlist get one row without a
+playlist). Rows are read with fetchmany() in fixed-size chunks and written
+as they come, so memory use does not grow with the library. Formats:
+- jsonl: one JSON object per row, built by SQLite's json_object()
+- csv: a header line and one line per row
+- columns: one JSON object per chunk mapping each column to its list of
+  values, a simple columnar layout for loading into data frames
+
+Output is gzip-compressed with compress=True or a '.gz' file name. The
+PipePipe.db of a backup zip is extracted into a temporary folder that is
+removed afterwards, so the export always shows the backup as it is in the
+zip, never a work folder that an update has already changed.
+
+    python pipepipe_export.py backup.zip library.jsonl.gz
+
+Author: GitHub Community
+License: MIT
+"""
+
+import csv
+import gzip
+import json
+import os
+import sys
+
+from pipepipe_backup import library_database
+from pipepipe_db import database
+
+FORMATS = ('jsonl', 'csv', 'columns')
+
+CHUNK_ROWS = 10000
+
+# Exported columns as (name, SQL expression)
+EXPORT_COLUMNS = (
+    ('uid', 's.uid'),
+    ('service_id', 's.service_id'),
+    ('url', 's.url'),
+    ('title', 's.title'),
+    ('uploader', 's.uploader'),
+    ('uploader_url', 's.uploader_url'),
+    ('duration', 's.duration'),
+    ('view_count', 's.view_count'),
+    ('upload_date', 's.upload_date'),
+    ('thumbnail_url', 's.thumbnail_url'),
+    ('playlist_id', 'p.uid'),
+    ('playlist', 'p.name'),
+    ('join_index', 'psj.join_index'),
+)
+
+EXPORT_FROM = """
+FROM streams s
+LEFT JOIN playlist_stream_join psj ON psj.stream_id = s.uid
+LEFT JOIN playlists p ON p.uid = psj.playlist_id
+ORDER BY s.uid, p.uid, psj.join_index
+"""
+
+
+def format_for(output_path):
+    """Guess the export format from the output file name."""
+    name = output_path[:-3] if output_path.endswith('.gz') else output_path
+    if name.endswith('.csv'):
+        return 'csv'
+    if name.endswith('.columns.json'):
+        return 'columns'
+    return 'jsonl'
+
+
+def open_output(output_path, compress):
+    """Open the output file for text, gzip-compressed if requested."""
+    if compress:
+        return gzip.open(output_path, 'wt', encoding='utf-8', newline='', compresslevel=6)
+    return open(output_path, 'w', encoding='utf-8', newline='')
+
+
+def write_jsonl(conn, out, chunk_rows):
+    """Write one JSON object per row; the objects are built by SQLite."""
+    pairs = ', '.join(f"'{name}', {expression}" for name, expression in EXPORT_COLUMNS)
+    cursor = conn.execute(f"SELECT json_object({pairs}) {EXPORT_FROM}")
+    rows = 0
+    while True:
+        chunk = cursor.fetchmany(chunk_rows)
+        if not chunk:
+            return rows
+        out.write('\n'.join(row[0] for row in chunk))
+        out.write('\n')
+        rows += len(chunk)
+
+
+def select_rows(conn):
+    """Return a cursor over the export rows as tuples."""
+    expressions = ', '.join(expression for name, expression in EXPORT_COLUMNS)
+    return conn.execute(f"SELECT {expressions} {EXPORT_FROM}")
+
+
+def write_csv(conn, out, chunk_rows):
+    """Write a header and one CSV line per row."""
+    writer = csv.writer(out)
+    writer.writerow([name for name, expression in EXPORT_COLUMNS])
+    cursor = select_rows(conn)
+    rows = 0
+    while True:
+        chunk = cursor.fetchmany(chunk_rows)
+        if not chunk:
+            return rows
+        writer.writerows(chunk)
+        rows += len(chunk)
+
+
+def write_columns(conn, out, chunk_rows):
+    """Write one JSON object of column lists per chunk."""
+    names = [name for name, expression in EXPORT_COLUMNS]
+    cursor = select_rows(conn)
+    rows = 0
+    while True:
+        chunk = cursor.fetchmany(chunk_rows)
+        if not chunk:
+            return rows
+        out.write(json.dumps(dict(zip(names, map(list, zip(*chunk)))), ensure_ascii=False))
+        out.write('\n')
+        rows += len(chunk)
+
+
+WRITERS = {
+    'jsonl': write_jsonl,
+    'csv': write_csv,
+    'columns': write_columns,
+}
+
+
+def export_library(db, output_path, export_format=None, compress=None, chunk_rows=CHUNK_ROWS):
+    """
+    Export the library of a PipePipe database to output_path.
+
+    db is a database path or an open connection (see pipepipe_db.database).
+    export_format is one of FORMATS (default: from the file name) and
+    compress defaults to whether the file name ends in '.gz'. Returns the
+    number of rows written.
+    """
+    export_format = export_format or format_for(output_path)
+    if export_format not in WRITERS:
+        raise ValueError(f"Unknown export format: {export_format}")
+    if compress is None:
+        compress = output_path.endswith('.gz')
+
+    with database(db) as conn, open_output(output_path, compress) as out:
+        return WRITERS[export_format](conn, out, chunk_rows)
+
+
+def export_backup(backup_path, output_path, export_format=None, compress=None):
+    """Export the library of a backup zip (or a PipePipe.db file) to output_path; returns the rows written."""
+    with library_database(backup_path, prefix='pipepipe_export_') as db_path:
+        return export_library(db_path, output_path, export_format, compress)
+
+
+def main():
+    """Export the library of a backup or PipePipe.db."""
+    args = sys.argv[1:]
+    export_format = None
+    compress = None
+    if '--format' in args:
+        index = args.index('--format')
+        export_format = args[index + 1]
+        del args[index:index + 2]
+    if '--gzip' in args:
+        args.remove('--gzip')
+        compress = True
+    if len(args) != 2:
+        print("Usage: python pipepipe_export.py <backup.zip|PipePipe.db> <output file> "
+              f"[--format {'|'.join(FORMATS)}] [--gzip]")
+        sys.exit(1)
+
+    source, output_path = args
+    if not os.path.exists(source):
+        print(f"Error: File not found: {source}")
+        sys.exit(1)
+
+    rows = export_backup(source, output_path, export_format, compress)
+    print(f"Exported {rows} rows to {output_path}")
+
+
+if __name__ == "__main__":
+    main()
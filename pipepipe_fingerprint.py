@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+PipePipe fingerprints - skip videos already handled in an earlier run
+
+Recurring jobs process a new backup of the same device again and again,
+while only a few rows change in between. The fingerprint store records,
+for every placeholder video that was looked up, a hash of its stream row
+(all columns except uid) under its canonical video ID, together with the
+outcome: the metadata found, or that the video is gone for good.
+
+On the next run the placeholder rows of the new PipePipe.db are hashed and
+diffed against the store. Rows whose hash is unchanged get their recorded
+outcome back without a lookup; only new or changed rows are looked up, so
+the work follows the size of the change rather than the size of the
+library. Lookups that failed with a transient error are not recorded and
+are tried again.
+
+The store is a small SQLite file, by default in the work folder root (see
+pipepipe_workspace). Row hashes carry no uid, so one store can be shared
+by the backups of several devices.
+
+Author: GitHub Community
+License: MIT
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+
+from pipepipe_db import PLACEHOLDER_TITLE, PLACEHOLDER_UPLOADER, canonical_video_id, table_columns
+
+FINGERPRINT_FILE = 'fingerprints.db'
+
+# Rows per query when looking up many video IDs at once
+LOOKUP_CHUNK = 500
+
+
+def placeholder_fingerprints(conn):
+    """Return a dict of uid -> (video ID, row hash) for every stream with placeholder metadata."""
+    columns = [c for c in table_columns(conn, 'streams') if c != 'uid']
+    cursor = conn.execute(f"""
+    SELECT uid, {', '.join(columns)}
+    FROM streams
+    WHERE title = ? AND uploader = ?
+    """, (PLACEHOLDER_TITLE, PLACEHOLDER_UPLOADER))
+
+    fingerprints = {}
+    url_index = columns.index('url')
+    for row in cursor:
+        values = row[1:]
+        digest = hashlib.blake2b('\x1f'.join(map(str, values)).encode('utf-8'), digest_size=16)
+        fingerprints[row[0]] = (canonical_video_id(values[url_index]), digest.hexdigest())
+    return fingerprints
+
+
+class FingerprintStore:
+    """Row hashes and lookup outcomes of earlier runs, kept in a SQLite file."""
+
+    def __init__(self, path):
+        """Open (or create) the store at path."""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        # Shared by the worker threads of concurrent jobs (see pipepipe_daemon)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.conn.execute("""
+        CREATE TABLE IF NOT EXISTS fingerprints (
+            video_id TEXT PRIMARY KEY,
+            row_hash TEXT NOT NULL,
+            metadata TEXT
+        )
+        """)
+        self.conn.commit()
+
+    @classmethod
+    def in_directory(cls, directory):
+        """Open the store kept in the given directory, e.g. the work folder root."""
+        return cls(os.path.join(directory, FINGERPRINT_FILE))
+
+    def known(self, fingerprints):
+        """
+        Return the recorded outcomes of unchanged rows.
+
+        fingerprints is a dict of uid -> (video ID, row hash) as returned by
+        placeholder_fingerprints(). The result maps the uid of every row
+        whose hash matches the store to its recorded metadata, or to None
+        when the video was found to be unavailable.
+        """
+        by_video = {}
+        for uid, (video_id, row_hash) in fingerprints.items():
+            if video_id is not None:
+                by_video.setdefault(video_id, []).append((uid, row_hash))
+
+        known = {}
+        video_ids = list(by_video)
+        with self.lock:
+            for start in range(0, len(video_ids), LOOKUP_CHUNK):
+                chunk = video_ids[start:start + LOOKUP_CHUNK]
+                marks = ', '.join('?' for _ in chunk)
+                cursor = self.conn.execute(
+                    f"SELECT video_id, row_hash, metadata FROM fingerprints WHERE video_id IN ({marks})", chunk)
+                for video_id, stored_hash, metadata in cursor:
+                    for uid, row_hash in by_video[video_id]:
+                        if row_hash == stored_hash:
+                            known[uid] = json.loads(metadata) if metadata else None
+        return known
+
+    def record(self, outcomes):
+        """Record (video ID, row hash, metadata or None) outcomes, replacing older entries."""
+        rows = [(video_id, row_hash, json.dumps(metadata) if metadata else None)
+                for video_id, row_hash, metadata in outcomes if video_id is not None]
+        with self.lock:
+            self.conn.executemany("""
+            INSERT OR REPLACE INTO fingerprints (video_id, row_hash, metadata) VALUES (?, ?, ?)
+            """, rows)
+            self.conn.commit()
+
+    def close(self):
+        """Close the store."""
+        self.conn.close()
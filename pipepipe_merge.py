@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+PipePipe backup merge - offline metadata transfer between two backups
+
+Copies known-good metadata from an older PipePipe.db into a newer one for
+videos that only have placeholder metadata in the newer database. Rows are
+matched on canonical video ID, so different URL forms of the same video are
+joined. Everything runs as set-based SQL over an attached database; no
+network access is needed. Videos that could not be filled are reported so
+that the network metadata update only has to handle the remainder.
+
+Author: GitHub Community
+License: MIT
+"""
+
+import os
+import sys
+
+from pipepipe_db import (
+    PLACEHOLDER_TITLE,
+    PLACEHOLDER_UPLOADER,
+    database,
+    select_placeholder_streams,
+    table_columns,
+)
+
+# Stream columns copied from the source database, when present in both schemas
+MERGE_COLUMNS = (
+    'title',
+    'uploader',
+    'uploader_url',
+    'duration',
+    'view_count',
+    'thumbnail_url',
+    'textual_upload_date',
+    'upload_date',
+    'is_upload_date_approximation',
+)
+
+
+def merge_databases(target_db, source_db):
+    """
+    Fill placeholder streams in target_db with metadata from source_db.
+
+    target_db is a database path or an open connection (see
+    pipepipe_db.database); source_db is the path of the older database.
+
+    Returns a dict with the number of source rows with usable metadata
+    ('source_known'), the number of target rows filled ('filled') and a list
+    of (uid, url) for local playlist videos that still have placeholder
+    metadata ('unfilled').
+    """
+    with database(target_db) as conn:
+        conn.execute("ATTACH DATABASE ? AS source", (source_db,))
+        try:
+            source_columns = set(table_columns(conn, 'streams', 'source'))
+            columns = [c for c in MERGE_COLUMNS
+                       if c in source_columns and c in table_columns(conn, 'streams')]
+
+            # Known-good source rows, one per canonical video ID
+            conn.execute("""
+            CREATE TEMP TABLE merge_source (cid TEXT PRIMARY KEY, uid INTEGER NOT NULL)
+            """)
+            conn.execute("""
+            INSERT INTO merge_source (cid, uid)
+            SELECT canonical_id(url), MIN(uid)
+            FROM source.streams
+            WHERE NOT (title = ? AND uploader = ?)
+            AND title IS NOT NULL AND title != ''
+            GROUP BY canonical_id(url)
+            """, (PLACEHOLDER_TITLE, PLACEHOLDER_UPLOADER))
+            source_known = conn.execute("SELECT COUNT(*) FROM merge_source").fetchone()[0]
+
+            # Placeholder target rows joined to their source row
+            conn.execute("""
+            CREATE TEMP TABLE merge_map (target_uid INTEGER PRIMARY KEY, source_uid INTEGER NOT NULL)
+            """)
+            conn.execute("""
+            INSERT INTO merge_map (target_uid, source_uid)
+            SELECT t.uid, m.uid
+            FROM main.streams t
+            JOIN merge_source m ON m.cid = canonical_id(t.url)
+            WHERE t.title = ? AND t.uploader = ?
+            """, (PLACEHOLDER_TITLE, PLACEHOLDER_UPLOADER))
+
+            column_list = ', '.join(columns)
+            source_list = ', '.join(f"s.{c}" for c in columns)
+            cursor = conn.execute(f"""
+            UPDATE main.streams
+            SET ({column_list}) = (
+                SELECT {source_list}
+                FROM source.streams s
+                JOIN merge_map m ON m.source_uid = s.uid
+                WHERE m.target_uid = streams.uid
+            )
+            WHERE uid IN (SELECT target_uid FROM merge_map)
+            """)
+            filled = cursor.rowcount
+            conn.commit()
+
+            unfilled = select_placeholder_streams(conn)
+
+            return {
+                'source_known': source_known,
+                'filled': filled,
+                'unfilled': unfilled,
+            }
+        except BaseException:
+            # A failed merge leaves no half-done update behind
+            conn.rollback()
+            raise
+        finally:
+            # ...and no temp tables or attachment
+            conn.execute("DROP TABLE IF EXISTS temp.merge_map")
+            conn.execute("DROP TABLE IF EXISTS temp.merge_source")
+            conn.execute("DETACH DATABASE source")
+
+
+def main():
+    """Merge metadata from an older PipePipe.db into a newer one."""
+    if len(sys.argv) < 3:
+        print("Usage: python pipepipe_merge.py <newer PipePipe.db> <older PipePipe.db>")
+        sys.exit(1)
+
+    target_db, source_db = sys.argv[1], sys.argv[2]
+    for path in (target_db, source_db):
+        if not os.path.exists(path):
+            print(f"Error: Database not found: {path}")
+            sys.exit(1)
+
+    report = merge_databases(target_db, source_db)
+    print(f"Known metadata in older backup: {report['source_known']}")
+    print(f"Filled from older backup: {report['filled']}")
+    print(f"Still missing metadata: {len(report['unfilled'])}")
+    for uid, url in report['unfilled']:
+        print(f"  {uid}: {url}")
+
+
+if __name__ == "__main__":
+    main()
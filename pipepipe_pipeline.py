@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+PipePipe pipeline - dedup, merge, update and clean in a single pass
+
+Runs the whole "Do Both" processing over one working copy of PipePipe.db:
+1. Optionally merge duplicate stream rows into one row per video, so each
+   video is only looked up once (see pipepipe_dedup)
+2. Optionally fill placeholder videos from an older backup (offline)
+3. Resolve the remaining placeholder videos; resolved metadata is written
+   through the batched writer as it arrives
+4. Remove the videos whose lookup failed from the local playlists in one
+   set-based transaction
+
+The database is opened once (in memory when small, see pipepipe_workspace)
+and written back once at the end. Larger databases are opened through a
+ConnectionManager (see pipepipe_connections), so a statistics report can
+be read alongside the writes.
+
+process_backup() runs the same pass on a backup zip, from extraction into
+its work folder to the processed zip, for callers without the GUI (see
+pipepipe_daemon). The backup is checked before processing and the written
+zip before it is handed out (see pipepipe_validate).
+
+Author: GitHub Community
+License: MIT
+"""
+
+import os
+import threading
+
+from pipepipe_backup import write_backup
+from pipepipe_clean import clean_unavailable
+from pipepipe_connections import ConnectionManager
+from pipepipe_dedup import consolidate_duplicates
+from pipepipe_merge import merge_databases
+from pipepipe_search import update_index
+from pipepipe_stats import library_stats
+from pipepipe_update import update_streams
+from pipepipe_validate import validate_backup
+from pipepipe_workspace import MEMORY_DB_LIMIT, WorkspaceManager, open_database, save_database
+
+
+def process_database(db_path, resolver, source_db=None, group_by_channel=False, clean=True,
+                     dedup=False, time_budget=None, fingerprints=None, cache=None, in_memory=None,
+                     stats=False, throughput=None, log=print, control=None, progress=None):
+    """
+    Merge, update and clean the PipePipe.db at db_path in one pass.
+
+    source_db is the path of an older PipePipe.db to copy known metadata
+    from; time_budget caps the seconds spent on lookups, fingerprints skips
+    rows unchanged since an earlier run, cache fills videos from earlier
+    lookups and progress reports finished lookups (see
+    pipepipe_update.update_streams). With stats, a statistics report of the
+    database before processing is made (see pipepipe_stats, throughput is
+    passed on); for a database on disk it runs on a reader connection while
+    the processing writes. A search index built for the database is synced
+    afterwards (see pipepipe_search).
+
+    Returns a dict with the statistics report under 'stats' (None without
+    stats), the duplicate consolidation report under 'dedup' (None without
+    dedup or when cancelled), the merge report under 'merge' (None without
+    source_db), the update result under 'update' and the number of videos
+    removed under 'removed' (None when cleanup was skipped or cancelled).
+    """
+    if in_memory is None:
+        in_memory = os.path.getsize(db_path) <= MEMORY_DB_LIMIT
+    manager = None
+    if in_memory:
+        conn = open_database(db_path, in_memory=True)
+    else:
+        manager = ConnectionManager(db_path)
+        conn = manager.writer
+
+    report = {}
+    stats_thread = None
+    try:
+        if stats and manager:
+            stats_thread = stats_in_background(manager, throughput, report)
+        elif stats:
+            report['stats'] = library_stats(conn, throughput)
+
+        dedup_report = consolidate_duplicates(conn, control=control) if dedup else None
+        merge = merge_databases(conn, source_db) if source_db else None
+
+        result = update_streams(conn, resolver, group_by_channel=group_by_channel,
+                                log=log, control=control, time_budget=time_budget,
+                                fingerprints=fingerprints, cache=cache, progress=progress)
+
+        # Only videos that were actually looked up and failed are removed;
+        # after a cancel, the rest are kept for the next run
+        removed = None
+        if clean and not result['cancelled']:
+            removed = clean_unavailable(conn, uids=result['unavailable'], control=control)
+
+        save_database(conn, db_path)
+        update_index(db_path)
+        if stats_thread:
+            stats_thread.join()
+        return {
+            'stats': report.get('stats'),
+            'dedup': dedup_report,
+            'merge': merge,
+            'update': result,
+            'removed': removed,
+        }
+    finally:
+        if stats_thread:
+            stats_thread.join()
+        if manager:
+            manager.close()
+        else:
+            conn.close()
+
+
+def process_backup(backup_path, output_path, resolver, workspaces=None, dedup=False,
+                   time_budget=None, fingerprints=None, cache=None, log=print, control=None,
+                   progress=None):
+    """
+    Process a backup zip in one pass and write the result to output_path.
+
+    The backup is extracted into its work folder, or an earlier one is
+    reused (see pipepipe_workspace.WorkspaceManager), and processed with
+    process_database(); it is leased until the run ends, so other jobs do
+    not evict it. The zip is written under a temporary name, checked and
+    then renamed, so output_path never holds a partial or damaged backup.
+
+    Returns the process_database() result with 'output' set to output_path,
+    or to None when the run was cancelled before the backup was written.
+    Raises ValueError when the backup or the written zip fails its check.
+    """
+    workspaces = workspaces or WorkspaceManager()
+    working_dir, reused = workspaces.acquire(backup_path)
+    try:
+        if reused:
+            log(f"Continuing in work folder {working_dir}")
+        db_path = os.path.join(working_dir, 'PipePipe.db')
+
+        # Extraction verified the CRCs; check the settings and the working database
+        report = validate_backup(backup_path, db_path=db_path, check_crc=False)
+        if not report['ok']:
+            workspaces.discard(working_dir)
+            raise ValueError(f"Backup failed its check: {'; '.join(report['problems'])}")
+
+        result = process_database(db_path, resolver, dedup=dedup,
+                                  time_budget=time_budget, fingerprints=fingerprints, cache=cache,
+                                  log=log, control=control, progress=progress)
+        result['output'] = None
+        if result['update']['cancelled']:
+            return result
+
+        partial = output_path + '.partial'
+        if write_backup(working_dir, partial, control):
+            report = validate_backup(partial, db_path=db_path)
+            if not report['ok']:
+                os.remove(partial)
+                raise ValueError(f"Written backup failed its check: {'; '.join(report['problems'])}")
+            os.replace(partial, output_path)
+            result['output'] = output_path
+        return result
+    finally:
+        workspaces.release(working_dir)
+
+
+def stats_in_background(manager, throughput, report):
+    """
+    Start a thread making a statistics report into report['stats'].
+
+    Returns once the reader's snapshot is taken, so the report shows the
+    database as it was before any of the following writes.
+    """
+    snapshot_taken = threading.Event()
+
+    def work():
+        try:
+            with manager.reader() as reader:
+                reader.execute("BEGIN")
+                reader.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+                snapshot_taken.set()
+                report['stats'] = library_stats(reader, throughput)
+        finally:
+            snapshot_taken.set()
+
+    thread = threading.Thread(target=work, daemon=True)
+    thread.start()
+    snapshot_taken.wait()
+    return thread
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+PipePipe metadata refresh - keeps known metadata from going stale
+
+The metadata update only touches placeholder videos, so view counts and
+thumbnails of all other videos never change again. The refresh mode looks
+those videos up again according to a freshness policy:
+- max_age_days: refresh videos whose metadata was fetched more than N days
+  ago, or never by this tool (see pipepipe_cache)
+- top_k: only consider the K videos watched most often (from the watch
+  history; by view count when the backup has no history)
+
+Videos whose cached metadata is still fresh are not looked up; the cached
+values are copied into the backup instead when they differ. Lookups go
+through the same retry scheduler and concurrent resolver as the update, and
+max_calls caps the number of lookups per run so the load stays predictable;
+videos over the budget are refreshed on a later run, most watched and
+oldest first.
+
+A lookup that fails for good (the video was removed or made private) is
+recorded in the cache with the known metadata and the failure, so the video
+counts as fresh for max_age_days and, once stale again, comes after every
+other video instead of using up the call budget on every run.
+
+Author: GitHub Community
+License: MIT
+"""
+
+import os
+import sys
+import time
+
+from pipepipe_control import OperationCancelled
+from pipepipe_db import (
+    PLACEHOLDER_TITLE,
+    PLACEHOLDER_UPLOADER,
+    StreamWriter,
+    canonical_video_id,
+    database,
+)
+from pipepipe_resolver import TRANSIENT_ERRORS
+from pipepipe_retry import RetryScheduler
+from pipepipe_update import run_lookups
+
+DEFAULT_MAX_AGE_DAYS = 30
+DEFAULT_MAX_CALLS = 200
+
+# Stream columns a refresh can change
+REFRESH_COLUMNS = ('title', 'uploader', 'duration', 'view_count', 'thumbnail_url')
+
+# Key of the cached metadata recording a lookup that failed for good
+UNAVAILABLE_KEY = 'unavailable'
+
+
+def watch_counts_query(conn):
+    """Return the SQL giving (stream_id, watch count), from the history or the view count."""
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    if 'stream_history' in tables:
+        return "SELECT stream_id, SUM(repeat_count) AS watched FROM stream_history GROUP BY stream_id"
+    return "SELECT uid AS stream_id, COALESCE(view_count, 0) AS watched FROM streams"
+
+
+def merge_refreshed(row, metadata):
+    """Return the row's metadata updated with the looked-up values that are actually known."""
+    merged = dict(row)
+    for column in REFRESH_COLUMNS:
+        value = metadata.get(column)
+        if value in (None, 0, PLACEHOLDER_TITLE, PLACEHOLDER_UPLOADER):
+            continue
+        merged[column] = value
+    return merged
+
+
+def select_stale_streams(conn, cache, max_age_days=DEFAULT_MAX_AGE_DAYS, top_k=None, now=None):
+    """
+    Apply the freshness policy to the videos with known metadata.
+
+    Returns (stale, fresh): stale is a list of (uid, url, video ID, row)
+    ordered most watched and oldest first, with videos whose last lookup
+    failed for good at the end; fresh is a list of (uid, row, cached
+    metadata) for videos whose cached metadata is fresh but differs from
+    the row. row is a dict of the REFRESH_COLUMNS.
+    """
+    now = time.time() if now is None else now
+    columns = ', '.join(f"s.{column}" for column in REFRESH_COLUMNS)
+    rows = conn.execute(f"""
+    SELECT s.uid, s.url, COALESCE(w.watched, 0), {columns}
+    FROM streams s
+    LEFT JOIN ({watch_counts_query(conn)}) w ON w.stream_id = s.uid
+    WHERE NOT (s.title = ? AND s.uploader = ?)
+    """, (PLACEHOLDER_TITLE, PLACEHOLDER_UPLOADER)).fetchall()
+
+    if top_k is not None:
+        rows.sort(key=lambda row: (-row[2], row[0]))
+        rows = rows[:top_k]
+
+    video_ids = {row[0]: canonical_video_id(row[1]) for row in rows}
+    cached = cache.get_many(video_ids.values())
+    max_age = max_age_days * 86400 if max_age_days is not None else None
+
+    stale = []
+    fresh = []
+    for uid, url, watched, *values in rows:
+        row = dict(zip(REFRESH_COLUMNS, values))
+        entry = cached.get(video_ids[uid])
+        if entry is not None and max_age is not None and now - entry[1] < max_age:
+            if merge_refreshed(row, entry[0]) != row:
+                fresh.append((uid, row, entry[0]))
+            continue
+        fetched_at = entry[1] if entry is not None else 0.0
+        failed = entry is not None and UNAVAILABLE_KEY in entry[0]
+        stale.append(((failed, -watched, fetched_at, uid), (uid, url, video_ids[uid], row)))
+
+    stale.sort(key=lambda item: item[0])
+    return [item[1] for item in stale], fresh
+
+
+def refresh_streams(db, resolver, cache, max_age_days=DEFAULT_MAX_AGE_DAYS, top_k=None,
+                    max_calls=DEFAULT_MAX_CALLS, delay=0.5, log=print, control=None):
+    """
+    Refresh stale metadata of videos that are not placeholders.
+
+    db is a database path or an open connection (see pipepipe_db.database)
+    and cache a MetadataCache. See the module docstring for the policy.
+
+    Returns a dict with the counts 'stale', 'from_cache', 'refreshed',
+    'errors', 'resolver_calls' and 'deferred' (stale videos left for a
+    later run by the call budget), 'error_kinds' counting failures per
+    error class, and 'cancelled'. Failed lookups leave the row unchanged;
+    those that failed for good are recorded in the cache.
+    """
+    with database(db) as conn:
+        writer = StreamWriter(conn)
+        stale, fresh = select_stale_streams(conn, cache, max_age_days, top_k)
+        log(f"Found {len(stale)} videos to refresh")
+
+        for uid, row, metadata in fresh:
+            writer.write(uid, merge_refreshed(row, metadata))
+        writer.flush()
+
+        scheduler = RetryScheduler(max_total_attempts=max_calls)
+        rows = {}
+        for priority, (uid, url, video_id, row) in enumerate(stale):
+            scheduler.add(uid, url, priority)
+            rows[uid] = (video_id, row)
+
+        refreshed = []
+        unavailable = []
+        error_kinds = {}
+        cancelled = False
+        try:
+            for uid, url, metadata, error_kind in run_lookups(scheduler, resolver, delay, control):
+                if metadata:
+                    video_id, row = rows[uid]
+                    merged = merge_refreshed(row, metadata)
+                    writer.write(uid, merged)
+                    refreshed.append((video_id, dict(metadata, **merged)))
+                else:
+                    error_kinds[error_kind] = error_kinds.get(error_kind, 0) + 1
+                    if error_kind not in TRANSIENT_ERRORS:
+                        video_id, row = rows[uid]
+                        unavailable.append((video_id, dict(row, **{UNAVAILABLE_KEY: error_kind})))
+        except OperationCancelled:
+            cancelled = True
+            log("Refresh cancelled, saving videos refreshed so far")
+        writer.flush()
+        cache.put_many(refreshed + unavailable)
+        if scheduler.skipped:
+            log(f"Call budget used up, {scheduler.skipped} videos left for a later run")
+
+        return {
+            'stale': len(stale),
+            'from_cache': len(fresh),
+            'refreshed': len(refreshed),
+            'errors': sum(error_kinds.values()),
+            'resolver_calls': scheduler.attempts,
+            'deferred': scheduler.skipped,
+            'error_kinds': error_kinds,
+            'cancelled': cancelled,
+        }
+
+
+def main():
+    """Refresh stale metadata in a PipePipe.db."""
+    args = sys.argv[1:]
+    options = {'--days': DEFAULT_MAX_AGE_DAYS, '--top': None, '--max-calls': DEFAULT_MAX_CALLS,
+               '--cookies': None}
+    for name in list(options):
+        if name in args:
+            index = args.index(name)
+            options[name] = args[index + 1] if name == '--cookies' else int(args[index + 1])
+            del args[index:index + 2]
+    if len(args) != 1:
+        print("Usage: python pipepipe_refresh.py <PipePipe.db> [--days N] [--top K] "
+              "[--max-calls N] [--cookies cookies.txt]")
+        sys.exit(1)
+
+    db_path = args[0]
+    if not os.path.exists(db_path):
+        print(f"Error: Database not found: {db_path}")
+        sys.exit(1)
+
+    from pipepipe_cache import MetadataCache
+    from pipepipe_routing import ServiceRouter
+    from pipepipe_search import update_index
+    from pipepipe_session import create_resolver
+    from pipepipe_workspace import WorkspaceManager
+
+    cache = MetadataCache.in_directory(WorkspaceManager().root)
+    resolver = ServiceRouter(create_resolver(options['--cookies']))
+    try:
+        result = refresh_streams(db_path, resolver, cache, max_age_days=options['--days'],
+                                 top_k=options['--top'], max_calls=options['--max-calls'])
+    finally:
+        cache.close()
+        resolver.close()
+    update_index(db_path)
+    print(f"Refreshed: {result['refreshed']}, from cache: {result['from_cache']}, "
+          f"errors: {result['errors']}, left for later: {result['deferred']}")
+
+
+if __name__ == "__main__":
+    main()
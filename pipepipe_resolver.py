@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+PipePipe metadata resolver - yt-dlp lookups behind a small interface
+
+A resolver turns stream URLs into metadata dicts with the keys title,
+uploader, duration, view_count, upload_date and thumbnail_url. Two lookups
+are supported:
+- resolve(url): metadata for a single video
+- list_flat(url): metadata for every entry of a channel or playlist listing,
+  fetched with one flat (extract_flat) listing call
+
+Resolvers may also provide fetch(url, timeout), which returns the metadata
+or raises ResolveError with the error classified (throttled, network,
+removed, private, age-gated or unknown), so failed lookups can be retried
+or given up on depending on the kind of error.
+
+Author: GitHub Community
+License: MIT
+"""
+
+import subprocess
+from urllib.parse import urlparse
+
+from pipepipe_db import PLACEHOLDER_TITLE, PLACEHOLDER_UPLOADER
+
+# yt-dlp output templates, fields separated by '|||'
+METADATA_TEMPLATE = '%(title)s|||%(uploader)s|||%(duration)s|||%(view_count)s|||%(upload_date)s|||%(thumbnail)s'
+FLAT_TEMPLATE = ('%(url)s|||%(title)s|||%(channel,uploader,playlist_uploader)s|||%(duration)s'
+                 '|||%(view_count)s|||%(upload_date)s|||%(thumbnails.-1.url)s')
+
+FIELD_SEPARATOR = '|||'
+
+# Error classes for failed lookups
+ERROR_THROTTLED = 'throttled'
+ERROR_NETWORK = 'network'
+ERROR_REMOVED = 'removed'
+ERROR_PRIVATE = 'private'
+ERROR_AGE_GATED = 'age_gated'
+ERROR_UNKNOWN = 'unknown'
+
+# Errors worth retrying later
+TRANSIENT_ERRORS = (ERROR_THROTTLED, ERROR_NETWORK)
+
+# Errors meaning the video is gone for good; kept as unavailable for cleanup.
+# Unknown errors count as unavailable too, as failed lookups always have.
+DEFINITIVE_ERRORS = (ERROR_REMOVED, ERROR_PRIVATE, ERROR_UNKNOWN)
+
+# Lower-case fragments of yt-dlp error messages, checked in order
+ERROR_PATTERNS = (
+    (ERROR_THROTTLED, ('http error 429', 'too many requests', 'rate-limit', 'rate limit',
+                       "confirm you're not a bot", 'confirm you’re not a bot')),
+    (ERROR_AGE_GATED, ('confirm your age', 'age-restricted', 'age restricted', 'inappropriate for some users')),
+    (ERROR_PRIVATE, ('private video', 'video is private')),
+    (ERROR_REMOVED, ('video unavailable', 'has been removed', 'no longer available', 'been terminated',
+                     'does not exist', 'http error 404', 'http error 410')),
+    (ERROR_NETWORK, ('timed out', 'timeout', 'connection reset', 'connection refused', 'connection aborted',
+                     'name resolution', 'name or service not known', 'network is unreachable',
+                     'unable to download webpage', 'unable to download api page',
+                     'http error 500', 'http error 502', 'http error 503', 'http error 504',
+                     'remote end closed', 'ssl')),
+)
+
+
+class ResolveError(Exception):
+    """A failed lookup, with kind set to one of the ERROR_* classes."""
+
+    def __init__(self, kind, message='', timed_out=False):
+        """Create an error of the given class."""
+        super().__init__(f"{kind}: {message}" if message else kind)
+        self.kind = kind
+        self.message = message
+        self.timed_out = timed_out
+
+
+def classify_error(message):
+    """Return the ERROR_* class for a yt-dlp error message."""
+    text = message.lower()
+    for kind, fragments in ERROR_PATTERNS:
+        if any(fragment in text for fragment in fragments):
+            return kind
+    return ERROR_UNKNOWN
+
+
+def _field(value):
+    """Return a yt-dlp output field, or None when it is empty or 'NA'."""
+    value = value.strip()
+    if not value or value == 'NA':
+        return None
+    return value
+
+
+def _int_field(value):
+    """Return a yt-dlp output field as an int, or None when it is not numeric."""
+    value = _field(value)
+    try:
+        return int(float(value)) if value is not None else None
+    except ValueError:
+        return None
+
+
+def parse_metadata(output):
+    """Parse one METADATA_TEMPLATE line into a metadata dict, or None if malformed."""
+    parts = output.strip().split(FIELD_SEPARATOR)
+    if len(parts) < 4:
+        return None
+
+    parts += [''] * (6 - len(parts))
+    return {
+        'title': _field(parts[0]) or PLACEHOLDER_TITLE,
+        'uploader': _field(parts[1]) or PLACEHOLDER_UPLOADER,
+        'duration': _int_field(parts[2]) or 0,
+        'view_count': _int_field(parts[3]),
+        'upload_date': _field(parts[4]),
+        'thumbnail_url': _field(parts[5]),
+    }
+
+
+def parse_flat_entry(line):
+    """
+    Parse one FLAT_TEMPLATE line into (url, metadata).
+
+    Returns None when the entry lacks a URL, title or uploader; such videos
+    are left for a per-video lookup instead of getting placeholder values.
+    """
+    parts = line.strip().split(FIELD_SEPARATOR)
+    if len(parts) < 7:
+        return None
+
+    url, title, uploader = _field(parts[0]), _field(parts[1]), _field(parts[2])
+    if not (url and title and uploader):
+        return None
+
+    return url, {
+        'title': title,
+        'uploader': uploader,
+        'duration': _int_field(parts[3]) or 0,
+        'view_count': _int_field(parts[4]),
+        'upload_date': _field(parts[5]),
+        'thumbnail_url': _field(parts[6]),
+    }
+
+
+def channel_listing_url(uploader_url):
+    """Return the URL listing a channel's uploads for the given uploader URL."""
+    parsed = urlparse(uploader_url)
+    host = parsed.netloc.lower()
+    path = parsed.path.rstrip('/')
+    if host.endswith('youtube.com') and not path.endswith(('/videos', '/shorts', '/streams')):
+        return f"{parsed.scheme or 'https'}://{parsed.netloc}{path}/videos"
+    return uploader_url
+
+
+class YtDlpResolver:
+    """
+    Resolver that runs the yt-dlp command line tool for each lookup.
+
+    One child process is started per resolve() or list_flat() call.
+    """
+
+    def __init__(self, cookies_file=None, timeout=30, executable='yt-dlp'):
+        """Configure the resolver with an optional cookies file and per-call timeout."""
+        self.cookies_file = cookies_file
+        self.timeout = timeout
+        self.executable = executable
+
+    def build_command(self, args):
+        """Return the full yt-dlp command line for the given arguments."""
+        cmd = [self.executable] + list(args)
+        if self.cookies_file:
+            cmd.extend(['--cookies', self.cookies_file])
+        return cmd
+
+    def fetch(self, url, timeout=None):
+        """
+        Fetch metadata for a single video; raises ResolveError on failure.
+
+        A missing yt-dlp executable raises OSError instead, so it aborts the
+        run rather than marking every video as unavailable.
+        """
+        cmd = self.build_command(['--print', METADATA_TEMPLATE, '--no-download', url])
+        try:
+            result = subprocess.run(cmd, capture_output=True, text=True,
+                                    timeout=timeout or self.timeout)
+        except subprocess.TimeoutExpired:
+            raise ResolveError(ERROR_NETWORK, 'timed out', timed_out=True)
+
+        if result.returncode != 0:
+            raise ResolveError(classify_error(result.stderr), result.stderr.strip()[-200:])
+
+        metadata = parse_metadata(result.stdout)
+        if metadata is None:
+            raise ResolveError(ERROR_UNKNOWN, 'invalid response format')
+        return metadata
+
+    def resolve(self, url):
+        """Fetch metadata for a single video, or None if it could not be resolved."""
+        try:
+            return self.fetch(url)
+        except ResolveError:
+            return None
+
+    def list_flat(self, url):
+        """List (url, metadata) for every entry of a channel or playlist in one call."""
+        cmd = self.build_command(['--flat-playlist', '--print', FLAT_TEMPLATE, url])
+        try:
+            # Listings are paged by yt-dlp, so give them more time than single lookups
+            result = subprocess.run(cmd, capture_output=True, text=True, timeout=self.timeout * 10)
+        except (subprocess.TimeoutExpired, OSError):
+            return []
+
+        entries = []
+        for line in result.stdout.splitlines():
+            entry = parse_flat_entry(line)
+            if entry:
+                entries.append(entry)
+        return entries
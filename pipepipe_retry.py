@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+PipePipe retry scheduler - exponential backoff for failed lookups
+
+Lookups that fail with a transient error (throttled, network) are requeued
+with a jittered exponential backoff and run after all fresh lookups, so a
+flaky video does not hold up the rest. Permanent errors (removed, private,
+age-gated, unknown) are given up on at once.
+
+Each attempt gets its own timeout: it starts from a multiple of the recent
+successful lookup times instead of a fixed 30 s, so hung lookups are cut
+short, and it doubles for a video whose previous attempt timed out.
+
+A deadline can be set to cap the time spent, and an attempt budget to cap
+the number of lookups: once either is used up, no new attempts are started
+and the remaining videos are skipped.
+
+Tasks can be grouped, e.g. by service (see pipepipe_routing), so a driver
+can take the next task from the groups it has room for without scanning
+the tasks of the others.
+
+Author: GitHub Community
+License: MIT
+"""
+
+import heapq
+import itertools
+import random
+import time
+
+from pipepipe_control import checkpoint
+from pipepipe_resolver import ERROR_UNKNOWN, TRANSIENT_ERRORS, ResolveError
+
+
+class AdaptiveTimeout:
+    """Per-attempt lookup timeouts derived from recent successful lookup times."""
+
+    def __init__(self, initial=30.0, minimum=5.0, maximum=60.0, factor=4.0, window=50):
+        """Start at initial seconds; later timeouts are factor x the median success time."""
+        self.initial = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.factor = factor
+        self.window = window
+        self.durations = []
+
+    def record(self, duration):
+        """Record the duration of a successful lookup."""
+        self.durations.append(duration)
+        if len(self.durations) > self.window:
+            self.durations.pop(0)
+
+    def timeout(self, timeouts_so_far=0):
+        """Return the timeout for an attempt after the given number of timed-out attempts."""
+        if self.durations:
+            median = sorted(self.durations)[len(self.durations) // 2]
+            base = max(self.minimum, median * self.factor)
+        else:
+            base = self.initial
+        return min(self.maximum, base * (2 ** timeouts_so_far))
+
+
+class RetryScheduler:
+    """
+    Runs lookups for queued videos, retrying transient failures with backoff.
+
+    Ready tasks run in order of (attempt, priority, insertion), so retries
+    always come after fresh work. Tasks waiting for their backoff to expire
+    are kept apart until they are due.
+    """
+
+    def __init__(self, max_attempts=4, base_delay=2.0, max_delay=120.0, timeouts=None,
+                 deadline=None, max_total_attempts=None, clock=time.monotonic, sleep=time.sleep,
+                 rng=random.random):
+        """
+        Configure attempts and backoff; clock, sleep and rng can be replaced for testing.
+
+        deadline is a clock() value after which no new attempts are started;
+        max_total_attempts caps the attempts over all tasks, retries included.
+        """
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.timeouts = timeouts or AdaptiveTimeout()
+        self.clock = clock
+        self.sleep = sleep
+        self.rng = rng
+        self.deadline = deadline
+        self.max_total_attempts = max_total_attempts
+        self.skipped = 0
+        self.group_for = None
+        self.ready = {}
+        self.waiting = []
+        self.counter = itertools.count()
+        self.attempts = 0
+        self.retries = 0
+
+    def add(self, key, url, priority=0, service_id=None):
+        """
+        Queue a video for lookup; lower priority values (any comparable value) run first.
+
+        service_id is the stream's streams.service_id, if known; it is
+        passed on to the group_by() function.
+        """
+        group = self.group_for(url, service_id) if self.group_for else None
+        task = {'key': key, 'url': url, 'priority': priority, 'attempt': 0, 'timeouts': 0,
+                'service_id': service_id, 'group': group}
+        heapq.heappush(self.ready.setdefault(group, []), (0, priority, next(self.counter), task))
+
+    def group_by(self, group_for):
+        """Group tasks by group_for(url, service_id), including the ones already queued."""
+        self.group_for = group_for
+        entries = [entry for heap in self.ready.values() for entry in heap]
+        self.ready = {}
+        for entry in entries:
+            entry[3]['group'] = group_for(entry[3]['url'], entry[3]['service_id'])
+            self.ready.setdefault(entry[3]['group'], []).append(entry)
+        for heap in self.ready.values():
+            heapq.heapify(heap)
+        for due, seq, task in self.waiting:
+            task['group'] = group_for(task['url'], task['service_id'])
+
+    def backoff(self, attempt):
+        """Return the jittered delay before retry number attempt (1-based)."""
+        delay = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        return delay * (0.5 + self.rng())
+
+    def pending(self):
+        """Number of tasks not finished yet."""
+        return sum(len(heap) for heap in self.ready.values()) + len(self.waiting)
+
+    def take(self, accept=None):
+        """
+        Return the next ready task, or None when nothing is due right now.
+
+        accept(group) can restrict the task to the groups it returns True for.
+        """
+        now = self.clock()
+        if ((self.deadline is not None and now >= self.deadline)
+                or (self.max_total_attempts is not None and self.attempts >= self.max_total_attempts)):
+            # Out of time or attempts: drop what is left, running attempts still finish
+            self.skipped += self.pending()
+            self.ready = {}
+            self.waiting = []
+            return None
+        while self.waiting and self.waiting[0][0] <= now:
+            due, seq, task = heapq.heappop(self.waiting)
+            heapq.heappush(self.ready.setdefault(task['group'], []),
+                           (task['attempt'], task['priority'], seq, task))
+        best = None
+        for group, heap in self.ready.items():
+            if accept is not None and not accept(group):
+                continue
+            if best is None or heap[0] < best[1][0]:
+                best = (group, heap)
+        if best is None:
+            return None
+        group, heap = best
+        task = heapq.heappop(heap)[3]
+        if not heap:
+            del self.ready[group]
+        return task
+
+    def next_due(self):
+        """Seconds until the next waiting task is due, or None when none are waiting."""
+        if not self.waiting:
+            return None
+        return max(0.0, self.waiting[0][0] - self.clock())
+
+    def next_task(self, control=None):
+        """Return the next task to run, waiting for a backoff to expire if needed."""
+        while True:
+            task = self.take()
+            if task is not None:
+                return task
+            wait = self.next_due()
+            if wait is None:
+                return None
+            checkpoint(control)
+            self.sleep(min(1.0, wait))
+
+    def start(self, task):
+        """Count an attempt for task and return the timeout to use for it."""
+        task['attempt'] += 1
+        self.attempts += 1
+        return self.timeouts.timeout(task['timeouts'])
+
+    def finish(self, task, metadata=None, error=None, duration=None):
+        """
+        Record the result of an attempt.
+
+        Returns the final (key, url, metadata, error kind) outcome, or None
+        when the task was requeued for another attempt.
+        """
+        if error is None:
+            if duration is not None:
+                self.timeouts.record(duration)
+            return task['key'], task['url'], metadata, None
+
+        if error.timed_out:
+            task['timeouts'] += 1
+        if error.kind in TRANSIENT_ERRORS and task['attempt'] < self.max_attempts:
+            self.requeue(task)
+            return None
+        return task['key'], task['url'], None, error.kind
+
+    def requeue(self, task):
+        """Put a failed task back to wait for its backoff."""
+        self.retries += 1
+        due = self.clock() + self.backoff(task['attempt'])
+        heapq.heappush(self.waiting, (due, next(self.counter), task))
+
+    def run(self, fetch, delay=0.0, control=None):
+        """
+        Run all queued lookups one at a time and yield (key, url, metadata, error kind).
+
+        fetch(url, timeout) returns metadata or raises ResolveError. Each
+        video is yielded once, when it succeeds or has failed for good;
+        metadata is None and error kind is set on failure.
+        """
+        while True:
+            task = self.next_task(control)
+            if task is None:
+                return
+
+            checkpoint(control)
+            timeout = self.start(task)
+            started = self.clock()
+            try:
+                metadata = fetch(task['url'], timeout)
+                outcome = self.finish(task, metadata, duration=self.clock() - started)
+            except ResolveError as e:
+                outcome = self.finish(task, error=e)
+            if outcome is not None:
+                yield outcome
+
+            if delay:
+                self.sleep(delay)  # Rate limiting
+
+
+def fetcher_for(resolver):
+    """
+    Return a fetch(url, timeout) function for a resolver.
+
+    Resolvers with only resolve() are wrapped; their failures cannot be
+    classified and count as unknown errors.
+    """
+    if hasattr(resolver, 'fetch'):
+        return resolver.fetch
+
+    def fetch(url, timeout):
+        metadata = resolver.resolve(url)
+        if metadata is None:
+            raise ResolveError(ERROR_UNKNOWN)
+        return metadata
+
+    return fetch
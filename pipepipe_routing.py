@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+PipePipe service routing - one lookup lane per streaming service
+
+PipePipe backups hold videos from several services (YouTube, SoundCloud,
+PeerTube instances, ...). A ServiceRouter wraps a resolver and sends every
+lookup through the lane of its service, keyed on the URL host (or the
+stream's service_id when the URL has none). Each lane has its own:
+- worker pool: a cap on the lookups running at once (blocking resolvers,
+  such as pipepipe_session's, run on a thread pool of that size)
+- rate limit: a minimum time between starting two lookups
+- circuit breaker: after repeated throttling or network failures the lane
+  stops calling the service for a cooldown, then a single probe lookup
+  decides whether it opens again
+
+While a lane's breaker is open its lookups fail at once as throttled, so
+the retry scheduler backs them off and finally leaves them for a later run
+instead of hammering the service. A throttled service therefore only slows
+its own lane; lookups of the other services keep running at full speed.
+The router is itself a resolver with fetch_async() (see pipepipe_async), so
+run_lookups() drives it concurrently and only takes tasks from lanes that
+have room.
+
+Author: GitHub Community
+License: MIT
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+from pipepipe_resolver import ERROR_THROTTLED, TRANSIENT_ERRORS, ResolveError
+from pipepipe_retry import fetcher_for
+
+# PipePipe service IDs (streams.service_id)
+SERVICE_NAMES = {
+    0: 'youtube',
+    1: 'soundcloud',
+    2: 'media.ccc.de',
+    3: 'peertube',
+    4: 'bandcamp',
+    5: 'bilibili',
+    6: 'niconico',
+}
+
+# Host suffixes of the services with several domains
+SERVICE_HOSTS = (
+    ('youtube', ('youtube.com', 'youtu.be', 'youtube-nocookie.com')),
+    ('soundcloud', ('soundcloud.com', 'snd.sc')),
+    ('bandcamp', ('bandcamp.com',)),
+    ('bilibili', ('bilibili.com', 'b23.tv')),
+    ('niconico', ('nicovideo.jp', 'nico.ms')),
+)
+
+# Lane used for services without their own settings: (max concurrent, start interval)
+DEFAULT_LANE = (2, 0.5)
+
+# Consecutive transient failures that pause a lane, and the pause in seconds
+BREAKER_THRESHOLD = 5
+BREAKER_COOLDOWN = 60.0
+
+
+def service_for(url, service_id=None):
+    """
+    Return the service name for a stream URL.
+
+    Known services are recognised by host; other hosts (e.g. PeerTube
+    instances) are their own service. Falls back to the service_id.
+    """
+    host = urlparse(url or '').hostname or ''
+    if host.startswith('www.'):
+        host = host[4:]
+    for name, suffixes in SERVICE_HOSTS:
+        if any(host == suffix or host.endswith('.' + suffix) for suffix in suffixes):
+            return name
+    if host:
+        return host
+    return SERVICE_NAMES.get(service_id, 'unknown')
+
+
+class CircuitBreaker:
+    """Pauses a lane after repeated transient failures, probing once per cooldown."""
+
+    def __init__(self, threshold=BREAKER_THRESHOLD, cooldown=BREAKER_COOLDOWN, clock=time.monotonic):
+        """Open after threshold consecutive failures; stay open for cooldown seconds."""
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self.trips = 0
+
+    def allow(self):
+        """Whether a lookup may start now."""
+        if self.opened_at is None:
+            return True
+        if self.clock() - self.opened_at < self.cooldown:
+            return False
+        return not self.probing
+
+    def started(self):
+        """Note that a lookup started; after the cooldown it is the probe."""
+        if self.opened_at is not None:
+            self.probing = True
+
+    def record(self, error_kind=None):
+        """Record a finished lookup; error_kind is None on success."""
+        if error_kind not in TRANSIENT_ERRORS:
+            # The service answered, even if the video is gone
+            self.failures = 0
+            self.opened_at = None
+            self.probing = False
+            return
+        self.failures += 1
+        if self.probing or self.failures >= self.threshold:
+            if self.opened_at is None or self.probing:
+                self.trips += 1
+            self.opened_at = self.clock()
+            self.probing = False
+
+
+class ServiceLane:
+    """Concurrency cap, start pacing and circuit breaker of one service."""
+
+    def __init__(self, name, max_concurrent, start_interval, breaker):
+        """Create the lane; the thread pool for blocking resolvers is made on first use."""
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.start_interval = start_interval
+        self.breaker = breaker
+        self.running = 0
+        self.next_start = 0.0
+        self.calls = 0
+        self.executor = None
+
+    def has_room(self):
+        """Whether another lookup may start in this lane now."""
+        return self.running < self.max_concurrent
+
+    def reserve(self, now):
+        """Take a slot in the lane and return how long to wait before starting."""
+        self.running += 1
+        self.calls += 1
+        self.breaker.started()
+        start = max(now, self.next_start)
+        self.next_start = start + self.start_interval
+        return start - now
+
+    def pool(self):
+        """Return the lane's thread pool for blocking lookups."""
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=self.max_concurrent,
+                                               thread_name_prefix=f"lookup-{self.name}")
+        return self.executor
+
+
+class ServiceRouter:
+    """
+    Resolver that routes lookups to per-service lanes of a wrapped resolver.
+
+    lanes maps service names to (max concurrent, start interval); services
+    not listed get default_lane. The primary service (YouTube) defaults to
+    the wrapped resolver's own max_processes and start_interval.
+    """
+
+    def __init__(self, resolver, lanes=None, default_lane=DEFAULT_LANE, primary='youtube',
+                 breaker_threshold=BREAKER_THRESHOLD, breaker_cooldown=BREAKER_COOLDOWN,
+                 clock=time.monotonic):
+        """Wrap resolver; lanes are created on first use."""
+        self.resolver = resolver
+        self.settings = {primary: (getattr(resolver, 'max_processes', 1),
+                                   getattr(resolver, 'start_interval', 0.5))}
+        self.settings.update(lanes or {})
+        self.default_lane = default_lane
+        self.breaker_threshold = breaker_threshold
+        self.breaker_cooldown = breaker_cooldown
+        self.clock = clock
+        self.lanes = {}
+        self.lock = threading.Lock()
+        # The lanes pace themselves; these only bound the driver as a whole
+        self.max_processes = sum(limit for limit, interval in self.settings.values()) + 4 * default_lane[0]
+        self.start_interval = 0.0
+
+    def service_for(self, url, service_id=None):
+        """Return the service (lane name) of a URL; service_id is the stream's, if known."""
+        return service_for(url, service_id)
+
+    def lane(self, service):
+        """Return the lane of a service, creating it on first use."""
+        with self.lock:
+            lane = self.lanes.get(service)
+            if lane is None:
+                max_concurrent, start_interval = self.settings.get(service, self.default_lane)
+                breaker = CircuitBreaker(self.breaker_threshold, self.breaker_cooldown, self.clock)
+                lane = self.lanes[service] = ServiceLane(service, max_concurrent, start_interval, breaker)
+            return lane
+
+    def accepts(self, service):
+        """Whether a lookup for the service may start now (used by the concurrent driver)."""
+        return self.lane(service).has_room()
+
+    def finish(self, lane, error_kind=None):
+        """Release a lane slot and record the outcome with its breaker."""
+        with self.lock:
+            lane.running -= 1
+            lane.breaker.record(error_kind)
+
+    def fetch_async(self, url, timeout=None, service=None):
+        """
+        Return an awaitable fetching metadata through the lane of service (default: the URL's).
+
+        The lane slot is taken right away, before the awaitable runs, so a
+        driver starting several lookups in a row sees the lane fill up.
+        The awaitable raises ResolveError on failure.
+        """
+        lane = self.lane(service or self.service_for(url))
+        with self.lock:
+            if not lane.breaker.allow():
+                return self.paused(lane)
+            wait = lane.reserve(self.clock())
+        return self.fetch_in_lane(lane, url, timeout, wait)
+
+    async def paused(self, lane):
+        """Fail a lookup in a lane whose breaker is open."""
+        raise ResolveError(ERROR_THROTTLED, f"{lane.name} paused after repeated failures")
+
+    async def fetch_in_lane(self, lane, url, timeout, wait):
+        """Run a lookup in a lane whose slot is already taken."""
+        error_kind = None
+        try:
+            if wait > 0:
+                await asyncio.sleep(wait)
+            if getattr(self.resolver, 'blocking', False):
+                return await self.resolver.fetch_async(url, timeout, executor=lane.pool())
+            if hasattr(self.resolver, 'fetch_async'):
+                return await self.resolver.fetch_async(url, timeout)
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(lane.pool(), fetcher_for(self.resolver), url, timeout)
+        except ResolveError as e:
+            error_kind = e.kind
+            raise
+        finally:
+            self.finish(lane, error_kind)
+
+    def fetch(self, url, timeout=None):
+        """Fetch metadata one lookup at a time, honouring the lane's pacing and breaker."""
+        lane = self.lane(self.service_for(url))
+        with self.lock:
+            if not lane.breaker.allow():
+                raise ResolveError(ERROR_THROTTLED, f"{lane.name} paused after repeated failures")
+            wait = lane.reserve(self.clock())
+        error_kind = None
+        try:
+            if wait > 0:
+                time.sleep(wait)
+            return fetcher_for(self.resolver)(url, timeout)
+        except ResolveError as e:
+            error_kind = e.kind
+            raise
+        finally:
+            self.finish(lane, error_kind)
+
+    def resolve(self, url):
+        """Fetch metadata for a single video, or None if it could not be resolved."""
+        try:
+            return self.fetch(url)
+        except ResolveError:
+            return None
+
+    def list_flat(self, url):
+        """List the entries of a channel or playlist through the wrapped resolver."""
+        return self.resolver.list_flat(url)
+
+    def lane_stats(self):
+        """Return a dict of service -> lookups started and breaker trips."""
+        with self.lock:
+            return {name: {'calls': lane.calls, 'trips': lane.breaker.trips}
+                    for name, lane in self.lanes.items()}
+
+    def close(self):
+        """Shut down the lanes' thread pools and close the wrapped resolver."""
+        for lane in self.lanes.values():
+            if lane.executor is not None:
+                lane.executor.shutdown(wait=True)
+                lane.executor = None
+        if hasattr(self.resolver, 'close'):
+            self.resolver.close()
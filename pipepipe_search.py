@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+PipePipe search - full-text search over the videos of a library
+
+Builds an SQLite FTS5 index over the title, uploader and URL of every
+stream and returns ranked matches (bm25, title matches weigh most) in
+milliseconds, where a LIKE query scans the whole streams table.
+
+The index is an optional sidecar file, PipePipe.search.db, next to the
+PipePipe.db it indexes; for a backup zip that is the backup's work folder,
+which is keyed by the backup's content hash (see pipepipe_workspace). It
+is built on first use and afterwards kept up to date incrementally: only
+streams whose title, uploader or URL changed since the last sync are
+re-indexed, and the sync is skipped while the database file is unchanged.
+Metadata updates sync an existing index when they finish.
+
+    python pipepipe_search.py backup.zip "never gonna" [--limit 20]
+
+Author: GitHub Community
+License: MIT
+"""
+
+import os
+import re
+import sqlite3
+import sys
+import time
+import zipfile
+from urllib.parse import quote
+
+SEARCH_INDEX_NAME = 'PipePipe.search.db'
+
+DEFAULT_LIMIT = 20
+
+# bm25 weights of the title, uploader and URL columns
+COLUMN_WEIGHTS = (10.0, 5.0, 1.0)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS docs (
+    uid INTEGER PRIMARY KEY,
+    title TEXT,
+    uploader TEXT,
+    url TEXT
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS search USING fts5(
+    title, uploader, url,
+    content='docs', content_rowid='uid',
+    tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS docs_insert AFTER INSERT ON docs BEGIN
+    INSERT INTO search(rowid, title, uploader, url)
+    VALUES (new.uid, new.title, new.uploader, new.url);
+END;
+CREATE TRIGGER IF NOT EXISTS docs_delete AFTER DELETE ON docs BEGIN
+    INSERT INTO search(search, rowid, title, uploader, url)
+    VALUES ('delete', old.uid, old.title, old.uploader, old.url);
+END;
+CREATE TRIGGER IF NOT EXISTS docs_update AFTER UPDATE ON docs BEGIN
+    INSERT INTO search(search, rowid, title, uploader, url)
+    VALUES ('delete', old.uid, old.title, old.uploader, old.url);
+    INSERT INTO search(rowid, title, uploader, url)
+    VALUES (new.uid, new.title, new.uploader, new.url);
+END;
+CREATE TABLE IF NOT EXISTS state (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# Streams that are new or whose indexed columns changed since the last sync
+CHANGED_STREAMS = """
+INSERT INTO docs (uid, title, uploader, url)
+SELECT s.uid, s.title, s.uploader, s.url
+FROM library.streams s
+LEFT JOIN docs d ON d.uid = s.uid
+WHERE d.uid IS NULL OR d.title IS NOT s.title OR d.uploader IS NOT s.uploader OR d.url IS NOT s.url
+ON CONFLICT(uid) DO UPDATE SET title = excluded.title, uploader = excluded.uploader, url = excluded.url
+"""
+
+_TERM = re.compile(r'\w+')
+
+
+def index_path(db_path):
+    """Return the path of the search index for the PipePipe.db at db_path."""
+    return os.path.join(os.path.dirname(os.path.abspath(db_path)), SEARCH_INDEX_NAME)
+
+
+def match_expression(query):
+    """
+    Turn free text into an FTS5 query matching all of its words.
+
+    Words are quoted, so FTS5 operators in the text are searched literally;
+    the last word also matches as a prefix, for search-as-you-type.
+    Returns None when the text has no words.
+    """
+    terms = _TERM.findall(query)
+    if not terms:
+        return None
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += '*'
+    return ' '.join(quoted)
+
+
+def file_signature(path):
+    """Return a string that changes whenever the file at path is written."""
+    stat = os.stat(path)
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+class SearchIndex:
+    """FTS5 index over the streams of one PipePipe.db, stored in a sidecar file."""
+
+    def __init__(self, db_path):
+        """Open (or create) the index next to the PipePipe.db at db_path."""
+        self.db_path = db_path
+        self.path = index_path(db_path)
+        # Opened as a URI, so the database is attached read-only in sync()
+        # also where SQLite was built without SQLITE_USE_URI
+        self.conn = sqlite3.connect(f"file:{quote(os.path.abspath(self.path))}", uri=True)
+        self.conn.executescript(SCHEMA)
+
+    def sync(self, force=False):
+        """
+        Bring the index up to date with the database.
+
+        Only new, changed and removed streams are written. Unless force is
+        set, nothing is read while the database file is unchanged since the
+        last sync. Returns a dict with the number of streams 'indexed' and
+        'removed' and the 'seconds' taken.
+        """
+        started = time.monotonic()
+        signature = file_signature(self.db_path)
+        row = self.conn.execute("SELECT value FROM state WHERE key = 'source'").fetchone()
+        if row and row[0] == signature and not force:
+            return {'indexed': 0, 'removed': 0, 'seconds': time.monotonic() - started}
+
+        source = f"file:{quote(os.path.abspath(self.db_path))}?mode=ro"
+        self.conn.execute("ATTACH DATABASE ? AS library", (source,))
+        try:
+            with self.conn:
+                removed = self.conn.execute(
+                    "DELETE FROM docs WHERE uid NOT IN (SELECT uid FROM library.streams)").rowcount
+                indexed = self.conn.execute(CHANGED_STREAMS).rowcount
+                self.conn.execute("INSERT OR REPLACE INTO state (key, value) VALUES ('source', ?)",
+                                  (signature,))
+        finally:
+            self.conn.execute("DETACH DATABASE library")
+        return {'indexed': indexed, 'removed': removed, 'seconds': time.monotonic() - started}
+
+    def search(self, query, limit=DEFAULT_LIMIT):
+        """Return up to limit streams matching query, best match first, as dicts."""
+        expression = match_expression(query)
+        if expression is None:
+            return []
+        weights = ', '.join(str(weight) for weight in COLUMN_WEIGHTS)
+        rows = self.conn.execute(
+            f"SELECT rowid, title, uploader, url, bm25(search, {weights}) AS score "
+            "FROM search WHERE search MATCH ? ORDER BY score LIMIT ?",
+            (expression, limit)).fetchall()
+        return [{'uid': uid, 'title': title, 'uploader': uploader, 'url': url, 'score': -score}
+                for uid, title, uploader, url, score in rows]
+
+    def optimize(self):
+        """Merge the index's segments, e.g. after a large sync."""
+        with self.conn:
+            self.conn.execute("INSERT INTO search(search) VALUES ('optimize')")
+
+    def close(self):
+        """Close the index file."""
+        self.conn.close()
+
+
+def update_index(db_path):
+    """Sync the search index of the PipePipe.db at db_path if one was built; returns the sync report or None."""
+    if not os.path.exists(index_path(db_path)):
+        return None
+    index = SearchIndex(db_path)
+    try:
+        return index.sync()
+    finally:
+        index.close()
+
+
+def search_backup(backup_path, query, limit=DEFAULT_LIMIT, workspaces=None):
+    """
+    Search the videos of a backup zip (or a PipePipe.db file).
+
+    The backup is extracted into its work folder, or an earlier extraction
+    is reused (see pipepipe_workspace.WorkspaceManager); the index is built
+    or synced before searching. Returns the matches as in SearchIndex.search().
+    """
+    db_path = backup_path
+    working_dir = None
+    if zipfile.is_zipfile(backup_path):
+        from pipepipe_workspace import WorkspaceManager
+
+        workspaces = workspaces or WorkspaceManager()
+        working_dir, reused = workspaces.acquire(backup_path)
+        db_path = os.path.join(working_dir, 'PipePipe.db')
+
+    try:
+        index = SearchIndex(db_path)
+        try:
+            index.sync()
+            return index.search(query, limit)
+        finally:
+            index.close()
+    finally:
+        if working_dir:
+            workspaces.release(working_dir)
+
+
+def main():
+    """Search the videos of a backup or PipePipe.db."""
+    args = sys.argv[1:]
+    limit = DEFAULT_LIMIT
+    if '--limit' in args:
+        index = args.index('--limit')
+        limit = int(args[index + 1])
+        del args[index:index + 2]
+    if len(args) != 2:
+        print("Usage: python pipepipe_search.py <backup.zip|PipePipe.db> <search text> [--limit N]")
+        sys.exit(1)
+
+    source, query = args
+    if not os.path.exists(source):
+        print(f"Error: File not found: {source}")
+        sys.exit(1)
+
+    matches = search_backup(source, query, limit)
+    for match in matches:
+        print(f"{match['title']} - {match['uploader']}\n    {match['url']}")
+    print(f"{len(matches)} matches")
+
+
+if __name__ == "__main__":
+    main()
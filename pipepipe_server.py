@@ -0,0 +1,500 @@
+#!/usr/bin/env python3
+"""
+PipePipe job server - a local HTTP API for processing backups
+
+Runs the "Do Both" processing as jobs submitted over HTTP, so scripts (or
+several desktops on the same machine) can queue backups without the GUI.
+Jobs run on a fixed number of workers behind a bounded queue and share one
+resolver, metadata cache and fingerprint store (see
+pipepipe_daemon.BackupProcessor).
+
+Endpoints (JSON unless noted):
+- POST /jobs                 body: a backup zip (Content-Type application/zip)
+                             or {"path": "/local/backup.zip"}; 202 with the
+                             job, 503 when the queue is full
+- GET  /jobs                 all jobs
+- GET  /jobs/<id>            state, progress (lookups done/total), log tail
+                             and result summary of one job
+- GET  /jobs/<id>/result     the processed zip (application/zip), streamed
+- DELETE /jobs/<id>          cancel a queued or running job, or forget a
+                             finished one and remove its files
+- GET  /metrics              job counts, lookups, lane statistics and uptime
+
+Uploaded backups are removed once their job has finished or was cancelled.
+
+The server only listens on 127.0.0.1 by default. With PIPEPIPE_SERVER_TOKEN
+set, every request must carry the token in the X-Job-Token header. Without
+it, only requests addressed to the local host (by their Host and Origin
+headers) are answered, so a web page cannot reach the server through DNS
+rebinding. Backups are only submitted by path from the folders given with
+--allow-paths (separated by os.pathsep); without it, only uploads are
+accepted.
+
+    python pipepipe_server.py [--host 127.0.0.1] [--port 8765] [--workers N]
+        [--queue N] [--cookies cookies.txt] [--output folder] [--allow-paths folders]
+
+Author: GitHub Community
+License: MIT
+"""
+
+import hmac
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+from pipepipe_control import OperationCancelled, OperationControl
+from pipepipe_daemon import DEFAULT_MAX_QUEUED, DEFAULT_WORKERS, BackupProcessor, JobScheduler
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+
+TOKEN_HEADER = 'X-Job-Token'
+
+# Host names a request must be addressed to when the server has no token
+LOCAL_HOSTS = ('127.0.0.1', 'localhost', '::1')
+
+# Largest accepted upload
+MAX_UPLOAD_BYTES = 4 * 1024 * 1024 * 1024
+
+CHUNK_SIZE = 1024 * 1024
+
+# Log lines kept per job
+LOG_LINES = 200
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+
+class Job:
+    """One submitted backup and its progress."""
+
+    def __init__(self, job_id, backup_path, output_path, uploaded):
+        """Create a queued job; uploaded backups are removed with the job."""
+        self.id = job_id
+        self.backup_path = backup_path
+        self.output_path = output_path
+        self.uploaded = uploaded
+        self.state = QUEUED
+        self.control = OperationControl()
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self.done = 0
+        self.total = None
+        self.log_lines = []
+        self.result = None
+        self.error = None
+
+    def log(self, message):
+        """Add a line to the job's log."""
+        self.log_lines.append(message)
+        del self.log_lines[:-LOG_LINES]
+
+    def progress(self, done, total):
+        """Record finished lookups (see pipepipe_update.update_streams)."""
+        self.done = done
+        self.total = total
+
+    def status(self, log_tail=20):
+        """Return the job's state as a JSON-serialisable dict."""
+        status = {
+            'id': self.id,
+            'state': self.state,
+            'backup': os.path.basename(self.backup_path),
+            'submitted': self.submitted,
+            'started': self.started,
+            'finished': self.finished,
+            'progress': {'done': self.done, 'total': self.total},
+            'log': self.log_lines[-log_tail:] if log_tail else [],
+        }
+        if self.result:
+            update = self.result['update']
+            status['result'] = {
+                'updated': update['updated'],
+                'errors': update['errors'],
+                'error_kinds': update['error_kinds'],
+                'resolver_calls': update['resolver_calls'],
+                'skipped': update['skipped'],
+                'removed': self.result['removed'],
+            }
+        if self.error:
+            status['error'] = self.error
+        return status
+
+
+class JobServer:
+    """Jobs, their worker pool and the shared processing resources."""
+
+    def __init__(self, output_dir=None, processor=None, workers=DEFAULT_WORKERS,
+                 max_queued=DEFAULT_MAX_QUEUED, max_upload_bytes=MAX_UPLOAD_BYTES, allowed_dirs=(),
+                 log=print):
+        """
+        Start the workers; results and uploads go below output_dir.
+
+        The default is a folder next to the work folder root, not inside
+        it, where the size cap would remove it like an old work folder.
+        Backups are only submitted by path from below allowed_dirs.
+        """
+        self.processor = processor or BackupProcessor()
+        self.output_dir = output_dir or self.processor.workspaces.root.rstrip(os.sep) + '_server'
+        self.upload_dir = os.path.join(self.output_dir, 'uploads')
+        os.makedirs(self.upload_dir, exist_ok=True)
+        self.max_upload_bytes = max_upload_bytes
+        self.allowed_dirs = [os.path.realpath(directory) for directory in allowed_dirs]
+        self.log = log
+        self.jobs = {}
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.scheduler = JobScheduler(self.run_job, workers, max_queued, log)
+
+    def submit(self, backup_path, uploaded=False):
+        """Queue a backup; returns the Job, or None when the queue is full."""
+        job_id = uuid.uuid4().hex[:12]
+        output_path = os.path.join(self.output_dir, f"{job_id}.zip")
+        job = Job(job_id, backup_path, output_path, uploaded)
+        with self.lock:
+            self.jobs[job_id] = job
+        if not self.scheduler.submit(job_id):
+            with self.lock:
+                del self.jobs[job_id]
+            return None
+        self.log(f"Job {job_id} queued: {os.path.basename(backup_path)}")
+        return job
+
+    def allowed_path(self, path):
+        """Return the real path of a backup submitted by path, or None when it is outside allowed_dirs."""
+        path = os.path.realpath(path)
+        for directory in self.allowed_dirs:
+            try:
+                if os.path.commonpath([directory, path]) == directory:
+                    return path
+            except ValueError:
+                # On another drive
+                pass
+        return None
+
+    def receive_upload(self, stream, length):
+        """Save an uploaded backup of length bytes from stream; returns its path."""
+        path = os.path.join(self.upload_dir, f"{uuid.uuid4().hex}.zip")
+        remaining = length
+        try:
+            with open(path, 'wb') as target:
+                while remaining > 0:
+                    chunk = stream.read(min(CHUNK_SIZE, remaining))
+                    if not chunk:
+                        raise ConnectionError("Upload ended early")
+                    target.write(chunk)
+                    remaining -= len(chunk)
+        except Exception:
+            os.remove(path)
+            raise
+        return path
+
+    def remove_upload(self, job):
+        """Remove a job's uploaded backup, once the job no longer needs it."""
+        if job.uploaded and os.path.exists(job.backup_path):
+            os.remove(job.backup_path)
+
+    def run_job(self, job_id):
+        """Process one job (called on a worker thread); raises OperationCancelled for a cancelled job."""
+        with self.lock:
+            job = self.jobs.get(job_id)
+            cancelled = job is None or job.state != QUEUED
+            if not cancelled:
+                job.state = RUNNING
+                job.started = time.time()
+        if cancelled:
+            # Cancelled while queued
+            if job is not None:
+                self.remove_upload(job)
+            raise OperationCancelled()
+        try:
+            job.result = self.processor.process(job.backup_path, job.output_path, log=job.log,
+                                                control=job.control, progress=job.progress)
+            job.state = DONE if job.result['output'] else CANCELLED
+        except Exception as e:
+            job.state = FAILED
+            job.error = str(e)
+            raise
+        finally:
+            job.finished = time.time()
+            self.remove_upload(job)
+            self.log(f"Job {job_id} {job.state}")
+        if job.state == CANCELLED:
+            raise OperationCancelled()
+
+    def cancel(self, job_id):
+        """
+        Cancel an active job, or forget a finished one and remove its files; returns the job.
+
+        A queued job is taken off the queue, so its slot is free at once.
+        """
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            if job.state == QUEUED:
+                job.state = CANCELLED
+                job.finished = time.time()
+                # Otherwise a worker has just taken it and run_job() cleans up
+                if self.scheduler.cancel(job_id):
+                    self.remove_upload(job)
+                return job
+            if job.state == RUNNING:
+                job.control.cancel()
+                return job
+            del self.jobs[job_id]
+        if os.path.exists(job.output_path):
+            os.remove(job.output_path)
+        self.remove_upload(job)
+        return job
+
+    def metrics(self):
+        """Return counts and statistics over all jobs."""
+        with self.lock:
+            jobs = list(self.jobs.values())
+        states = {}
+        for job in jobs:
+            states[job.state] = states.get(job.state, 0) + 1
+        results = [job.result['update'] for job in jobs if job.result]
+        metrics = {
+            'uptime': time.time() - self.started,
+            'jobs': states,
+            'completed': self.scheduler.completed,
+            'failed': self.scheduler.failed,
+            'cancelled': self.scheduler.cancelled,
+            'videos_updated': sum(result['updated'] for result in results),
+            'resolver_calls': sum(result['resolver_calls'] for result in results),
+            # Finished lookups of the jobs still running
+            'lookups_done_running': sum(job.done for job in jobs if job.state == RUNNING),
+        }
+        resolver = self.processor.resolver
+        if hasattr(resolver, 'lane_stats'):
+            metrics['lanes'] = resolver.lane_stats()
+        return metrics
+
+    def close(self, cancel=False):
+        """Stop the workers, after cancelling active jobs if cancel, and close the shared resources."""
+        if cancel:
+            with self.lock:
+                for job in self.jobs.values():
+                    if job.state == QUEUED:
+                        job.state = CANCELLED
+                    job.control.cancel()
+        self.scheduler.close()
+        self.processor.close()
+
+
+class JobRequestHandler(BaseHTTPRequestHandler):
+    """HTTP front end of the JobServer in self.server.job_server."""
+
+    server_version = 'PipePipeJobServer/1.0'
+
+    def log_message(self, format, *args):
+        """Send request logs to the job server's log instead of stderr."""
+        self.server.job_server.log(format % args)
+
+    def authorized(self):
+        """
+        Check the request's token, or without one that it is addressed to the local host.
+
+        Answers 403 when the check fails.
+        """
+        token = self.server.token
+        if token:
+            given = self.headers.get(TOKEN_HEADER) or ''
+            # Compared in constant time, so response times do not give the token away
+            allowed = hmac.compare_digest(given.encode('utf-8'), token.encode('utf-8'))
+        else:
+            # A page whose name was rebound to 127.0.0.1 still sends its own Host and Origin
+            allowed = all(urlsplit(f"//{value}").hostname in LOCAL_HOSTS
+                          for value in (self.headers.get('Host'), self.headers.get('Origin'))
+                          if value is not None)
+        if not allowed:
+            # The request body is left unread
+            self.close_connection = True
+            self.send_json(403, {'error': 'forbidden'})
+        return allowed
+
+    def send_json(self, status, body, headers=()):
+        """Send a JSON response."""
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def route(self):
+        """Split the path into (job ID or None, sub-resource or None) below /jobs."""
+        parts = [part for part in self.path.split('?')[0].split('/') if part]
+        if not parts or parts[0] != 'jobs' or len(parts) > 3:
+            return None
+        return (parts[1] if len(parts) > 1 else None), (parts[2] if len(parts) > 2 else None)
+
+    def do_GET(self):
+        """Job status, job list, results and metrics."""
+        if not self.authorized():
+            return
+        jobs = self.server.job_server
+        if self.path.split('?')[0].rstrip('/') == '/metrics':
+            self.send_json(200, jobs.metrics())
+            return
+        route = self.route()
+        if route is None:
+            self.send_json(404, {'error': 'not found'})
+            return
+        job_id, resource = route
+        if job_id is None:
+            with jobs.lock:
+                listing = [job.status(log_tail=0) for job in jobs.jobs.values()]
+            self.send_json(200, listing)
+            return
+        job = jobs.jobs.get(job_id)
+        if job is None or resource not in (None, 'result'):
+            self.send_json(404, {'error': 'no such job'})
+        elif resource is None:
+            self.send_json(200, job.status())
+        elif job.state != DONE:
+            self.send_json(409, {'error': f"job is {job.state}"})
+        else:
+            self.send_file(job.output_path)
+
+    def send_file(self, path):
+        """Stream a zip file in chunks."""
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/zip')
+        self.send_header('Content-Length', str(os.path.getsize(path)))
+        self.send_header('Content-Disposition', 'attachment; filename="PipePipe_Updated.zip"')
+        self.end_headers()
+        with open(path, 'rb') as source:
+            shutil.copyfileobj(source, self.wfile, CHUNK_SIZE)
+
+    def do_POST(self):
+        """Submit a backup, uploaded or by path."""
+        if not self.authorized():
+            return
+        jobs = self.server.job_server
+        if self.route() != (None, None):
+            self.send_json(404, {'error': 'not found'})
+            return
+        if jobs.scheduler.full():
+            self.send_json(503, {'error': 'queue full'}, headers=[('Retry-After', '30')])
+            return
+        length = self.headers.get('Content-Length')
+        if length is None:
+            self.send_json(411, {'error': 'Content-Length required'})
+            return
+        try:
+            length = int(length)
+        except ValueError:
+            length = -1
+        if length < 0:
+            self.close_connection = True
+            self.send_json(400, {'error': 'invalid Content-Length'})
+            return
+        content_type = self.headers.get('Content-Type', '').split(';')[0].strip()
+
+        if content_type == 'application/json':
+            try:
+                path = json.loads(self.rfile.read(length))['path']
+            except (ValueError, KeyError, TypeError):
+                self.send_json(400, {'error': 'expected {"path": ...}'})
+                return
+            path = jobs.allowed_path(path) if isinstance(path, str) else None
+            if path is None:
+                self.send_json(403, {'error': 'submitting by path is not allowed for this folder'})
+                return
+            if not os.path.isfile(path):
+                self.send_json(400, {'error': f"file not found: {path}"})
+                return
+            uploaded = False
+        else:
+            if length > jobs.max_upload_bytes:
+                self.send_json(413, {'error': 'backup too large'})
+                return
+            try:
+                path = jobs.receive_upload(self.rfile, length)
+            except (OSError, ConnectionError) as e:
+                self.close_connection = True
+                self.send_json(400 if isinstance(e, ConnectionError) else 500,
+                               {'error': f"upload failed: {e}"})
+                return
+            uploaded = True
+
+        job = jobs.submit(path, uploaded)
+        if job is None:
+            if uploaded:
+                os.remove(path)
+            self.send_json(503, {'error': 'queue full'}, headers=[('Retry-After', '30')])
+            return
+        self.send_json(202, job.status(), headers=[('Location', f"/jobs/{job.id}")])
+
+    def do_DELETE(self):
+        """Cancel or forget a job."""
+        if not self.authorized():
+            return
+        route = self.route()
+        if route is None or route[0] is None or route[1] is not None:
+            self.send_json(404, {'error': 'not found'})
+            return
+        job = self.server.job_server.cancel(route[0])
+        if job is None:
+            self.send_json(404, {'error': 'no such job'})
+        else:
+            self.send_json(200, job.status(log_tail=0))
+
+
+def serve(job_server, host=DEFAULT_HOST, port=DEFAULT_PORT, token=None):
+    """Return a ThreadingHTTPServer for job_server; call serve_forever() on it."""
+    httpd = ThreadingHTTPServer((host, port), JobRequestHandler)
+    httpd.daemon_threads = True
+    httpd.job_server = job_server
+    httpd.token = token
+    return httpd
+
+
+def main():
+    """Run the job server until interrupted."""
+    args = sys.argv[1:]
+    options = {'--host': DEFAULT_HOST, '--port': DEFAULT_PORT, '--workers': DEFAULT_WORKERS,
+               '--queue': DEFAULT_MAX_QUEUED, '--cookies': None, '--output': None, '--allow-paths': None}
+    for name in list(options):
+        if name in args:
+            index = args.index(name)
+            value = args[index + 1]
+            options[name] = int(value) if name in ('--port', '--workers', '--queue') else value
+            del args[index:index + 2]
+    if args:
+        print("Usage: python pipepipe_server.py [--host 127.0.0.1] [--port 8765] [--workers N] "
+              "[--queue N] [--cookies cookies.txt] [--output folder] [--allow-paths folders]")
+        sys.exit(1)
+
+    allowed_dirs = options['--allow-paths'].split(os.pathsep) if options['--allow-paths'] else ()
+    job_server = JobServer(options['--output'], BackupProcessor(cookies_file=options['--cookies']),
+                           workers=options['--workers'], max_queued=options['--queue'],
+                           allowed_dirs=allowed_dirs)
+    httpd = serve(job_server, options['--host'], options['--port'],
+                  token=os.environ.get('PIPEPIPE_SERVER_TOKEN'))
+    print(f"Listening on http://{options['--host']}:{httpd.server_address[1]}")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        print("Stopping, running jobs keep what they resolved so far")
+        httpd.server_close()
+        job_server.close(cancel=True)
+
+
+if __name__ == "__main__":
+    main()
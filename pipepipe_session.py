@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+PipePipe lookup sessions - in-process yt-dlp with a shared cookie jar
+
+The command line resolvers start one yt-dlp process per video, and with a
+cookies.txt selected every process parses the file again, opens new
+connections and writes the cookie jar back into the file when it exits.
+
+SessionResolver runs yt-dlp in-process instead. The cookies file is parsed
+once into a cookie jar shared by all lookups, and each worker thread keeps
+one YoutubeDL instance, so its HTTP connections stay open from one lookup
+to the next. The jar is loaded without a file name and yt-dlp is not given
+the cookies file, so the selected file is only ever read, never written.
+
+Every session has the same socket_timeout (the resolver's timeout), so a
+thread keeps its session however the retry scheduler varies the timeout
+of single attempts. fetch_async() enforces an attempt's timeout from the
+moment a worker starts the lookup, never while it waits for a free
+worker. Behind a ServiceRouter (see pipepipe_routing) the lookups run on
+the thread pool of their service's lane, so a stalled service only ties
+up its own lane's threads.
+
+The yt_dlp package is optional: create_resolver() falls back to the yt-dlp
+command line (see pipepipe_async) when it cannot be imported.
+
+Author: GitHub Community
+License: MIT
+"""
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from pipepipe_db import PLACEHOLDER_TITLE, PLACEHOLDER_UPLOADER
+from pipepipe_resolver import ERROR_NETWORK, ERROR_UNKNOWN, ResolveError, classify_error
+
+# Default number of lookups running at the same time (worker threads)
+DEFAULT_MAX_WORKERS = 8
+
+# Default minimum time between starting two lookups, in seconds
+DEFAULT_START_INTERVAL = 0.1
+
+
+class _QuietLogger:
+    """yt-dlp logger that drops all output; errors are raised as exceptions instead."""
+
+    def debug(self, message):
+        pass
+
+    def info(self, message):
+        pass
+
+    def warning(self, message):
+        pass
+
+    def error(self, message):
+        pass
+
+
+def load_cookie_jar(cookies_file):
+    """
+    Parse a Netscape cookies.txt into a yt-dlp cookie jar.
+
+    The jar keeps no file name, so it cannot be saved back over the file.
+    """
+    from yt_dlp.cookies import YoutubeDLCookieJar
+
+    jar = YoutubeDLCookieJar()
+    if cookies_file:
+        jar.load(cookies_file, ignore_discard=True, ignore_expires=True)
+    return jar
+
+
+def _int_value(value):
+    """Return value as an int, or None when it is not numeric."""
+    try:
+        return int(float(value)) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _thumbnail(info):
+    """Return the thumbnail URL of a yt-dlp info dict (the last, largest one)."""
+    if info.get('thumbnail'):
+        return info['thumbnail']
+    thumbnails = info.get('thumbnails') or []
+    return thumbnails[-1].get('url') if thumbnails else None
+
+
+def metadata_from_info(info):
+    """Convert a yt-dlp info dict into a metadata dict like parse_metadata()."""
+    return {
+        'title': info.get('title') or PLACEHOLDER_TITLE,
+        'uploader': info.get('uploader') or info.get('channel') or PLACEHOLDER_UPLOADER,
+        'duration': _int_value(info.get('duration')) or 0,
+        'view_count': _int_value(info.get('view_count')),
+        'upload_date': info.get('upload_date'),
+        'thumbnail_url': _thumbnail(info),
+    }
+
+
+def _set_started(future):
+    """Mark a lookup as started by its worker (called on the event loop)."""
+    if not future.done():
+        future.set_result(None)
+
+
+class SessionResolver:
+    """
+    Resolver running yt-dlp in-process with one session per worker thread.
+
+    Provides fetch(), resolve(), list_flat() and the concurrent
+    fetch_async() (see pipepipe_async). Raises ImportError when the yt_dlp
+    package is not installed.
+    """
+
+    # Lookups block their thread; a ServiceRouter passes its lanes' pools to fetch_async()
+    blocking = True
+
+    def __init__(self, cookies_file=None, timeout=30, max_workers=DEFAULT_MAX_WORKERS,
+                 start_interval=DEFAULT_START_INTERVAL):
+        """Load the cookie jar once; sessions are opened by the worker threads on first use."""
+        import yt_dlp
+
+        self.yt_dlp = yt_dlp
+        self.cookies_file = cookies_file
+        self.timeout = timeout
+        self.max_processes = max_workers
+        self.start_interval = start_interval
+        self.cookie_jar = load_cookie_jar(cookies_file)
+        self.local = threading.local()
+        self.sessions = []
+        self.lock = threading.Lock()
+        self.executor = None
+
+    def open_session(self, **params):
+        """Return a new YoutubeDL sharing the resolver's cookie jar."""
+        options = {
+            'quiet': True,
+            'no_warnings': True,
+            'noprogress': True,
+            'skip_download': True,
+            'socket_timeout': self.timeout,
+            'logger': _QuietLogger(),
+        }
+        options.update(params)
+        session = self.yt_dlp.YoutubeDL(options)
+        # Replaces the jar yt-dlp would otherwise load from 'cookiefile'
+        session.cookiejar = self.cookie_jar
+        with self.lock:
+            self.sessions.append(session)
+        return session
+
+    def close_session(self, session):
+        """Close a session opened by open_session()."""
+        with self.lock:
+            self.sessions.remove(session)
+        session.close()
+
+    def session(self):
+        """
+        Return the calling thread's YoutubeDL, opening it on first use.
+
+        The session is kept for the life of the thread, so its HTTP
+        connections are reused from one lookup to the next.
+        """
+        session = getattr(self.local, 'session', None)
+        if session is None:
+            session = self.local.session = self.open_session()
+        return session
+
+    def extract(self, session, url):
+        """Run extract_info without format processing; raises ResolveError on failure."""
+        try:
+            info = session.extract_info(url, download=False, process=False)
+        except self.yt_dlp.utils.DownloadError as e:
+            message = str(e)
+            raise ResolveError(classify_error(message), message.strip()[-200:],
+                               timed_out='timed out' in message.lower())
+        if not info:
+            raise ResolveError(ERROR_UNKNOWN, 'no information returned')
+        return info
+
+    def fetch(self, url, timeout=None):
+        """
+        Fetch metadata for a single video; raises ResolveError on failure.
+
+        The lookup is bounded by the session's socket timeout only; timeout
+        is accepted for the resolver interface and enforced by fetch_async().
+        """
+        return metadata_from_info(self.extract(self.session(), url))
+
+    async def fetch_async(self, url, timeout=None, executor=None):
+        """
+        Fetch metadata on a worker thread; raises ResolveError on failure.
+
+        executor is the thread pool to run on (default: the resolver's own).
+        timeout (default: the resolver's) counts from when a worker starts
+        the lookup; a lookup running into it fails as a timed out network
+        error, and its thread is freed by the session's socket timeout.
+        """
+        if executor is None:
+            with self.lock:
+                if self.executor is None:
+                    self.executor = ThreadPoolExecutor(max_workers=self.max_processes,
+                                                       thread_name_prefix='yt-dlp-session')
+                executor = self.executor
+        timeout = timeout or self.timeout
+        loop = asyncio.get_running_loop()
+        started = loop.create_future()
+
+        def run():
+            loop.call_soon_threadsafe(_set_started, started)
+            return self.fetch(url)
+
+        lookup = loop.run_in_executor(executor, run)
+        # Waiting for a free worker does not count against the timeout
+        await asyncio.wait([started, lookup], return_when=asyncio.FIRST_COMPLETED)
+        try:
+            return await asyncio.wait_for(lookup, timeout)
+        except asyncio.TimeoutError:
+            raise ResolveError(ERROR_NETWORK, f"timed out after {timeout:g} s", timed_out=True)
+
+    def resolve(self, url):
+        """Fetch metadata for a single video, or None if it could not be resolved."""
+        try:
+            return self.fetch(url)
+        except ResolveError:
+            return None
+
+    def list_flat(self, url):
+        """List (url, metadata) for every entry of a channel or playlist in one call."""
+        session = self.open_session(extract_flat='in_playlist')
+        try:
+            info = self.extract(session, url)
+        except ResolveError:
+            return []
+        finally:
+            self.close_session(session)
+
+        listing_uploader = info.get('uploader') or info.get('channel')
+        entries = []
+        for entry in info.get('entries') or []:
+            uploader = entry.get('channel') or entry.get('uploader') or listing_uploader
+            if not (entry.get('url') and entry.get('title') and uploader):
+                continue
+            metadata = metadata_from_info(entry)
+            metadata['uploader'] = uploader
+            entries.append((entry['url'], metadata))
+        return entries
+
+    def close(self):
+        """Stop the worker threads and close their sessions."""
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+        with self.lock:
+            for session in self.sessions:
+                session.close()
+            self.sessions = []
+
+
+def create_resolver(cookies_file=None):
+    """Return a SessionResolver, or the yt-dlp command line resolver without the yt_dlp package."""
+    try:
+        return SessionResolver(cookies_file=cookies_file)
+    except ImportError:
+        from pipepipe_async import AsyncYtDlpResolver
+
+        return AsyncYtDlpResolver(cookies_file=cookies_file)
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+PipePipe library statistics - health report for a whole backup
+
+Reads streams, playlists and playlist_stream_join in one aggregated pass
+each and reports:
+- Per-playlist entry counts, unique videos, placeholder entries and
+  entries pointing at missing stream rows
+- Placeholder videos, and how many of them the metadata update would look up
+- Duplicate videos (several stream rows with the same canonical video ID)
+- Orphan streams that are not in any playlist
+- The estimated time to update the remaining placeholder videos, from the
+  lookup throughput measured on earlier runs
+
+The report is a plain dict that serializes to JSON, so many backups can be
+monitored with the command line:
+
+    python pipepipe_stats.py backup1.zip backup2.zip PipePipe.db > report.json
+
+Author: GitHub Community
+License: MIT
+"""
+
+import json
+import os
+import sys
+
+from pipepipe_backup import library_database
+from pipepipe_db import (
+    PLACEHOLDER_TITLE,
+    PLACEHOLDER_UPLOADER,
+    canonical_video_id,
+    database,
+    local_playlist_filter,
+)
+
+# Lookups per second assumed before any throughput has been measured
+DEFAULT_THROUGHPUT = 1.0
+
+THROUGHPUT_FILE = 'throughput.json'
+
+# Weight of the newest measurement in the stored throughput
+THROUGHPUT_SMOOTHING = 0.5
+
+# Number of duplicate groups listed in the report
+DUPLICATE_EXAMPLES = 20
+
+
+def playlist_stats(conn):
+    """Return per-playlist statistics, largest playlist first."""
+    cursor = conn.execute("""
+    SELECT p.uid, p.name,
+           COUNT(psj.stream_id),
+           COUNT(DISTINCT psj.stream_id),
+           COALESCE(SUM(s.title = ? AND s.uploader = ?), 0),
+           COALESCE(SUM(psj.stream_id IS NOT NULL AND s.uid IS NULL), 0)
+    FROM playlists p
+    LEFT JOIN playlist_stream_join psj ON psj.playlist_id = p.uid
+    LEFT JOIN streams s ON s.uid = psj.stream_id
+    GROUP BY p.uid
+    ORDER BY COUNT(psj.stream_id) DESC, p.uid
+    """, (PLACEHOLDER_TITLE, PLACEHOLDER_UPLOADER))
+    return [{
+        'uid': uid,
+        'name': name,
+        'entries': entries,
+        'unique_streams': unique_streams,
+        'placeholders': placeholders,
+        'missing_streams': missing_streams,
+    } for uid, name, entries, unique_streams, placeholders, missing_streams in cursor]
+
+
+def stream_stats(conn):
+    """
+    Return totals over the streams table.
+
+    Each stream row is read once together with its playlist membership,
+    aggregated per stream from playlist_stream_join in the same query.
+    """
+    playlist_condition, params = local_playlist_filter()
+    cursor = conn.execute(f"""
+    SELECT s.uid, s.url, s.title = ? AND s.uploader = ?, m.stream_id IS NOT NULL, COALESCE(m.local, 0)
+    FROM streams s
+    LEFT JOIN (
+        SELECT psj.stream_id, MAX({playlist_condition}) AS local
+        FROM playlist_stream_join psj
+        JOIN playlists p ON p.uid = psj.playlist_id
+        GROUP BY psj.stream_id
+    ) m ON m.stream_id = s.uid
+    """, [PLACEHOLDER_TITLE, PLACEHOLDER_UPLOADER] + params)
+
+    total = placeholders = needs_update = orphans = orphan_placeholders = 0
+    first_uid = {}
+    duplicates = {}
+    for uid, url, is_placeholder, in_playlist, in_local in cursor:
+        total += 1
+        if is_placeholder:
+            placeholders += 1
+            if in_local:
+                needs_update += 1
+        if not in_playlist:
+            orphans += 1
+            if is_placeholder:
+                orphan_placeholders += 1
+        # Only videos seen more than once get a list of their rows
+        video_id = canonical_video_id(url)
+        first = first_uid.setdefault(video_id, uid)
+        if first != uid and video_id is not None:
+            duplicates.setdefault(video_id, [first]).append(uid)
+
+    examples = sorted(duplicates.items(), key=lambda item: len(item[1]), reverse=True)
+    return {
+        'total': total,
+        'unique_videos': len(first_uid),
+        'placeholders': placeholders,
+        'needs_update': needs_update,
+        'orphans': orphans,
+        'orphan_placeholders': orphan_placeholders,
+        'duplicate_videos': len(duplicates),
+        'duplicate_rows': sum(len(uids) - 1 for uids in duplicates.values()),
+        'duplicate_examples': [{'video_id': video_id, 'uids': sorted(uids)}
+                               for video_id, uids in examples[:DUPLICATE_EXAMPLES]],
+    }
+
+
+def measured_throughput(result):
+    """Return the lookups per second of an update_streams() result, or None."""
+    if not result.get('looked_up') or not result.get('lookup_seconds'):
+        return None
+    return result['looked_up'] / result['lookup_seconds']
+
+
+def load_throughput(directory):
+    """Return the throughput stored in directory, or None when none was measured yet."""
+    try:
+        with open(os.path.join(directory, THROUGHPUT_FILE), 'r', encoding='utf-8') as f:
+            return float(json.load(f)['lookups_per_second'])
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def record_throughput(result, directory):
+    """Fold the throughput of an update_streams() result into the value stored in directory."""
+    throughput = measured_throughput(result)
+    if throughput is None:
+        return None
+    previous = load_throughput(directory)
+    if previous is not None:
+        throughput = THROUGHPUT_SMOOTHING * throughput + (1 - THROUGHPUT_SMOOTHING) * previous
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, THROUGHPUT_FILE), 'w', encoding='utf-8') as f:
+        json.dump({'lookups_per_second': throughput}, f)
+    return throughput
+
+
+def library_stats(db, throughput=None):
+    """
+    Return the statistics report for a PipePipe database.
+
+    db is a database path or an open connection (see pipepipe_db.database).
+    throughput is the measured lookups per second used for the update time
+    estimate; DEFAULT_THROUGHPUT is assumed without it.
+    """
+    with database(db) as conn:
+        playlists = playlist_stats(conn)
+        streams = stream_stats(conn)
+
+    rate = throughput or DEFAULT_THROUGHPUT
+    return {
+        'streams': streams,
+        'playlists': playlists,
+        'playlist_count': len(playlists),
+        'playlist_entries': sum(p['entries'] for p in playlists),
+        'update_estimate': {
+            'videos': streams['needs_update'],
+            'lookups_per_second': rate,
+            'measured': throughput is not None,
+            'seconds': round(streams['needs_update'] / rate, 1),
+        },
+    }
+
+
+def backup_stats(path, throughput=None):
+    """Return the statistics report for a backup zip or a PipePipe.db file."""
+    with library_database(path, prefix='pipepipe_stats_') as db_path:
+        return library_stats(db_path, throughput)
+
+
+def main():
+    """Print a JSON statistics report for each backup or database given."""
+    args = sys.argv[1:]
+    throughput = None
+    if '--throughput' in args:
+        index = args.index('--throughput')
+        throughput = float(args[index + 1])
+        del args[index:index + 2]
+    if not args:
+        print("Usage: python pipepipe_stats.py <backup.zip|PipePipe.db>... [--throughput lookups/s]")
+        sys.exit(1)
+
+    if throughput is None:
+        from pipepipe_workspace import WorkspaceManager
+        throughput = load_throughput(WorkspaceManager().root)
+
+    reports = {}
+    for path in args:
+        if not os.path.exists(path):
+            print(f"Error: File not found: {path}", file=sys.stderr)
+            sys.exit(1)
+        reports[path] = backup_stats(path, throughput)
+    json.dump(reports, sys.stdout, indent=2, ensure_ascii=False)
+    print()
+
+
+if __name__ == "__main__":
+    main()
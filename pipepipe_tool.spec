@@ -18,7 +18,31 @@ a = Analysis(
         'subprocess',
         'sqlite3',
         'threading',
-        'datetime'
+        'datetime',
+        'pipepipe_async',
+        'pipepipe_backup',
+        'pipepipe_cache',
+        'pipepipe_clean',
+        'pipepipe_connections',
+        'pipepipe_control',
+        'pipepipe_daemon',
+        'pipepipe_db',
+        'pipepipe_dedup',
+        'pipepipe_export',
+        'pipepipe_fingerprint',
+        'pipepipe_merge',
+        'pipepipe_pipeline',
+        'pipepipe_refresh',
+        'pipepipe_resolver',
+        'pipepipe_retry',
+        'pipepipe_routing',
+        'pipepipe_search',
+        'pipepipe_server',
+        'pipepipe_session',
+        'pipepipe_stats',
+        'pipepipe_update',
+        'pipepipe_validate',
+        'pipepipe_workspace'
     ],
     hookspath=[],
     hooksconfig={},
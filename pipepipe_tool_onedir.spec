@@ -0,0 +1,99 @@
+# -*- mode: python ; coding: utf-8 -*-
+#
+# Lightweight build profile: one-dir, no UPX.
+# The one-file build (pipepipe_tool.spec) unpacks the whole bundle to a temp
+# directory on every launch and UPX-compressed binaries must be decompressed
+# before they load. This profile leaves everything unpacked next to the
+# executable, so startup only pays for the imports the window needs.
+
+block_cipher = None
+
+a = Analysis(
+    ['newpipe_metadata_tool.py'],
+    pathex=[],
+    binaries=[],
+    datas=[],
+    hiddenimports=[
+        'tkinter',
+        'tkinter.ttk',
+        'tkinter.filedialog',
+        'tkinter.messagebox',
+        'tkinter.scrolledtext',
+        'zipfile',
+        'tempfile',
+        'subprocess',
+        'sqlite3',
+        'threading',
+        'datetime',
+        'pipepipe_async',
+        'pipepipe_backup',
+        'pipepipe_cache',
+        'pipepipe_clean',
+        'pipepipe_connections',
+        'pipepipe_control',
+        'pipepipe_daemon',
+        'pipepipe_db',
+        'pipepipe_dedup',
+        'pipepipe_export',
+        'pipepipe_fingerprint',
+        'pipepipe_merge',
+        'pipepipe_pipeline',
+        'pipepipe_refresh',
+        'pipepipe_resolver',
+        'pipepipe_retry',
+        'pipepipe_routing',
+        'pipepipe_search',
+        'pipepipe_server',
+        'pipepipe_session',
+        'pipepipe_stats',
+        'pipepipe_update',
+        'pipepipe_validate',
+        'pipepipe_workspace'
+    ],
+    hookspath=[],
+    hooksconfig={},
+    runtime_hooks=[],
+    excludes=[
+        'unittest',
+        'pydoc',
+        'doctest',
+        'pdb'
+    ],
+    win_no_prefer_redirects=False,
+    win_private_assemblies=False,
+    cipher=block_cipher,
+    noarchive=False,
+)
+
+pyz = PYZ(a.pure, a.zipped_data, cipher=block_cipher)
+
+exe = EXE(
+    pyz,
+    a.scripts,
+    [],
+    exclude_binaries=True,
+    name='PipePipe_Metadata_Tool',
+    debug=False,
+    bootloader_ignore_signals=False,
+    strip=False,
+    upx=False,
+    console=False,  # No console window
+    disable_windowed_traceback=False,
+    argv_emulation=False,
+    target_arch=None,
+    codesign_identity=None,
+    entitlements_file=None,
+    icon=None,
+    version_file=None
+)
+
+coll = COLLECT(
+    exe,
+    a.binaries,
+    a.zipfiles,
+    a.datas,
+    strip=False,
+    upx=False,
+    upx_exclude=[],
+    name='PipePipe_Metadata_Tool'
+)
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+PipePipe metadata update - fills placeholder streams through a resolver
+
+Finds videos in the local playlists that still have placeholder metadata and
+resolves them with a resolver (see pipepipe_resolver). With channel batching
+enabled, candidates are grouped by uploader URL and each group is resolved
+with one flat channel listing; extra playlist listings can be given as well.
+Per-video lookups are only used for videos not found in any listing; they
+go through the retry scheduler (see pipepipe_retry), which retries transient
+failures with backoff. Resolvers with fetch_async() (see pipepipe_async) run
+many lookups concurrently from one event loop; others run one at a time.
+
+With a fingerprint store (see pipepipe_fingerprint), placeholder rows that
+are unchanged since an earlier run get that run's outcome back without a
+lookup; only new or changed rows are looked up. With a metadata cache (see
+pipepipe_cache), videos found by an earlier lookup are filled from the
+cache, and new lookup results are added to it.
+
+The update can be paused and cancelled through an OperationControl (see
+pipepipe_control). On cancel, everything resolved so far is written and the
+remaining videos keep their placeholder metadata, so a later run picks them
+up again.
+
+Author: GitHub Community
+License: MIT
+"""
+
+import time
+
+from pipepipe_async import run_async
+from pipepipe_control import OperationCancelled, checkpoint
+from pipepipe_db import (
+    StreamWriter,
+    canonical_video_id,
+    database,
+    select_placeholder_streams,
+    stream_priorities,
+)
+from pipepipe_fingerprint import placeholder_fingerprints
+from pipepipe_resolver import DEFINITIVE_ERRORS, channel_listing_url
+from pipepipe_retry import RetryScheduler, fetcher_for
+
+# Smallest number of pending videos from one channel worth a channel listing
+MIN_CHANNEL_GROUP = 3
+
+# Lookup results added to the metadata cache at a time, so a shared cache
+# (see pipepipe_cache) sees them while the run goes on
+CACHE_BATCH = 100
+
+
+def resolve_from_listings(resolver, candidates, listing_urls=(), group_by_channel=True,
+                          min_group_size=MIN_CHANNEL_GROUP, log=print, control=None):
+    """
+    Resolve candidates from flat channel and playlist listings.
+
+    candidates is a list of (uid, url, uploader_url, service_id). The given listing URLs
+    are fetched first, then (with group_by_channel) one listing per channel
+    that still has at least min_group_size pending videos. Returns a dict of
+    uid -> metadata for every candidate found in a listing, and the number of
+    listing calls made. When cancelled through control, the listings fetched
+    so far are returned.
+    """
+    # Pending uids per canonical video ID (one video can have several rows)
+    pending = {}
+    for uid, url, uploader_url, service_id in candidates:
+        pending.setdefault(canonical_video_id(url), []).append(uid)
+
+    # Channel groups, largest first
+    groups = {}
+    for uid, url, uploader_url, service_id in candidates:
+        if group_by_channel and uploader_url:
+            groups.setdefault(uploader_url, set()).add(canonical_video_id(url))
+    channel_groups = sorted(groups.items(), key=lambda item: len(item[1]), reverse=True)
+
+    listings = [(listing_url, None) for listing_url in listing_urls]
+    listings += [(channel_listing_url(uploader_url), video_ids)
+                 for uploader_url, video_ids in channel_groups]
+
+    resolved = {}
+    listing_calls = 0
+    for listing_url, video_ids in listings:
+        if not pending:
+            break
+        # Skip channels whose videos were already found in an earlier listing
+        if video_ids is not None and len(video_ids & pending.keys()) < min_group_size:
+            continue
+
+        try:
+            checkpoint(control)
+        except OperationCancelled:
+            break
+        entries = resolver.list_flat(listing_url)
+        listing_calls += 1
+
+        found = 0
+        for entry_url, metadata in entries:
+            for uid in pending.pop(canonical_video_id(entry_url), []):
+                resolved[uid] = metadata
+                found += 1
+        log(f"Listing {listing_url}: {len(entries)} entries, {found} videos resolved")
+
+    return resolved, listing_calls
+
+
+def run_lookups(scheduler, resolver, delay=0.5, control=None):
+    """
+    Run the scheduler's lookups and yield (key, url, metadata, error kind).
+
+    Resolvers with fetch_async() run concurrently (see pipepipe_async),
+    others one at a time with delay seconds in between.
+    """
+    if hasattr(resolver, 'fetch_async'):
+        return run_async(scheduler, resolver, control)
+    return scheduler.run(fetcher_for(resolver), delay, control)
+
+
+def update_streams(db, resolver, group_by_channel=False, listing_urls=(), delay=0.5, log=print,
+                   control=None, limit=None, time_budget=None, fingerprints=None, cache=None,
+                   progress=None):
+    """
+    Update placeholder streams with metadata from the resolver.
+
+    db is a database path or an open connection (see pipepipe_db.database).
+    Videos are looked up in priority order (see pipepipe_db.stream_priorities),
+    so a partial run updates the videos at the top of the playlists first.
+    limit caps the number of videos processed. time_budget caps the seconds
+    spent: once it is used up, no new lookups are started. fingerprints is
+    an optional FingerprintStore to skip rows unchanged since an earlier
+    run and to record the outcomes of this one; cache is an optional
+    MetadataCache to fill videos from and add new results to, in batches
+    of CACHE_BATCH as they arrive. delay is the
+    pause between sequential lookups; concurrent resolvers pace themselves
+    instead. progress(done, total) is called after every finished lookup.
+
+    Returns a dict with the counts 'updated', 'errors', 'from_listings',
+    'resolver_calls' and 'retries', 'error_kinds' counting failures per
+    error class, 'unavailable' with the uids of videos that failed with a
+    definitive error (removed, private, unknown), and 'cancelled' telling
+    whether the run was cancelled through control before all videos were
+    looked up. Videos that failed with other errors (throttled, network
+    after all retries, age-gated) keep their placeholder metadata.
+    'looked_up' and 'lookup_seconds' give the number of videos finished by
+    per-video lookups and the time spent on them; 'skipped' counts videos
+    left for a later run when the time budget ran out, and
+    'from_fingerprints' and 'from_cache' the videos handled from the
+    fingerprint store and the metadata cache.
+    """
+    with database(db) as conn:
+        writer = StreamWriter(conn)
+        candidates = select_placeholder_streams(conn, extra_columns=('uploader_url', 'service_id'))
+        priorities = stream_priorities(conn)
+        candidates.sort(key=lambda row: priorities[row[0]])
+
+        # Unchanged rows get their earlier outcome back; the rest is looked up
+        hashes = placeholder_fingerprints(conn) if fingerprints is not None else {}
+        known = fingerprints.known(hashes) if fingerprints is not None else {}
+        from_fingerprints = [row for row in candidates if row[0] in known]
+        candidates = [row for row in candidates if row[0] not in known]
+        video_ids = {uid: canonical_video_id(url) for uid, url, uploader_url, service_id in candidates}
+        cached = cache.get_many(video_ids.values()) if cache is not None else {}
+        from_cache = [row for row in candidates if video_ids[row[0]] in cached]
+        candidates = [row for row in candidates if video_ids[row[0]] not in cached]
+        if limit:
+            candidates = candidates[:limit]
+        log(f"Found {len(candidates)} videos to update")
+        if from_fingerprints:
+            log(f"{len(from_fingerprints)} videos unchanged since an earlier run")
+        if from_cache:
+            log(f"{len(from_cache)} videos filled from the metadata cache")
+
+        from_listings = {}
+        resolver_calls = 0
+        updated_count = 0
+        error_kinds = {}
+        unavailable = []
+        cancelled = False
+        looked_up = 0
+        lookup_started = None
+        outcomes_to_record = []
+        to_cache = []
+        scheduler = RetryScheduler()
+        if time_budget:
+            scheduler.deadline = scheduler.clock() + time_budget
+        try:
+            for uid, url, uploader_url, service_id in from_fingerprints:
+                if known[uid]:
+                    writer.write(uid, known[uid])
+                    updated_count += 1
+                else:
+                    unavailable.append(uid)
+            for uid, url, uploader_url, service_id in from_cache:
+                writer.write(uid, cached[video_ids[uid]][0])
+                updated_count += 1
+            writer.flush()
+
+            if group_by_channel or listing_urls:
+                from_listings, resolver_calls = resolve_from_listings(
+                    resolver, candidates, listing_urls, group_by_channel, log=log, control=control)
+                for uid, metadata in from_listings.items():
+                    writer.write(uid, metadata)
+                    outcomes_to_record.append((uid, metadata))
+                    to_cache.append((video_ids[uid], metadata))
+                writer.flush()
+                updated_count += len(from_listings)
+
+            for uid, url, uploader_url, service_id in candidates:
+                if uid not in from_listings:
+                    scheduler.add(uid, url, priorities[uid], service_id)
+
+            lookup_started = time.monotonic()
+            lookups = scheduler.pending()
+            for uid, url, metadata, error_kind in run_lookups(scheduler, resolver, delay, control):
+                looked_up += 1
+                if progress:
+                    progress(looked_up, lookups)
+                if metadata:
+                    writer.write(uid, metadata)
+                    outcomes_to_record.append((uid, metadata))
+                    updated_count += 1
+                    to_cache.append((video_ids[uid], metadata))
+                    if cache is not None and len(to_cache) >= CACHE_BATCH:
+                        cache.put_many(to_cache)
+                        to_cache = []
+                else:
+                    error_kinds[error_kind] = error_kinds.get(error_kind, 0) + 1
+                    if error_kind in DEFINITIVE_ERRORS:
+                        unavailable.append(uid)
+                        outcomes_to_record.append((uid, None))
+        except OperationCancelled:
+            cancelled = True
+            log("Update cancelled, saving videos resolved so far")
+        writer.flush()
+        if fingerprints is not None:
+            fingerprints.record(hashes[uid] + (metadata,)
+                                for uid, metadata in outcomes_to_record if uid in hashes)
+        if cache is not None:
+            cache.put_many(to_cache)
+        if scheduler.skipped:
+            log(f"Time budget used up, {scheduler.skipped} videos left for a later run")
+        if hasattr(resolver, 'lane_stats'):
+            paused = [name for name, stats in resolver.lane_stats().items() if stats['trips']]
+            if paused:
+                log(f"Lookups paused after repeated failures for: {', '.join(sorted(paused))}")
+        lookup_seconds = time.monotonic() - lookup_started if lookup_started else 0.0
+
+        return {
+            'updated': updated_count,
+            'errors': sum(error_kinds.values()),
+            'from_listings': len(from_listings),
+            'resolver_calls': resolver_calls + scheduler.attempts,
+            'retries': scheduler.retries,
+            'error_kinds': error_kinds,
+            'unavailable': unavailable,
+            'cancelled': cancelled,
+            'looked_up': looked_up,
+            'lookup_seconds': lookup_seconds,
+            'skipped': scheduler.skipped,
+            'from_fingerprints': len(from_fingerprints),
+            'from_cache': len(from_cache),
+        }
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+PipePipe backup validation - fast integrity checks before and after a run
+
+A corrupt archive or database otherwise only fails deep inside a long run.
+validate_backup() checks a backup in a few seconds, with the checks running
+concurrently on a small thread pool:
+- archive: PipePipe.db and PipePipe.settings are present, and every member
+  is read through once in chunks so its CRC-32 is verified
+- settings: PipePipe.settings is not empty and looks like a settings file
+  (a Java serialization stream or JSON)
+- database: PRAGMA quick_check passes and streams, playlists and
+  playlist_stream_join have the columns this tool reads and writes; the
+  schema version (user_version) is reported
+
+The database is opened read-only. Before processing, the working copy in
+the work folder is checked (extracting it already verified its CRC); a
+written backup is checked as a whole before it is reported as saved.
+
+    python pipepipe_validate.py backup.zip [backup2.zip ...]
+
+Author: GitHub Community
+License: MIT
+"""
+
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+import zipfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+
+from pipepipe_backup import BACKUP_FILES
+from pipepipe_db import table_columns
+
+# Columns the tool relies on, per table
+REQUIRED_COLUMNS = {
+    'streams': ('uid', 'service_id', 'url', 'title', 'uploader', 'uploader_url', 'duration',
+                'view_count', 'upload_date', 'thumbnail_url'),
+    'playlists': ('uid', 'name'),
+    'playlist_stream_join': ('playlist_id', 'stream_id', 'join_index'),
+}
+
+# Start of a Java serialization stream, as written by Android's SharedPreferences export
+JAVA_SERIALIZATION_MAGIC = b'\xac\xed\x00\x05'
+
+MAX_SETTINGS_BYTES = 16 * 1024 * 1024
+
+# quick_check messages reported at most
+MAX_REPORTED = 5
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def check_members(backup_path):
+    """Return problems with the zip's central directory and required members."""
+    try:
+        with zipfile.ZipFile(backup_path, 'r') as zip_ref:
+            names = set(zip_ref.namelist())
+    except (zipfile.BadZipFile, OSError) as e:
+        return [f"Not a readable zip archive: {e}"]
+    return [f"{name} not found in backup" for name in BACKUP_FILES if name not in names]
+
+
+def check_archive(backup_path, skip=()):
+    """Read every member (except skip) in chunks; returns problems such as CRC mismatches."""
+    problems = []
+    with zipfile.ZipFile(backup_path, 'r') as zip_ref:
+        for info in zip_ref.infolist():
+            if info.filename in skip or info.is_dir():
+                continue
+            try:
+                with zip_ref.open(info) as member:
+                    while member.read(CHUNK_SIZE):
+                        pass
+            except (zipfile.BadZipFile, zlib.error, EOFError, OSError) as e:
+                problems.append(f"{info.filename}: {e}")
+    return problems
+
+
+def check_settings(backup_path):
+    """Return problems with PipePipe.settings."""
+    with zipfile.ZipFile(backup_path, 'r') as zip_ref:
+        info = zip_ref.getinfo('PipePipe.settings')
+        if info.file_size == 0:
+            return ["PipePipe.settings is empty"]
+        if info.file_size > MAX_SETTINGS_BYTES:
+            return [f"PipePipe.settings is unexpectedly large ({info.file_size} bytes)"]
+        try:
+            data = zip_ref.read(info)
+        except (zipfile.BadZipFile, zlib.error) as e:
+            return [f"PipePipe.settings: {e}"]
+    if data.startswith(JAVA_SERIALIZATION_MAGIC):
+        return []
+    try:
+        json.loads(data.decode('utf-8'))
+        return []
+    except (UnicodeDecodeError, ValueError):
+        return ["PipePipe.settings is not a settings file"]
+
+
+def check_database(db_path):
+    """Return (problems, schema version) for a PipePipe.db, opened read-only."""
+    try:
+        conn = sqlite3.connect(f"file:{quote(os.path.abspath(db_path))}?mode=ro", uri=True)
+    except sqlite3.Error as e:
+        return [f"PipePipe.db cannot be opened: {e}"], None
+    try:
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        results = [row[0] for row in conn.execute(f"PRAGMA quick_check({MAX_REPORTED})")]
+        problems = [] if results == ['ok'] else [f"PipePipe.db is damaged: {message}" for message in results]
+        for table, columns in REQUIRED_COLUMNS.items():
+            present = set(table_columns(conn, table))
+            if not present:
+                problems.append(f"PipePipe.db has no {table} table")
+                continue
+            missing = [column for column in columns if column not in present]
+            if missing:
+                problems.append(f"PipePipe.db table {table} lacks columns: {', '.join(missing)}")
+        return problems, version
+    except sqlite3.DatabaseError as e:
+        return [f"PipePipe.db is not a valid database: {e}"], None
+    finally:
+        conn.close()
+
+
+def check_extracted_database(backup_path, directory):
+    """Extract PipePipe.db into directory (verifying its CRC) and check it."""
+    path = os.path.join(directory, 'PipePipe.db')
+    try:
+        with zipfile.ZipFile(backup_path, 'r') as zip_ref, \
+                zip_ref.open('PipePipe.db') as source, open(path, 'wb') as target:
+            shutil.copyfileobj(source, target, CHUNK_SIZE)
+    except (zipfile.BadZipFile, zlib.error, EOFError) as e:
+        return [f"PipePipe.db: {e}"], None
+    return check_database(path)
+
+
+def validate_backup(backup_path, db_path=None, check_crc=True):
+    """
+    Check a backup zip; see the module docstring.
+
+    db_path is an already extracted copy of the backup's PipePipe.db (e.g.
+    the working copy); without it, PipePipe.db is extracted to a temporary
+    folder for the check. check_crc=False skips reading the archive members
+    through, for a backup whose extraction already verified them.
+
+    Returns a dict with 'ok', the list of 'problems', the database schema
+    'version' and the 'seconds' taken.
+    """
+    started = time.monotonic()
+    problems = check_members(backup_path)
+    version = None
+    if not problems:
+        temp_dir = tempfile.mkdtemp(prefix='pipepipe_check_') if db_path is None else None
+        try:
+            with ThreadPoolExecutor(max_workers=3) as pool:
+                archive = None
+                if check_crc:
+                    # An extracted PipePipe.db had its CRC verified while being extracted
+                    skip = ('PipePipe.db',) if temp_dir else ()
+                    archive = pool.submit(check_archive, backup_path, skip)
+                settings = pool.submit(check_settings, backup_path)
+                if temp_dir:
+                    database = pool.submit(check_extracted_database, backup_path, temp_dir)
+                else:
+                    database = pool.submit(check_database, db_path)
+                if archive:
+                    problems.extend(archive.result())
+                problems.extend(settings.result())
+                database_problems, version = database.result()
+                problems.extend(database_problems)
+        finally:
+            if temp_dir:
+                shutil.rmtree(temp_dir, ignore_errors=True)
+    return {
+        'ok': not problems,
+        'problems': problems,
+        'version': version,
+        'seconds': time.monotonic() - started,
+    }
+
+
+def main():
+    """Validate one or more backups; exits with status 1 when any fails."""
+    if len(sys.argv) < 2:
+        print("Usage: python pipepipe_validate.py <backup.zip> [<backup.zip> ...]")
+        sys.exit(1)
+
+    failed = False
+    for path in sys.argv[1:]:
+        if not os.path.exists(path):
+            print(f"Error: File not found: {path}")
+            failed = True
+            continue
+        report = validate_backup(path)
+        if report['ok']:
+            print(f"OK: {path} (schema version {report['version']}, {report['seconds']:.1f} s)")
+        else:
+            failed = True
+            print(f"FAILED: {path}")
+            for problem in report['problems']:
+                print(f"  - {problem}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
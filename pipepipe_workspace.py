@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+PipePipe workspaces - managed working directories for extracted backups
+
+Each backup is extracted once into a workspace directory keyed by the
+backup's content hash. Processing the same backup again reuses (and
+continues from) that working copy instead of extracting it anew. Old
+workspaces are removed, least recently used first, when the total size
+goes over a cap. A workspace is leased from acquire() until release(), and
+neither leased workspaces nor extractions in progress are ever removed, so
+concurrent jobs (see pipepipe_daemon and pipepipe_server) cannot evict each
+other's folders.
+
+The workspace location defaults to a folder in the system temp directory
+and can be changed with the PIPEPIPE_WORKSPACE environment variable, e.g.
+to a tmpfs/RAM disk or a fast SSD. PIPEPIPE_WORKSPACE_MAX_MB sets the cap.
+
+Small databases can also be processed entirely in memory: open_database()
+copies them into an in-memory SQLite database with the backup API, and
+save_database() writes them back once at the end.
+
+Author: GitHub Community
+License: MIT
+"""
+
+import errno
+import hashlib
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+import zipfile
+
+from pipepipe_backup import BACKUP_FILES
+from pipepipe_db import connect
+
+DEFAULT_MAX_BYTES = 5 * 1024 * 1024 * 1024
+
+# Databases up to this size are processed in memory by default
+MEMORY_DB_LIMIT = 64 * 1024 * 1024
+
+COMPLETE_MARKER = '.complete'
+
+# Prefix of extractions in progress (see WorkspaceManager.acquire)
+PARTIAL_PREFIX = 'partial_'
+
+KEY_LENGTH = 32
+
+# Lease files mark a workspace as in use: .lease_<pid>_<id>
+LEASE_PREFIX = '.lease_'
+
+# Leases of other processes are honoured this long, so a process that
+# crashed while holding one cannot keep its workspace forever
+LEASE_MAX_AGE = 24 * 60 * 60
+
+# Lease file names held by this process per workspace path; the lock keeps
+# lease checks and evictions of all managers in the process from interleaving
+_held_leases = {}
+_lease_lock = threading.Lock()
+
+
+def is_workspace_name(name):
+    """Whether a directory name is a workspace (a backup key) or a partial extraction."""
+    if name.startswith(PARTIAL_PREFIX):
+        return True
+    return len(name) == KEY_LENGTH and all(c in '0123456789abcdef' for c in name)
+
+
+def backup_key(backup_path):
+    """
+    Return a content hash for a backup zip.
+
+    The hash covers the name, CRC-32 and size of every member as recorded
+    in the zip's central directory, so the archive data itself is not read.
+    """
+    digest = hashlib.sha256()
+    with zipfile.ZipFile(backup_path, 'r') as zip_ref:
+        for info in sorted(zip_ref.infolist(), key=lambda i: i.filename):
+            digest.update(f"{info.filename}\0{info.CRC:08x}\0{info.file_size}\n".encode('utf-8'))
+    return digest.hexdigest()[:KEY_LENGTH]
+
+
+def directory_size(path):
+    """Return the total size in bytes of the files below path."""
+    total = 0
+    for dirpath, dirnames, filenames in os.walk(path):
+        for filename in filenames:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, filename))
+            except OSError:
+                pass
+    return total
+
+
+class WorkspaceManager:
+    """Creates, reuses and evicts workspace directories under one root."""
+
+    def __init__(self, root=None, max_bytes=None):
+        """Use the given root and size cap, or the environment/default settings."""
+        if root is None:
+            root = os.environ.get('PIPEPIPE_WORKSPACE') or os.path.join(
+                tempfile.gettempdir(), 'pipepipe_workspaces')
+        if max_bytes is None:
+            max_mb = os.environ.get('PIPEPIPE_WORKSPACE_MAX_MB')
+            max_bytes = int(max_mb) * 1024 * 1024 if max_mb else DEFAULT_MAX_BYTES
+        self.root = root
+        self.max_bytes = max_bytes
+
+    def acquire(self, backup_path):
+        """
+        Return (workspace path, reused) for a backup.
+
+        An existing workspace for the same backup content is reused; otherwise
+        the backup is extracted into a new one. The workspace is leased to the
+        caller and is not evicted until release() is called for it. Raises
+        FileNotFoundError when the backup lacks PipePipe.db or PipePipe.settings.
+        """
+        os.makedirs(self.root, exist_ok=True)
+        path = os.path.join(self.root, backup_key(backup_path))
+
+        with _lease_lock:
+            if os.path.exists(os.path.join(path, COMPLETE_MARKER)):
+                self.lease(path)
+                self.touch(path)
+                return path, True
+
+        # Extract next to the final location and rename, so an interrupted
+        # extraction is never mistaken for a complete workspace
+        partial = tempfile.mkdtemp(prefix=PARTIAL_PREFIX, dir=self.root)
+        try:
+            with zipfile.ZipFile(backup_path, 'r') as zip_ref:
+                zip_ref.extractall(partial)
+            for name in BACKUP_FILES:
+                if not os.path.exists(os.path.join(partial, name)):
+                    raise FileNotFoundError(errno.ENOENT, "Not found in backup", name)
+            open(os.path.join(partial, COMPLETE_MARKER), 'w').close()
+            with _lease_lock:
+                # Another process may have finished the same extraction first
+                reused = os.path.exists(os.path.join(path, COMPLETE_MARKER))
+                if reused:
+                    shutil.rmtree(partial, ignore_errors=True)
+                else:
+                    shutil.rmtree(path, ignore_errors=True)
+                    os.replace(partial, path)
+                self.lease(path)
+        except Exception:
+            shutil.rmtree(partial, ignore_errors=True)
+            raise
+
+        self.cleanup(keep=path)
+        return path, reused
+
+    def lease(self, path):
+        """Mark a workspace as in use by this process (call with _lease_lock held)."""
+        name = f"{LEASE_PREFIX}{os.getpid()}_{uuid.uuid4().hex}"
+        open(os.path.join(path, name), 'w').close()
+        _held_leases.setdefault(path, []).append(name)
+
+    def release(self, path):
+        """Give up one lease on a workspace taken by acquire(); it may be evicted afterwards."""
+        with _lease_lock:
+            names = _held_leases.get(path)
+            if not names:
+                return
+            name = names.pop()
+            if not names:
+                del _held_leases[path]
+            try:
+                os.remove(os.path.join(path, name))
+            except OSError:
+                pass
+
+    def is_leased(self, path):
+        """
+        Whether a workspace is in use.
+
+        Leases of this process count while they are held; leases of other
+        processes count for LEASE_MAX_AGE seconds.
+        """
+        own = f"{LEASE_PREFIX}{os.getpid()}_"
+        held = _held_leases.get(path, ())
+        try:
+            names = os.listdir(path)
+        except OSError:
+            return False
+        for name in names:
+            if not name.startswith(LEASE_PREFIX):
+                continue
+            if name.startswith(own):
+                if name in held:
+                    return True
+                continue
+            try:
+                if time.time() - os.path.getmtime(os.path.join(path, name)) < LEASE_MAX_AGE:
+                    return True
+            except OSError:
+                pass
+        return False
+
+    def touch(self, path):
+        """Mark a workspace as recently used."""
+        now = time.time()
+        os.utime(os.path.join(path, COMPLETE_MARKER), (now, now))
+
+    def discard(self, path):
+        """Remove a workspace, e.g. after a cancelled run, together with its leases."""
+        with _lease_lock:
+            _held_leases.pop(path, None)
+            shutil.rmtree(path, ignore_errors=True)
+
+    def workspaces(self):
+        """
+        Return (last used time, size, path) of all workspaces, oldest first.
+
+        Other directories in the root (e.g. the job server's, see
+        pipepipe_server) are not workspaces and are never removed.
+        """
+        entries = []
+        if not os.path.isdir(self.root):
+            return entries
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            marker = os.path.join(path, COMPLETE_MARKER)
+            if not is_workspace_name(name) or not os.path.isdir(path):
+                continue
+            # Partial extractions count as least recently used (but see cleanup())
+            last_used = os.path.getmtime(marker) if os.path.exists(marker) else 0
+            entries.append((last_used, directory_size(path), path))
+        entries.sort()
+        return entries
+
+    def cleanup(self, keep=None):
+        """
+        Remove least recently used workspaces until the total size is under the cap.
+
+        Extractions in progress, leased workspaces and keep are never removed.
+        """
+        with _lease_lock:
+            entries = self.workspaces()
+            total = sum(size for last_used, size, path in entries)
+            for last_used, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                if path == keep or os.path.basename(path).startswith(PARTIAL_PREFIX):
+                    continue
+                if self.is_leased(path):
+                    continue
+                shutil.rmtree(path, ignore_errors=True)
+                total -= size
+
+
+def open_database(db_path, in_memory=None):
+    """
+    Open a PipePipe database for processing.
+
+    With in_memory (by default: when the file is at most MEMORY_DB_LIMIT
+    bytes) the database is copied into an in-memory database with the
+    SQLite backup API, so processing does no disk I/O until save_database().
+    """
+    if in_memory is None:
+        in_memory = os.path.getsize(db_path) <= MEMORY_DB_LIMIT
+    if not in_memory:
+        return connect(db_path)
+
+    disk = sqlite3.connect(db_path)
+    try:
+        memory = connect(':memory:')
+        disk.backup(memory)
+    finally:
+        disk.close()
+    return memory
+
+
+def is_in_memory(conn):
+    """True when the connection's main database is in memory."""
+    for seq, name, filename in conn.execute("PRAGMA database_list"):
+        if name == 'main':
+            return not filename
+    return False
+
+
+def save_database(conn, db_path):
+    """Commit and, for an in-memory database, write it back to db_path."""
+    conn.commit()
+    if not is_in_memory(conn):
+        return
+    disk = sqlite3.connect(db_path)
+    try:
+        conn.backup(disk)
+    finally:
+        disk.close()
@@ -0,0 +1,244 @@
+"""
+Fixtures for the performance tests: synthetic backups, SQL statement
+tracing, process spawn counting and stub resolvers.
+
+PIPEPIPE_PERF_STREAMS sets the size of the synthetic library (default
+20000 streams); PIPEPIPE_PERF_TIME_FACTOR scales the wall time budgets for
+slow machines (default 1.0) and PIPEPIPE_PERF_WALL_CLOCK=0 turns them off,
+for shared runners whose timings vary too much to hold a budget. The
+statement, commit, process and heap checks always run.
+"""
+
+import asyncio
+import collections
+import os
+import sqlite3
+import subprocess
+import sys
+import time
+import tracemalloc
+import zipfile
+
+import pytest
+
+from pipepipe_db import LOCAL_PLAYLISTS, PLACEHOLDER_TITLE, PLACEHOLDER_UPLOADER
+
+STREAMS = int(os.environ.get('PIPEPIPE_PERF_STREAMS', 20000))
+TIME_FACTOR = float(os.environ.get('PIPEPIPE_PERF_TIME_FACTOR', 1.0))
+WALL_CLOCK = os.environ.get('PIPEPIPE_PERF_WALL_CLOCK', '1') != '0'
+
+# Every PLACEHOLDER_EVERY-th stream still has placeholder metadata
+PLACEHOLDER_EVERY = 2
+CHANNELS = 50
+
+# The tables of a PipePipe.db that the tool works on
+SCHEMA = """
+CREATE TABLE streams (
+    uid INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL, service_id INTEGER NOT NULL, url TEXT NOT NULL,
+    title TEXT NOT NULL, stream_type TEXT NOT NULL, duration INTEGER NOT NULL, uploader TEXT NOT NULL,
+    uploader_url TEXT, thumbnail_url TEXT, view_count INTEGER, textual_upload_date TEXT,
+    upload_date INTEGER, is_upload_date_approximation INTEGER
+);
+CREATE UNIQUE INDEX index_streams_service_id_url ON streams (service_id, url);
+CREATE TABLE playlists (uid INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL, name TEXT, thumbnail_url TEXT);
+CREATE TABLE playlist_stream_join (
+    playlist_id INTEGER NOT NULL, stream_id INTEGER NOT NULL, join_index INTEGER NOT NULL,
+    PRIMARY KEY (playlist_id, join_index),
+    FOREIGN KEY (playlist_id) REFERENCES playlists (uid) ON UPDATE CASCADE ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED,
+    FOREIGN KEY (stream_id) REFERENCES streams (uid) ON UPDATE CASCADE ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED
+);
+CREATE INDEX index_playlist_stream_join_stream_id ON playlist_stream_join (stream_id);
+"""
+
+# Start of a Java serialization stream, like a real PipePipe.settings
+SETTINGS = b'\xac\xed\x00\x05'
+
+
+def video_url(index):
+    """Return the YouTube URL of synthetic video number index."""
+    return f"https://www.youtube.com/watch?v=v{index:010d}"
+
+
+def channel_url(index):
+    """Return the channel URL of synthetic video number index."""
+    return f"https://www.youtube.com/channel/UC{index % CHANNELS:022d}"
+
+
+def build_database(path, streams=STREAMS):
+    """
+    Write a synthetic PipePipe.db and return the number of placeholder videos.
+
+    Streams are spread over the two local playlists and one other playlist;
+    every PLACEHOLDER_EVERY-th stream has placeholder metadata.
+    """
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    conn.executemany("INSERT INTO playlists (name) VALUES (?)",
+                     [(name,) for name in LOCAL_PLAYLISTS] + [('Music',)])
+    rows = []
+    for index in range(streams):
+        placeholder = index % PLACEHOLDER_EVERY == 0
+        rows.append((
+            video_url(index),
+            PLACEHOLDER_TITLE if placeholder else f"Video number {index} about things",
+            0 if placeholder else 60 + index % 3600,
+            PLACEHOLDER_UPLOADER if placeholder else f"Channel {index % CHANNELS}",
+            channel_url(index),
+            None if placeholder else index * 7,
+        ))
+    conn.executemany("""
+    INSERT INTO streams (service_id, url, title, stream_type, duration, uploader, uploader_url, view_count)
+    VALUES (0, ?, ?, 'VIDEO_STREAM', ?, ?, ?, ?)
+    """, rows)
+    # Playlist 1 and 2 are the local playlists; every fifth video is also in Music
+    conn.executemany("INSERT INTO playlist_stream_join VALUES (?, ?, ?)",
+                     ((1 + index % 2, index + 1, index) for index in range(streams)))
+    conn.executemany("INSERT INTO playlist_stream_join VALUES (3, ?, ?)",
+                     ((index + 1, index) for index in range(0, streams, 5)))
+    conn.commit()
+    conn.close()
+    return len(range(0, streams, PLACEHOLDER_EVERY))
+
+
+def write_zip(backup_path, db_path):
+    """Zip a PipePipe.db with a settings file into a backup."""
+    with zipfile.ZipFile(backup_path, 'w', zipfile.ZIP_DEFLATED) as zip_ref:
+        zip_ref.write(db_path, 'PipePipe.db')
+        zip_ref.writestr('PipePipe.settings', SETTINGS)
+
+
+def budget(seconds, per_thousand=0.0):
+    """
+    Return a wall time budget of seconds plus per_thousand per 1000 streams, scaled by TIME_FACTOR.
+
+    Without WALL_CLOCK checks the budget is unlimited.
+    """
+    if not WALL_CLOCK:
+        return float('inf')
+    return (seconds + per_thousand * STREAMS / 1000) * TIME_FACTOR
+
+
+class Measurement:
+    """Wall time and peak Python heap of a block of code."""
+
+    def __init__(self):
+        self.seconds = None
+        self.peak_bytes = None
+
+    def __enter__(self):
+        tracemalloc.start()
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.seconds = time.perf_counter() - self.started
+        self.peak_bytes = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return False
+
+    @property
+    def peak_mb(self):
+        return self.peak_bytes / (1024 * 1024)
+
+
+class StatementTrace:
+    """SQL statements run on a connection, counted by their first keyword."""
+
+    def __init__(self, conn):
+        self.statements = []
+        conn.set_trace_callback(self.statements.append)
+
+    def counts(self):
+        return collections.Counter(statement.split(None, 1)[0].upper() for statement in self.statements)
+
+    @property
+    def commits(self):
+        return self.counts()['COMMIT']
+
+
+class SpawnCounter:
+    """Number of child processes started."""
+
+    def __init__(self):
+        self.count = 0
+
+
+class InProcessResolver:
+    """Concurrent stub resolver answering every lookup with made-up metadata, without processes."""
+
+    max_processes = 8
+    start_interval = 0.0
+
+    def __init__(self, listings=None):
+        """listings maps a listing URL to the video URLs list_flat() returns for it."""
+        self.fetched = collections.Counter()
+        self.listed = []
+        self.listings = listings or {}
+
+    def metadata(self, url):
+        return {'title': f"Resolved {url[-11:]}", 'uploader': 'Somebody', 'duration': 212,
+                'view_count': 1000, 'upload_date': '20240101', 'thumbnail_url': None}
+
+    async def fetch_async(self, url, timeout=None):
+        self.fetched[url] += 1
+        await asyncio.sleep(0)
+        return self.metadata(url)
+
+    def list_flat(self, url):
+        self.listed.append(url)
+        return [(video, self.metadata(video)) for video in self.listings.get(url, ())]
+
+    def close(self):
+        pass
+
+
+# Stands in for the yt-dlp program: prints one METADATA_TEMPLATE line for the URL
+STUB_YT_DLP = """
+import sys
+url = sys.argv[-1]
+print('Resolved ' + url[-11:] + '|||Somebody|||212|||1000|||20240101|||NA')
+"""
+
+
+@pytest.fixture
+def synthetic_backup(tmp_path):
+    """A synthetic backup zip; returns (backup path, number of placeholder videos)."""
+    db_path = str(tmp_path / 'source.db')
+    placeholders = build_database(db_path)
+    backup_path = str(tmp_path / 'backup.zip')
+    write_zip(backup_path, db_path)
+    os.remove(db_path)
+    return backup_path, placeholders
+
+
+@pytest.fixture
+def working_db(tmp_path):
+    """A synthetic PipePipe.db in a work folder; returns (db path, number of placeholder videos)."""
+    working_dir = tmp_path / 'work'
+    working_dir.mkdir()
+    (working_dir / 'PipePipe.settings').write_bytes(SETTINGS)
+    db_path = str(working_dir / 'PipePipe.db')
+    return db_path, build_database(db_path)
+
+
+@pytest.fixture
+def spawns(monkeypatch):
+    """Count child processes; asyncio subprocesses are started through subprocess.Popen too."""
+    counter = SpawnCounter()
+    real_popen = subprocess.Popen
+
+    class CountingPopen(real_popen):
+        def __init__(self, *args, **kwargs):
+            counter.count += 1
+            super().__init__(*args, **kwargs)
+
+    monkeypatch.setattr(subprocess, 'Popen', CountingPopen)
+    return counter
+
+
+@pytest.fixture
+def stub_yt_dlp(tmp_path):
+    """Return a command line prefix running the stub yt-dlp program."""
+    script = tmp_path / 'stub_yt_dlp.py'
+    script.write_text(STUB_YT_DLP)
+    return [sys.executable, str(script)]
@@ -0,0 +1,151 @@
+"""
+Metadata cache: the file, network and tiered backends, damaged entries and
+the cache server's token and request checks.
+"""
+
+import http.client
+import threading
+
+import pytest
+
+from pipepipe_cache import (
+    TOKEN_HEADER,
+    FileCacheBackend,
+    MetadataCache,
+    NetworkCacheBackend,
+    TieredCacheBackend,
+    serve,
+)
+
+METADATA = {'title': 'A title', 'uploader': 'Someone', 'duration': 60}
+
+
+@pytest.fixture
+def cache_server(tmp_path):
+    """Start a cache server with token 'secret'; returns (backend, url)."""
+    backend = FileCacheBackend(str(tmp_path / 'server.db'))
+    httpd = serve(backend, host='127.0.0.1', port=0, token='secret')
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield backend, f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+    backend.close()
+
+
+def test_file_backend_keeps_the_latest_entry(tmp_path):
+    backend = FileCacheBackend(str(tmp_path / 'cache.db'))
+    backend.put_many([('a', 'first', 1.0), ('b', 'other', 2.0)])
+    backend.put_many([('a', 'second', 3.0)])
+
+    assert backend.get_many(['a', 'b', 'missing']) == {'a': ('second', 3.0), 'b': ('other', 2.0)}
+    assert backend.count() == 2
+    backend.close()
+
+
+def test_metadata_cache_round_trip(tmp_path, monkeypatch):
+    monkeypatch.delenv('PIPEPIPE_CACHE_URL', raising=False)
+    cache = MetadataCache.in_directory(str(tmp_path))
+    cache.put_many([('youtube:abc', METADATA), (None, METADATA)], fetched_at=10.0)
+
+    assert cache.get_many(['youtube:abc', 'youtube:xyz', None]) == {'youtube:abc': (METADATA, 10.0)}
+    cache.close()
+
+
+def test_damaged_entries_are_left_out(tmp_path):
+    backend = FileCacheBackend(str(tmp_path / 'cache.db'))
+    backend.put_many([('good', '{"title": "A title"}', 1.0), ('cut', '{"title": "A ti', 1.0),
+                      ('list', '[1, 2]', 1.0)])
+    cache = MetadataCache(backend)
+
+    assert cache.get_many(['good', 'cut', 'list']) == {'good': ({'title': 'A title'}, 1.0)}
+    # A new lookup replaces the damaged entry
+    cache.put_many([('cut', METADATA)], fetched_at=2.0)
+    assert cache.get_many(['cut']) == {'cut': (METADATA, 2.0)}
+    cache.close()
+
+
+def test_tiered_backend_stores_shared_hits_locally(tmp_path):
+    local = FileCacheBackend(str(tmp_path / 'local.db'))
+    shared = FileCacheBackend(str(tmp_path / 'shared.db'))
+    shared.put_many([('a', 'from elsewhere', 1.0)])
+    tiered = TieredCacheBackend(local, shared)
+
+    assert tiered.get_many(['a', 'b']) == {'a': ('from elsewhere', 1.0)}
+    assert local.get_many(['a']) == {'a': ('from elsewhere', 1.0)}
+
+    tiered.put_many([('b', 'new', 2.0)])
+    assert shared.get_many(['b']) == {'b': ('new', 2.0)}
+    tiered.close()
+
+
+def test_network_backend_shares_entries_through_the_server(cache_server):
+    backend, url = cache_server
+    writer = NetworkCacheBackend(url, token='secret', batch_size=2)
+    reader = NetworkCacheBackend(url, token='secret', batch_size=2)
+
+    writer.put_many([(f"key{index}", f"value{index}", float(index)) for index in range(5)])
+    assert reader.get_many(['key0', 'key4', 'missing']) == {'key0': ('value0', 0.0), 'key4': ('value4', 4.0)}
+    assert backend.count() == 5
+    assert writer.errors == reader.errors == 0
+    writer.close()
+    reader.close()
+
+
+@pytest.mark.parametrize('token', [None, 'wrong', 'secret-but-longer'])
+def test_server_rejects_a_missing_or_wrong_token(cache_server, token):
+    backend, url = cache_server
+    now = [0.0]
+    client = NetworkCacheBackend(url, token=token, retry_after=60, clock=lambda: now[0])
+
+    client.put_many([('a', 'value', 1.0)])
+    assert client.errors == 1
+    assert client.last_error == 'HTTP 403'
+    assert backend.count() == 0
+
+    # The server is skipped until retry_after has passed
+    client.get_many(['a'])
+    assert client.errors == 1
+    now[0] = 61
+    client.get_many(['a'])
+    assert client.errors == 2
+    client.close()
+
+
+def test_health_needs_the_token(cache_server):
+    backend, url = cache_server
+    port = int(url.rsplit(':', 1)[1])
+    for headers, status in (({}, 403), ({TOKEN_HEADER: 'wrong'}, 403), ({TOKEN_HEADER: 'secret'}, 200)):
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+        conn.request('GET', '/health', headers=headers)
+        response = conn.getresponse()
+        response.read()
+        conn.close()
+        assert response.status == status
+
+
+@pytest.mark.parametrize('length', ['many', '-1', '1e3'])
+def test_invalid_content_length_is_a_bad_request(cache_server, length):
+    backend, url = cache_server
+    port = int(url.rsplit(':', 1)[1])
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+    conn.putrequest('POST', '/get')
+    conn.putheader(TOKEN_HEADER, 'secret')
+    conn.putheader('Content-Length', length)
+    conn.endheaders()
+    response = conn.getresponse()
+    response.read()
+    conn.close()
+    assert response.status == 400
+
+
+def test_unreachable_server_is_skipped(tmp_path):
+    local = FileCacheBackend(str(tmp_path / 'local.db'))
+    shared = NetworkCacheBackend('http://127.0.0.1:1', timeout=1)
+    tiered = TieredCacheBackend(local, shared)
+
+    tiered.put_many([('a', 'value', 1.0)])
+    # Reads still work from the local file
+    assert tiered.get_many(['a', 'b']) == {'a': ('value', 1.0)}
+    assert shared.errors == 1
+    tiered.close()
@@ -0,0 +1,86 @@
+"""
+Cleanup: the set-based removal against a row-by-row reference, and a
+cancelled cleanup leaving the database unchanged.
+"""
+
+import sqlite3
+
+from conftest import build_database
+
+from pipepipe_clean import clean_unavailable
+from pipepipe_control import OperationControl
+from pipepipe_db import LOCAL_PLAYLISTS, connect, select_placeholder_streams
+
+STREAMS = 30
+
+
+def reference_clean(db_path, uids):
+    """Remove uids from the local playlists one by one; the behaviour the set-based cleanup must match."""
+    conn = sqlite3.connect(db_path)
+    marks = ', '.join('?' for _ in LOCAL_PLAYLISTS)
+    for uid in uids:
+        conn.execute(f"DELETE FROM playlist_stream_join WHERE stream_id = ? "
+                     f"AND playlist_id IN (SELECT uid FROM playlists WHERE name IN ({marks}))",
+                     (uid,) + tuple(LOCAL_PLAYLISTS))
+        if not conn.execute("SELECT 1 FROM playlist_stream_join WHERE stream_id = ?", (uid,)).fetchone():
+            conn.execute("DELETE FROM streams WHERE uid = ?", (uid,))
+    conn.commit()
+    conn.close()
+
+
+def dump(path):
+    conn = sqlite3.connect(path)
+    tables = {table: conn.execute(f"SELECT * FROM {table} ORDER BY 1, 2").fetchall()
+              for table in ('streams', 'playlist_stream_join')}
+    conn.close()
+    return tables
+
+
+class CancelAfter(OperationControl):
+    """Cancels once the given number of checkpoints have passed."""
+
+    def __init__(self, checkpoints):
+        super().__init__()
+        self.remaining = checkpoints
+
+    def checkpoint(self):
+        if self.remaining == 0:
+            self.cancel()
+        self.remaining -= 1
+        super().checkpoint()
+
+
+def test_cleanup_matches_the_row_by_row_reference(tmp_path):
+    db_path = str(tmp_path / 'PipePipe.db')
+    placeholders = build_database(db_path, streams=STREAMS)
+    expected_path = str(tmp_path / 'expected.db')
+    build_database(expected_path, streams=STREAMS)
+    conn = connect(db_path)
+    uids = [row[0] for row in select_placeholder_streams(conn)]
+    conn.close()
+    reference_clean(expected_path, uids)
+
+    assert clean_unavailable(db_path) == placeholders
+
+    tables = dump(db_path)
+    assert tables == dump(expected_path)
+    # Placeholders also in the Music playlist keep their stream row
+    kept = [row[0] for row in tables['streams'] if row[0] in uids]
+    assert kept == [uid for uid in uids if (uid - 1) % 5 == 0]
+
+
+def test_cancelled_cleanup_is_rolled_back(tmp_path):
+    db_path = str(tmp_path / 'PipePipe.db')
+    placeholders = build_database(db_path, streams=STREAMS)
+    before = dump(db_path)
+    conn = connect(db_path)
+
+    # Cancelled at the last checkpoint, after the removal ran
+    assert clean_unavailable(conn, control=CancelAfter(1)) is None
+    assert not conn.in_transaction
+    assert dump(db_path) == before
+
+    # The same connection can clean up afterwards
+    assert clean_unavailable(conn) == placeholders
+    conn.close()
+    assert dump(db_path) != before
@@ -0,0 +1,117 @@
+"""
+Connection manager: snapshots of the readers, the size of the reader pool
+and the database turned back into a single file, plus the statistics
+report made on a reader while the pipeline writes.
+"""
+
+import os
+import sqlite3
+import threading
+
+from conftest import InProcessResolver, build_database
+
+from pipepipe_connections import ConnectionManager
+from pipepipe_pipeline import process_database, stats_in_background
+from pipepipe_stats import library_stats
+
+STREAMS = 20
+
+
+def quiet(message):
+    pass
+
+
+def make_library(tmp_path):
+    path = str(tmp_path / 'PipePipe.db')
+    build_database(path, streams=STREAMS)
+    return path
+
+
+def test_reader_sees_the_snapshot_from_before_the_write(tmp_path):
+    manager = ConnectionManager(make_library(tmp_path))
+    try:
+        with manager.reader() as reader:
+            reader.execute("BEGIN")
+            assert reader.execute("SELECT COUNT(*) FROM streams").fetchone()[0] == STREAMS
+
+            manager.writer.execute("DELETE FROM streams WHERE uid > 10")
+            manager.writer.commit()
+
+            # Not blocked by the writer, and still on its snapshot
+            assert reader.execute("SELECT COUNT(*) FROM streams").fetchone()[0] == STREAMS
+        with manager.reader() as reader:
+            assert reader.execute("SELECT COUNT(*) FROM streams").fetchone()[0] == 10
+    finally:
+        manager.close()
+
+
+def test_pool_waits_for_a_reader_at_its_size(tmp_path):
+    manager = ConnectionManager(make_library(tmp_path), readers=2)
+    got = []
+    returned = threading.Event()
+
+    def third():
+        with manager.reader() as conn:
+            got.append(conn)
+        returned.set()
+
+    try:
+        with manager.reader() as first:
+            with manager.reader() as second:
+                thread = threading.Thread(target=third)
+                thread.start()
+                assert not returned.wait(0.3)
+            # The connection given back is handed to the waiting thread
+            assert returned.wait(10)
+            thread.join()
+        assert got == [second]
+        assert manager.opened == 2
+    finally:
+        manager.close()
+
+
+def test_close_turns_the_database_back_into_one_file(tmp_path):
+    path = make_library(tmp_path)
+    manager = ConnectionManager(path)
+    assert manager.writer.execute("PRAGMA journal_mode").fetchone()[0] == 'wal'
+    manager.writer.execute("UPDATE streams SET title = 'Changed' WHERE uid = 1")
+    with manager.reader() as reader:
+        reader.execute("SELECT COUNT(*) FROM streams").fetchone()
+    manager.close()
+
+    assert not os.path.exists(path + '-wal')
+    conn = sqlite3.connect(path)
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == 'delete'
+    # The uncommitted write was committed on close
+    assert conn.execute("SELECT title FROM streams WHERE uid = 1").fetchone()[0] == 'Changed'
+    conn.close()
+
+
+def test_background_report_shows_the_database_before_the_writes(tmp_path):
+    path = make_library(tmp_path)
+    expected = library_stats(path)
+    manager = ConnectionManager(path)
+    report = {}
+    try:
+        thread = stats_in_background(manager, None, report)
+        manager.writer.execute("DELETE FROM playlist_stream_join")
+        manager.writer.execute("DELETE FROM streams")
+        manager.writer.commit()
+        thread.join()
+    finally:
+        manager.close()
+
+    assert report['stats'] == expected
+
+
+def test_pipeline_on_disk_reports_before_processing(tmp_path):
+    path = make_library(tmp_path)
+    expected = library_stats(path)
+
+    result = process_database(path, InProcessResolver(), in_memory=False, stats=True, log=quiet)
+
+    assert result['stats'] == expected
+    assert result['stats']['streams']['placeholders'] == STREAMS // 2
+    assert result['update']['updated'] == STREAMS // 2
+    assert library_stats(path)['streams']['placeholders'] == 0
+    assert not os.path.exists(path + '-wal')
@@ -0,0 +1,191 @@
+"""
+Watch folder: debouncing backups still being written, backing off while
+the queue is full, skipping backups processed before a restart and
+cancelling running jobs.
+"""
+
+import os
+import shutil
+import threading
+import time
+
+import pytest
+
+from conftest import InProcessResolver, build_database, write_zip
+
+from pipepipe_daemon import OUTPUT_SUFFIX, BackupProcessor, FolderWatcher, WatchFolderDaemon
+from pipepipe_workspace import WorkspaceManager
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class BlockingProcessor(BackupProcessor):
+    """Processes backups only once released; records the backups started."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.started = []
+        self.running = threading.Event()
+        self.release = threading.Event()
+
+    def process(self, backup_path, output_path, **kwargs):
+        self.started.append(os.path.basename(backup_path))
+        self.running.set()
+        self.release.wait(30)
+        return super().process(backup_path, output_path, **kwargs)
+
+
+def make_backup(path, streams=20):
+    """Write a backup zip to path (built next to it, then moved in)."""
+    db_path = str(path) + '.db'
+    build_database(db_path, streams=streams)
+    write_zip(str(path) + '.tmp', db_path)
+    os.remove(db_path)
+    os.replace(str(path) + '.tmp', str(path))
+    return str(path)
+
+
+@pytest.fixture
+def folders(tmp_path):
+    inbox = tmp_path / 'inbox'
+    inbox.mkdir()
+    return inbox, tmp_path / 'outbox'
+
+
+def make_daemon(tmp_path, folders, processor=None, **kwargs):
+    inbox, outbox = folders
+    processor = processor or BackupProcessor(resolver=InProcessResolver(),
+                                             workspaces=WorkspaceManager(str(tmp_path / 'workspaces')))
+    messages = []
+    daemon = WatchFolderDaemon(str(inbox), str(outbox), processor, settle=0, use_inotify=False,
+                               log=messages.append, **kwargs)
+    return daemon, messages
+
+
+def wait_until(condition, timeout=30):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.02)
+
+
+def test_file_still_being_written_is_not_picked_up(tmp_path, folders):
+    inbox, outbox = folders
+    clock = FakeClock()
+    watcher = FolderWatcher(str(inbox), settle=5, use_inotify=False, clock=clock)
+    complete = make_backup(tmp_path / 'complete.zip')
+    path = str(inbox / 'backup.zip')
+
+    # The first half of the copy, then no change for longer than the settle time
+    with open(complete, 'rb') as source, open(path, 'wb') as target:
+        target.write(source.read()[:1000])
+    assert watcher.scan() == []
+    clock.now += 10
+    # Unchanged, but not a readable zip yet
+    assert watcher.scan() == []
+
+    shutil.copy(complete, path)
+    clock.now += 1
+    assert watcher.scan() == []
+    clock.now += 4
+    assert watcher.scan() == []
+    clock.now += 1
+    assert watcher.scan() == [path]
+
+    # Handed out once; only a changed file comes back
+    watcher.mark(path)
+    clock.now += 10
+    assert watcher.scan() == []
+
+
+def test_full_queue_leaves_backups_in_the_folder(tmp_path, folders):
+    inbox, outbox = folders
+    processor = BlockingProcessor(resolver=InProcessResolver(),
+                                  workspaces=WorkspaceManager(str(tmp_path / 'workspaces')))
+    daemon, messages = make_daemon(tmp_path, folders, processor, workers=1, max_queued=2)
+    try:
+        make_backup(inbox / 'a.zip')
+        daemon.poll()
+        assert daemon.poll() == 1
+        processor.running.wait(30)
+
+        for name in ('b.zip', 'c.zip', 'd.zip'):
+            make_backup(inbox / name, streams=30)
+        daemon.poll()
+        # Two fit next to the running job; the third waits in the folder
+        assert daemon.poll() == 2
+        assert daemon.poll() == 0
+        assert len(daemon.watcher.settling) == 1
+
+        processor.release.set()
+        wait_until(lambda: daemon.scheduler.pending() == 0)
+        assert daemon.poll() == 1
+        wait_until(lambda: daemon.scheduler.pending() == 0)
+    finally:
+        processor.release.set()
+        daemon.close()
+    assert sorted(processor.started) == ['a.zip', 'b.zip', 'c.zip', 'd.zip']
+    assert sorted(os.listdir(outbox)) == [name + OUTPUT_SUFFIX for name in 'abcd']
+
+
+def test_backups_processed_before_a_restart_are_skipped(tmp_path, folders):
+    inbox, outbox = folders
+    backup_path = make_backup(inbox / 'phone.zip')
+    daemon, messages = make_daemon(tmp_path, folders)
+    try:
+        daemon.poll()
+        assert daemon.poll() == 1
+        wait_until(lambda: daemon.scheduler.pending() == 0)
+    finally:
+        daemon.close()
+    output = str(outbox / ('phone' + OUTPUT_SUFFIX))
+    assert os.path.exists(output)
+
+    # After a restart the existing output is newer than the backup
+    daemon, messages = make_daemon(tmp_path, folders)
+    try:
+        daemon.poll()
+        assert daemon.poll() == 0
+        assert daemon.is_processed(backup_path)
+
+        # A newer copy of the backup is processed again
+        later = os.path.getmtime(output) + 10
+        os.utime(backup_path, (later, later))
+        daemon.poll()
+        assert daemon.poll() == 1
+        wait_until(lambda: daemon.scheduler.pending() == 0)
+    finally:
+        daemon.close()
+    assert daemon.scheduler.completed == 1
+
+
+def test_cancelled_job_writes_nothing_and_runs_again_after_a_restart(tmp_path, folders):
+    inbox, outbox = folders
+    make_backup(inbox / 'phone.zip')
+    processor = BlockingProcessor(resolver=InProcessResolver(),
+                                  workspaces=WorkspaceManager(str(tmp_path / 'workspaces')))
+    daemon, messages = make_daemon(tmp_path, folders, processor)
+    daemon.poll()
+    daemon.poll()
+    processor.running.wait(30)
+    daemon.control.cancel()
+    processor.release.set()
+    daemon.close(cancel=True)
+
+    assert not os.listdir(outbox)
+    assert any('Cancelled' in message for message in messages)
+
+    daemon, messages = make_daemon(tmp_path, folders)
+    try:
+        daemon.poll()
+        assert daemon.poll() == 1
+        wait_until(lambda: daemon.scheduler.pending() == 0)
+    finally:
+        daemon.close()
+    assert os.listdir(outbox) == ['phone' + OUTPUT_SUFFIX]
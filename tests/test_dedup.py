@@ -0,0 +1,150 @@
+"""
+Duplicate consolidation: which row survives, how references are
+repointed, and cancelled or failed runs leaving the database unchanged.
+"""
+
+import sqlite3
+
+import pytest
+
+from conftest import SCHEMA
+
+from pipepipe_control import OperationControl
+from pipepipe_db import LOCAL_PLAYLISTS, PLACEHOLDER_TITLE, PLACEHOLDER_UPLOADER, connect
+from pipepipe_dedup import consolidate_duplicates
+
+# Tables of a PipePipe.db that reference streams besides the playlists
+HISTORY_SCHEMA = """
+CREATE TABLE stream_history (
+    stream_id INTEGER NOT NULL, access_date INTEGER NOT NULL, repeat_count INTEGER NOT NULL,
+    PRIMARY KEY (stream_id, access_date),
+    FOREIGN KEY (stream_id) REFERENCES streams (uid) ON UPDATE CASCADE ON DELETE CASCADE
+);
+CREATE TABLE stream_state (
+    stream_id INTEGER PRIMARY KEY NOT NULL, progress_time INTEGER NOT NULL,
+    FOREIGN KEY (stream_id) REFERENCES streams (uid) ON UPDATE CASCADE ON DELETE CASCADE
+);
+"""
+
+# uid, URL, real metadata: three copies of AAAAAAAAAAA (uid 2 is the first with metadata),
+# two placeholder copies of BBBBBBBBBBB and one CCCCCCCCCCC
+STREAMS = (
+    (1, 'https://www.youtube.com/watch?v=AAAAAAAAAAA', False),
+    (2, 'https://youtu.be/AAAAAAAAAAA', True),
+    (3, 'https://m.youtube.com/watch?v=AAAAAAAAAAA&t=5', True),
+    (4, 'https://www.youtube.com/watch?v=BBBBBBBBBBB', False),
+    (5, 'https://www.youtube.com/shorts/BBBBBBBBBBB', False),
+    (6, 'https://www.youtube.com/watch?v=CCCCCCCCCCC', True),
+)
+
+# playlist_id, join_index, stream_id; playlist 1 holds video AAAAAAAAAAA twice
+ENTRIES = (
+    (1, 0, 1), (1, 1, 6), (1, 2, 2),
+    (3, 0, 3), (3, 1, 5),
+)
+
+
+def build_duplicates(path):
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA + HISTORY_SCHEMA)
+    conn.executemany("INSERT INTO playlists (name) VALUES (?)", [(name,) for name in LOCAL_PLAYLISTS] + [('Music',)])
+    conn.executemany("""
+    INSERT INTO streams (uid, service_id, url, title, stream_type, duration, uploader)
+    VALUES (?, 0, ?, ?, 'VIDEO_STREAM', 0, ?)
+    """, [(uid, url, f"Title {uid}" if known else PLACEHOLDER_TITLE,
+           f"Uploader {uid}" if known else PLACEHOLDER_UPLOADER) for uid, url, known in STREAMS])
+    conn.executemany("INSERT INTO playlist_stream_join (playlist_id, join_index, stream_id) VALUES (?, ?, ?)",
+                     ENTRIES)
+    conn.executemany("INSERT INTO stream_history VALUES (?, ?, 1)", [(1, 100), (2, 100), (3, 200)])
+    conn.executemany("INSERT INTO stream_state VALUES (?, ?)", [(1, 10), (2, 20), (5, 30)])
+    conn.commit()
+    conn.close()
+
+
+def dump(path):
+    conn = sqlite3.connect(path)
+    tables = {table: conn.execute(f"SELECT * FROM {table} ORDER BY 1, 2").fetchall()
+              for table in ('streams', 'playlist_stream_join', 'stream_history', 'stream_state')}
+    conn.close()
+    return tables
+
+
+@pytest.fixture
+def duplicates(tmp_path):
+    path = str(tmp_path / 'PipePipe.db')
+    build_duplicates(path)
+    return path
+
+
+def test_survivor_is_the_first_row_with_metadata(duplicates):
+    report = consolidate_duplicates(duplicates)
+
+    assert report == {'videos': 2, 'removed': 3, 'repointed': 3, 'dropped': 1}
+    tables = dump(duplicates)
+    # Real metadata beats a lower uid; among placeholders the lowest uid survives
+    assert [row[0] for row in tables['streams']] == [2, 4, 6]
+
+
+def test_references_are_repointed_to_the_survivor(duplicates):
+    consolidate_duplicates(duplicates)
+    tables = dump(duplicates)
+
+    # Playlist order is kept; the later copy of a video in the same playlist is dropped
+    assert tables['playlist_stream_join'] == [(1, 2, 0), (1, 6, 1), (3, 2, 0), (3, 4, 1)]
+    # History and state follow the survivor, which keeps its own entry on a clash
+    assert tables['stream_history'] == [(2, 100, 1), (2, 200, 1)]
+    assert tables['stream_state'] == [(2, 20), (4, 30)]
+
+
+def test_without_duplicates_nothing_changes(duplicates):
+    consolidate_duplicates(duplicates)
+    before = dump(duplicates)
+
+    assert consolidate_duplicates(duplicates) == {'videos': 0, 'removed': 0, 'repointed': 0, 'dropped': 0}
+    assert dump(duplicates) == before
+
+
+def test_cancelled_run_is_rolled_back(duplicates):
+    class CancelAtLastCheckpoint(OperationControl):
+        calls = 0
+
+        def checkpoint(self):
+            self.calls += 1
+            if self.calls == 2:
+                self.cancel()
+            super().checkpoint()
+
+    before = dump(duplicates)
+    conn = connect(duplicates)
+
+    assert consolidate_duplicates(conn, control=CancelAtLastCheckpoint()) is None
+    assert dump(duplicates) == before
+    assert consolidate_duplicates(conn)['removed'] == 3
+    conn.close()
+
+
+def test_failed_run_is_rolled_back_and_can_be_repeated(duplicates):
+    conn = connect(duplicates)
+    conn.execute("CREATE TRIGGER keep_streams BEFORE DELETE ON streams BEGIN SELECT RAISE(ABORT, 'kept'); END")
+    conn.commit()
+    before = dump(duplicates)
+
+    with pytest.raises(sqlite3.IntegrityError):
+        consolidate_duplicates(conn)
+    assert dump(duplicates) == before
+
+    conn.execute("DROP TRIGGER keep_streams")
+    assert consolidate_duplicates(conn)['removed'] == 3
+    conn.close()
+
+
+def test_callers_pending_work_is_kept(duplicates):
+    conn = connect(duplicates)
+    conn.execute("UPDATE playlists SET name = 'Renamed' WHERE uid = 3")
+
+    consolidate_duplicates(conn)
+    conn.close()
+
+    conn = sqlite3.connect(duplicates)
+    assert conn.execute("SELECT name FROM playlists WHERE uid = 3").fetchone()[0] == 'Renamed'
+    conn.close()
@@ -0,0 +1,86 @@
+"""
+Library export: formats, one row per playlist entry, and exporting a
+backup as it is in the zip.
+"""
+
+import csv
+import gzip
+import json
+import os
+import sqlite3
+import tempfile
+
+from conftest import build_database, video_url, write_zip
+
+from pipepipe_export import export_backup, export_library
+from pipepipe_workspace import WorkspaceManager
+
+# 10 streams in the two local playlists, streams 0 and 5 also in Music
+STREAMS = 10
+ROWS = STREAMS + 2
+
+
+def make_backup(tmp_path):
+    db_path = str(tmp_path / 'source.db')
+    build_database(db_path, streams=STREAMS)
+    backup_path = str(tmp_path / 'backup.zip')
+    write_zip(backup_path, db_path)
+    os.remove(db_path)
+    return backup_path
+
+
+def test_jsonl_has_one_row_per_playlist_entry(tmp_path):
+    db_path = str(tmp_path / 'PipePipe.db')
+    build_database(db_path, streams=STREAMS)
+    output_path = str(tmp_path / 'library.jsonl.gz')
+
+    assert export_library(db_path, output_path) == ROWS
+
+    with gzip.open(output_path, 'rt', encoding='utf-8') as exported:
+        rows = [json.loads(line) for line in exported]
+    assert len(rows) == ROWS
+    first = [row for row in rows if row['uid'] == 1]
+    assert [row['playlist_id'] for row in first] == [1, 3]
+    assert first[0]['url'] == video_url(0)
+    assert first[1]['playlist'] == 'Music'
+
+
+def test_csv_and_columns_hold_the_same_rows(tmp_path):
+    db_path = str(tmp_path / 'PipePipe.db')
+    build_database(db_path, streams=STREAMS)
+
+    export_library(db_path, str(tmp_path / 'library.csv'))
+    with open(tmp_path / 'library.csv', encoding='utf-8', newline='') as exported:
+        csv_rows = list(csv.DictReader(exported))
+
+    export_library(db_path, str(tmp_path / 'library.columns.json'), chunk_rows=5)
+    with open(tmp_path / 'library.columns.json', encoding='utf-8') as exported:
+        chunks = [json.loads(line) for line in exported]
+
+    assert len(csv_rows) == ROWS
+    assert [len(chunk['uid']) for chunk in chunks] == [5, 5, 2]
+    assert [str(uid) for chunk in chunks for uid in chunk['uid']] == [row['uid'] for row in csv_rows]
+
+
+def test_backup_is_exported_as_it_is_in_the_zip(tmp_path, monkeypatch):
+    backup_path = make_backup(tmp_path)
+    # An update already changed the backup's work folder
+    workspaces = WorkspaceManager(str(tmp_path / 'workspaces'))
+    monkeypatch.setattr('pipepipe_workspace.WorkspaceManager', lambda *args, **kwargs: workspaces)
+    working_dir, reused = workspaces.acquire(backup_path)
+    conn = sqlite3.connect(os.path.join(working_dir, 'PipePipe.db'))
+    conn.execute("UPDATE streams SET title = 'Changed'")
+    conn.commit()
+    conn.close()
+
+    temp_dir = tmp_path / 'tmp'
+    temp_dir.mkdir()
+    monkeypatch.setattr(tempfile, 'tempdir', str(temp_dir))
+    output_path = str(tmp_path / 'library.jsonl')
+    assert export_backup(backup_path, output_path) == ROWS
+
+    with open(output_path, encoding='utf-8') as exported:
+        titles = {json.loads(line)['title'] for line in exported}
+    assert 'Changed' not in titles
+    # The temporary extraction is gone
+    assert not os.listdir(temp_dir)
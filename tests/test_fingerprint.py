@@ -0,0 +1,93 @@
+"""
+Fingerprints: unchanged placeholder rows get their earlier outcome back,
+changed and new rows are looked up again.
+"""
+
+import sqlite3
+
+from conftest import InProcessResolver, build_database, video_url
+
+from pipepipe_db import connect
+from pipepipe_fingerprint import FingerprintStore, placeholder_fingerprints
+from pipepipe_resolver import ERROR_REMOVED, ResolveError
+from pipepipe_update import update_streams
+
+STREAMS = 40
+
+
+def quiet(message):
+    pass
+
+
+class RemovedVideos(InProcessResolver):
+    """Answers like InProcessResolver, except that the given URLs are removed videos."""
+
+    def __init__(self, removed=()):
+        super().__init__()
+        self.removed = set(removed)
+
+    async def fetch_async(self, url, timeout=None):
+        if url in self.removed:
+            self.fetched[url] += 1
+            raise ResolveError(ERROR_REMOVED, 'Video unavailable')
+        return await super().fetch_async(url, timeout)
+
+
+def new_backup(tmp_path, name):
+    path = str(tmp_path / f"{name}.db")
+    return path, build_database(path, streams=STREAMS)
+
+
+def test_row_hash_ignores_the_uid(tmp_path):
+    path, placeholders = new_backup(tmp_path, 'first')
+    conn = connect(path)
+    before = placeholder_fingerprints(conn)
+    # Same row content under another uid, as in a backup from another device
+    conn.execute("UPDATE streams SET uid = uid + 1000")
+    after = placeholder_fingerprints(conn)
+    conn.close()
+
+    assert len(before) == placeholders
+    assert sorted(before.values()) == sorted(after.values())
+
+
+def test_unchanged_rows_are_not_looked_up_again(tmp_path):
+    store = FingerprintStore.in_directory(str(tmp_path / 'work'))
+    first_path, placeholders = new_backup(tmp_path, 'first')
+    removed = RemovedVideos([video_url(0)])
+    first = update_streams(first_path, removed, delay=0, log=quiet, fingerprints=store)
+    assert first['updated'] == placeholders - 1
+    assert first['from_fingerprints'] == 0
+
+    second_path, placeholders = new_backup(tmp_path, 'second')
+    resolver = RemovedVideos()
+    second = update_streams(second_path, resolver, delay=0, log=quiet, fingerprints=store)
+    store.close()
+
+    assert not resolver.fetched
+    assert second['from_fingerprints'] == placeholders
+    assert second['updated'] == placeholders - 1
+    # The removed video is still reported as unavailable, without a lookup
+    assert second['unavailable'] == [1]
+
+
+def test_changed_and_new_rows_are_looked_up(tmp_path):
+    store = FingerprintStore.in_directory(str(tmp_path / 'work'))
+    first_path, placeholders = new_backup(tmp_path, 'first')
+    update_streams(first_path, InProcessResolver(), delay=0, log=quiet, fingerprints=store)
+
+    second_path, placeholders = new_backup(tmp_path, 'second')
+    conn = sqlite3.connect(second_path)
+    # A changed row, and a placeholder video the first backup did not have
+    conn.execute("UPDATE streams SET uploader_url = 'https://www.youtube.com/channel/moved' WHERE url = ?",
+                 (video_url(2),))
+    conn.execute("UPDATE streams SET url = ? WHERE url = ?", (video_url(999), video_url(4)))
+    conn.commit()
+    conn.close()
+    resolver = InProcessResolver()
+    second = update_streams(second_path, resolver, delay=0, log=quiet, fingerprints=store)
+    store.close()
+
+    assert sorted(resolver.fetched) == sorted([video_url(2), video_url(999)])
+    assert second['from_fingerprints'] == placeholders - 2
+    assert second['updated'] == placeholders
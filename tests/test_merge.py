@@ -0,0 +1,102 @@
+"""
+Offline merge: the set-based UPDATE against a row-by-row reference, and a
+failed merge leaving the database usable.
+"""
+
+import sqlite3
+
+import pytest
+
+from conftest import build_database, video_url
+
+from pipepipe_db import PLACEHOLDER_TITLE, PLACEHOLDER_UPLOADER, canonical_video_id, connect
+from pipepipe_merge import MERGE_COLUMNS, merge_databases
+
+STREAMS = 30
+
+
+def make_databases(tmp_path):
+    """
+    Return (target path, source path).
+
+    The target has placeholders at every other stream. The source knows all
+    streams but 0 and 10, writes stream 2 as a youtu.be URL, and has stream 4
+    twice (the lower uid wins).
+    """
+    target_path = str(tmp_path / 'target.db')
+    build_database(target_path, streams=STREAMS)
+    source_path = str(tmp_path / 'source.db')
+    build_database(source_path, streams=STREAMS)
+    conn = sqlite3.connect(source_path)
+    conn.execute("UPDATE streams SET title = 'Known ' || uid, uploader = 'Uploader ' || uid, duration = uid")
+    conn.execute("UPDATE streams SET title = ?, uploader = ? WHERE url IN (?, ?)",
+                 (PLACEHOLDER_TITLE, PLACEHOLDER_UPLOADER, video_url(0), video_url(10)))
+    conn.execute("UPDATE streams SET url = 'https://youtu.be/' || substr(url, -11) WHERE url = ?",
+                 (video_url(2),))
+    conn.execute("INSERT INTO streams (service_id, url, title, stream_type, duration, uploader) "
+                 "VALUES (0, ?, 'Later copy', 'VIDEO_STREAM', 1, 'Someone')", (video_url(4) + '&t=1',))
+    conn.commit()
+    conn.close()
+    return target_path, source_path
+
+
+def reference_merge(target_path, source_path):
+    """Fill placeholders row by row; the behaviour the set-based merge must match."""
+    columns = ', '.join(MERGE_COLUMNS)
+    source = sqlite3.connect(source_path)
+    known = {}
+    for row in source.execute(f"SELECT uid, url, {columns} FROM streams ORDER BY uid"):
+        uid, url, title, uploader = row[0], row[1], row[2], row[3]
+        if (title, uploader) != (PLACEHOLDER_TITLE, PLACEHOLDER_UPLOADER) and title:
+            known.setdefault(canonical_video_id(url), row[2:])
+    source.close()
+
+    target = sqlite3.connect(target_path)
+    placeholders = target.execute("SELECT uid, url FROM streams WHERE title = ? AND uploader = ?",
+                                  (PLACEHOLDER_TITLE, PLACEHOLDER_UPLOADER)).fetchall()
+    for uid, url in placeholders:
+        values = known.get(canonical_video_id(url))
+        if values is not None:
+            assignments = ', '.join(f"{column} = ?" for column in MERGE_COLUMNS)
+            target.execute(f"UPDATE streams SET {assignments} WHERE uid = ?", values + (uid,))
+    target.commit()
+    target.close()
+
+
+def streams(path):
+    conn = sqlite3.connect(path)
+    rows = conn.execute("SELECT * FROM streams ORDER BY uid").fetchall()
+    conn.close()
+    return rows
+
+
+def test_merge_matches_the_row_by_row_reference(tmp_path):
+    target_path, source_path = make_databases(tmp_path)
+    expected_path = str(tmp_path / 'expected.db')
+    build_database(expected_path, streams=STREAMS)
+    reference_merge(expected_path, source_path)
+
+    report = merge_databases(target_path, source_path)
+
+    assert streams(target_path) == streams(expected_path)
+    assert report['filled'] == STREAMS // 2 - 2
+    assert report['source_known'] == STREAMS - 2
+    assert [url for uid, url in report['unfilled']] == [video_url(0), video_url(10)]
+
+
+def test_failed_merge_can_be_followed_by_another(tmp_path):
+    target_path, source_path = make_databases(tmp_path)
+    broken_path = str(tmp_path / 'broken.db')
+    sqlite3.connect(broken_path).close()
+    conn = connect(target_path)
+
+    with pytest.raises(sqlite3.OperationalError):
+        merge_databases(conn, broken_path)
+    # Nothing left attached or in temp tables
+    assert 'source' not in [row[1] for row in conn.execute("PRAGMA database_list")]
+    assert not conn.execute("SELECT name FROM sqlite_temp_master WHERE type = 'table'").fetchall()
+    assert not conn.in_transaction
+
+    report = merge_databases(conn, source_path)
+    conn.close()
+    assert report['filled'] == STREAMS // 2 - 2
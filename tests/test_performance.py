@@ -0,0 +1,169 @@
+"""
+Performance budgets for the stages of a backup run.
+
+Each stage runs on a synthetic backup (see conftest) and is checked for
+wall time, SQL statements and commits, child processes and peak Python
+heap, so a change that brings back per-row commits, per-video processes or
+whole-file reads fails here instead of in a user's twelve-hour run.
+"""
+
+import os
+
+from conftest import (CHANNELS, STREAMS, InProcessResolver, Measurement, StatementTrace, budget,
+                      channel_url, video_url)
+
+from pipepipe_async import AsyncYtDlpResolver
+from pipepipe_backup import write_backup
+from pipepipe_cache import MetadataCache
+from pipepipe_clean import clean_unavailable
+from pipepipe_db import connect, select_placeholder_streams, stream_priorities
+from pipepipe_resolver import channel_listing_url
+from pipepipe_update import update_streams
+from pipepipe_workspace import WorkspaceManager
+
+# Placeholder videos looked up through the stub yt-dlp program
+PROCESS_LOOKUPS = 40
+
+# Heap allowed for the buffers of streamed zip reads and writes
+STREAM_BUFFERS = 4 * 1024 * 1024
+
+
+def quiet(message):
+    pass
+
+
+def test_extraction_streams_the_backup_once(synthetic_backup, tmp_path, spawns):
+    backup_path, placeholders = synthetic_backup
+    workspaces = WorkspaceManager(str(tmp_path / 'workspaces'))
+
+    with Measurement() as first:
+        working_dir, reused = workspaces.acquire(backup_path)
+    assert not reused
+    db_size = os.path.getsize(os.path.join(working_dir, 'PipePipe.db'))
+    assert first.seconds < budget(1.0, 0.05)
+    # Extracted in chunks, never read into memory as a whole
+    assert first.peak_bytes < max(db_size / 2, STREAM_BUFFERS)
+
+    with Measurement() as again:
+        assert workspaces.acquire(backup_path) == (working_dir, True)
+    assert again.seconds < budget(0.5)
+    assert spawns.count == 0
+
+
+def test_selection_is_a_constant_number_of_queries(working_db):
+    db_path, placeholders = working_db
+    conn = connect(db_path)
+    trace = StatementTrace(conn)
+
+    with Measurement() as measured:
+        candidates = select_placeholder_streams(conn, extra_columns=('uploader_url',))
+        priorities = stream_priorities(conn)
+    conn.close()
+
+    assert len(candidates) == placeholders
+    assert len(priorities) == STREAMS
+    assert len(trace.statements) == 2
+    assert measured.seconds < budget(0.5, 0.05)
+    assert measured.peak_mb < 4 + 0.0008 * STREAMS
+
+
+def test_update_batches_writes_and_commits(working_db, spawns):
+    db_path, placeholders = working_db
+    resolver = InProcessResolver()
+    conn = connect(db_path)
+    trace = StatementTrace(conn)
+
+    with Measurement() as measured:
+        result = update_streams(conn, resolver, delay=0, log=quiet)
+    conn.close()
+
+    assert result['updated'] == placeholders
+    # Every placeholder looked up exactly once
+    assert len(resolver.fetched) == placeholders
+    assert max(resolver.fetched.values()) == 1
+    counts = trace.counts()
+    assert counts['UPDATE'] == placeholders
+    assert counts['SELECT'] <= 5
+    # StreamWriter commits once per batch of 50, never once per video
+    assert trace.commits <= placeholders // 40 + 5
+    assert spawns.count == 0
+    assert measured.seconds < budget(2.0, 0.25)
+    assert measured.peak_mb < 8 + 0.0015 * STREAMS
+
+
+def test_update_uses_channel_listings(working_db):
+    db_path, placeholders = working_db
+    listings = {}
+    for index in range(0, STREAMS, 2):
+        listings.setdefault(channel_listing_url(channel_url(index)), []).append(video_url(index))
+    resolver = InProcessResolver(listings)
+
+    result = update_streams(db_path, resolver, group_by_channel=True, delay=0, log=quiet)
+
+    assert result['updated'] == placeholders
+    assert result['from_listings'] == placeholders
+    # One listing per channel instead of one lookup per video
+    assert len(resolver.listed) <= CHANNELS
+    assert not resolver.fetched
+
+
+def test_update_starts_one_process_per_lookup(tmp_path, stub_yt_dlp, spawns):
+    from conftest import build_database
+
+    db_path = str(tmp_path / 'PipePipe.db')
+    placeholders = build_database(db_path, streams=PROCESS_LOOKUPS * 2)
+    resolver = AsyncYtDlpResolver(start_interval=0)
+    resolver.executable = stub_yt_dlp[0]
+    resolver.build_command = lambda args: stub_yt_dlp + list(args)
+    cache = MetadataCache.in_directory(str(tmp_path / 'cache'))
+
+    with Measurement() as measured:
+        result = update_streams(db_path, resolver, cache=cache, delay=0, log=quiet)
+    assert result['updated'] == placeholders
+    assert spawns.count == placeholders
+    assert measured.seconds < budget(0.5 * PROCESS_LOOKUPS / resolver.max_processes + 5)
+
+    # A second backup of the same videos is filled from the cache without processes
+    second_path = str(tmp_path / 'second.db')
+    build_database(second_path, streams=PROCESS_LOOKUPS * 2)
+    spawns.count = 0
+    result = update_streams(second_path, resolver, cache=cache, delay=0, log=quiet)
+    cache.close()
+    assert result['from_cache'] == placeholders
+    assert spawns.count == 0
+
+
+def test_cleanup_is_set_based(working_db):
+    db_path, placeholders = working_db
+    conn = connect(db_path)
+    uids = [row[0] for row in select_placeholder_streams(conn)]
+    trace = StatementTrace(conn)
+
+    with Measurement() as measured:
+        removed = clean_unavailable(conn, uids=uids)
+    remaining = conn.execute("SELECT COUNT(*) FROM playlist_stream_join WHERE playlist_id IN (1, 2)").fetchone()[0]
+    conn.close()
+
+    assert removed == placeholders
+    assert remaining == STREAMS - placeholders
+    counts = trace.counts()
+    # The uids go into a temporary table row by row; everything else is a handful of statements
+    assert counts['INSERT'] == placeholders
+    assert sum(counts.values()) - counts['INSERT'] <= 10
+    assert trace.commits == 1
+    assert measured.seconds < budget(0.5, 0.05)
+    assert measured.peak_mb < 4 + 0.0003 * STREAMS
+
+
+def test_rezip_streams_the_work_folder(working_db, tmp_path, spawns):
+    db_path, placeholders = working_db
+    output_path = str(tmp_path / 'updated.zip')
+
+    with Measurement() as measured:
+        assert write_backup(os.path.dirname(db_path), output_path)
+
+    assert os.path.getsize(output_path) > 0
+    assert measured.seconds < budget(1.0, 0.05)
+    # Compressed in chunks, never read into memory as a whole
+    assert measured.peak_bytes < max(os.path.getsize(db_path) / 2, STREAM_BUFFERS)
+    assert spawns.count == 0
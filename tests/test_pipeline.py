@@ -0,0 +1,116 @@
+"""
+Single-pass pipeline: a backup zip in, a checked processed zip out, with
+failed lookups removed and nothing half-written after a cancel.
+"""
+
+import os
+import sqlite3
+import zipfile
+
+import pytest
+
+from conftest import InProcessResolver, build_database, video_url, write_zip
+
+from pipepipe_control import OperationControl
+from pipepipe_db import PLACEHOLDER_TITLE
+from pipepipe_pipeline import process_backup
+from pipepipe_resolver import ERROR_REMOVED, ResolveError
+from pipepipe_validate import validate_backup
+from pipepipe_workspace import WorkspaceManager
+
+STREAMS = 20
+
+
+def quiet(message):
+    pass
+
+
+class RemovedResolver(InProcessResolver):
+    """Answers every lookup except those for the given URLs, which are removed videos."""
+
+    def __init__(self, removed):
+        super().__init__()
+        self.removed = set(removed)
+
+    async def fetch_async(self, url, timeout=None):
+        if url in self.removed:
+            self.fetched[url] += 1
+            raise ResolveError(ERROR_REMOVED, 'Video unavailable')
+        return await super().fetch_async(url, timeout)
+
+
+@pytest.fixture
+def backup(tmp_path):
+    db_path = str(tmp_path / 'source.db')
+    build_database(db_path, streams=STREAMS)
+    backup_path = str(tmp_path / 'backup.zip')
+    write_zip(backup_path, db_path)
+    os.remove(db_path)
+    return backup_path
+
+
+def read_output(tmp_path, output_path):
+    """
+    Extract the PipePipe.db of a processed zip; returns the streams as
+    uid -> title and the uids of the streams in the local playlists.
+    """
+    with zipfile.ZipFile(output_path) as zip_ref:
+        zip_ref.extract('PipePipe.db', str(tmp_path / 'output'))
+    conn = sqlite3.connect(str(tmp_path / 'output' / 'PipePipe.db'))
+    titles = dict(conn.execute("SELECT uid, title FROM streams"))
+    listed = {row[0] for row in conn.execute(
+        "SELECT stream_id FROM playlist_stream_join WHERE playlist_id IN (1, 2)")}
+    conn.close()
+    return titles, listed
+
+
+def test_backup_is_processed_in_one_pass(tmp_path, backup):
+    output_path = str(tmp_path / 'processed.zip')
+    # Stream 2 (uid 3) is a placeholder for a video that no longer exists
+    resolver = RemovedResolver([video_url(2)])
+    workspaces = WorkspaceManager(str(tmp_path / 'workspaces'))
+
+    result = process_backup(backup, output_path, resolver, workspaces=workspaces, log=quiet)
+
+    assert result['output'] == output_path
+    assert result['removed'] == 1
+    assert validate_backup(output_path)['ok']
+    assert not os.path.exists(output_path + '.partial')
+    titles, listed = read_output(tmp_path, output_path)
+    assert 3 not in listed and len(listed) == STREAMS - 1
+    # The removed video was in no other playlist, so its row is gone as well
+    assert 3 not in titles
+    assert PLACEHOLDER_TITLE not in titles.values()
+    # Each placeholder was looked up exactly once
+    assert len(resolver.fetched) == STREAMS // 2 and max(resolver.fetched.values()) == 1
+
+
+def test_cancelled_run_writes_no_backup(tmp_path, backup):
+    output_path = str(tmp_path / 'processed.zip')
+    control = OperationControl()
+    control.cancel()
+
+    result = process_backup(backup, output_path, InProcessResolver(),
+                            workspaces=WorkspaceManager(str(tmp_path / 'workspaces')),
+                            log=quiet, control=control)
+
+    assert result['output'] is None
+    assert result['removed'] is None
+    assert not os.path.exists(output_path)
+    assert not os.path.exists(output_path + '.partial')
+
+
+def test_damaged_backup_is_refused_and_its_folder_discarded(tmp_path):
+    db_path = str(tmp_path / 'source.db')
+    build_database(db_path, streams=STREAMS)
+    conn = sqlite3.connect(db_path)
+    conn.execute("DROP TABLE playlists")
+    conn.close()
+    backup_path = str(tmp_path / 'backup.zip')
+    write_zip(backup_path, db_path)
+    workspaces = WorkspaceManager(str(tmp_path / 'workspaces'))
+
+    with pytest.raises(ValueError):
+        process_backup(backup_path, str(tmp_path / 'processed.zip'), InProcessResolver(),
+                       workspaces=workspaces, log=quiet)
+    assert workspaces.workspaces() == []
@@ -0,0 +1,96 @@
+"""
+Lookup order: the top of Watch Later and the most recent likes first, and
+the videos left for a later run when the time budget is used up.
+"""
+
+import asyncio
+
+from conftest import InProcessResolver, build_database, video_url
+
+from pipepipe_db import PLACEHOLDER_TITLE, PLACEHOLDER_UPLOADER, database, stream_priorities
+from pipepipe_update import update_streams
+
+STREAMS = 12
+
+
+def quiet(message):
+    pass
+
+
+class RecordingResolver(InProcessResolver):
+    """Looks videos up one at a time, seconds each, and records their order."""
+
+    max_processes = 1
+
+    def __init__(self, seconds=0.0):
+        super().__init__()
+        self.seconds = seconds
+        self.order = []
+
+    async def fetch_async(self, url, timeout=None):
+        self.order.append(url)
+        await asyncio.sleep(self.seconds)
+        return await super().fetch_async(url, timeout)
+
+
+def make_library(tmp_path):
+    """
+    12 placeholder streams: Watch Later holds the odd uids in join order and
+    uid 4 at its end, the likes the even uids (the newest like is uid 12).
+    """
+    path = str(tmp_path / 'PipePipe.db')
+    build_database(path, streams=STREAMS)
+    with database(path) as conn:
+        conn.execute("UPDATE streams SET title = ?, uploader = ?", (PLACEHOLDER_TITLE, PLACEHOLDER_UPLOADER))
+        conn.execute("INSERT INTO playlist_stream_join VALUES (1, 4, 100)")
+        conn.commit()
+    return path
+
+
+def uid_of(url):
+    return next(index + 1 for index in range(STREAMS) if video_url(index) == url)
+
+
+def test_watch_later_from_the_top_and_likes_from_the_newest(tmp_path):
+    with database(make_library(tmp_path)) as conn:
+        priorities = stream_priorities(conn)
+
+    # Watch Later in join order, Music (uids 1, 6 and 11) does not count
+    assert [priorities[uid] for uid in (1, 3, 5, 7, 9, 11)] == [(position, -1) for position in range(1, 7)]
+    # Likes newest first
+    assert [priorities[uid] for uid in (12, 10, 8, 6, 2)] == [(1, -1), (2, -1), (3, -1), (4, -1), (6, -1)]
+    # In both playlists: its best position, ahead of others at that position
+    assert priorities[4] == (5, -2)
+    assert sorted(priorities, key=lambda uid: (priorities[uid], uid)) == [1, 12, 3, 10, 5, 8, 6, 7, 4, 9, 2, 11]
+
+
+def test_lookups_run_in_priority_order(tmp_path):
+    path = make_library(tmp_path)
+    resolver = RecordingResolver()
+
+    result = update_streams(path, resolver, log=quiet)
+
+    assert result['updated'] == STREAMS
+    with database(path) as conn:
+        priorities = stream_priorities(conn)
+    order = [priorities[uid_of(url)] for url in resolver.order]
+    assert order == sorted(order)
+    assert uid_of(resolver.order[0]) in (1, 12)
+
+
+def test_time_budget_leaves_the_lowest_priorities_for_later(tmp_path):
+    path = make_library(tmp_path)
+    resolver = RecordingResolver(seconds=0.1)
+
+    result = update_streams(path, resolver, time_budget=0.35, log=quiet)
+
+    looked_up = [uid_of(url) for url in resolver.order]
+    assert 0 < result['looked_up'] < STREAMS
+    assert result['looked_up'] == len(looked_up) == result['updated']
+    assert result['skipped'] == STREAMS - result['looked_up']
+    with database(path) as conn:
+        priorities = stream_priorities(conn)
+        left = [uid for uid, in conn.execute("SELECT uid FROM streams WHERE title = ?", (PLACEHOLDER_TITLE,))]
+    assert len(left) == result['skipped']
+    # Everything looked up ranks ahead of everything left
+    assert max(priorities[uid] for uid in looked_up) <= min(priorities[uid] for uid in left)
@@ -0,0 +1,135 @@
+"""
+Metadata refresh: the freshness policy, the call budget, copying fresh
+cached metadata without lookups and videos that are gone for good.
+"""
+
+import sqlite3
+import time
+
+from conftest import InProcessResolver, build_database, video_url
+
+from pipepipe_cache import MetadataCache
+from pipepipe_db import canonical_video_id
+from pipepipe_refresh import merge_refreshed, refresh_streams, select_stale_streams
+from pipepipe_resolver import ERROR_REMOVED, ResolveError
+
+STREAMS = 20
+DAY = 86400
+
+
+def quiet(message):
+    pass
+
+
+def make_library(tmp_path):
+    """20 streams; the odd ones (10 videos) have real metadata and a view count."""
+    path = str(tmp_path / 'PipePipe.db')
+    build_database(path, streams=STREAMS)
+    return path
+
+
+def test_merge_keeps_known_values_over_empty_ones():
+    row = {'title': 'Old', 'uploader': 'Someone', 'duration': 60, 'view_count': 5, 'thumbnail_url': 'a'}
+    metadata = {'title': 'New', 'uploader': 'YouTube Creator', 'duration': 0, 'view_count': 9,
+                'thumbnail_url': None}
+
+    assert merge_refreshed(row, metadata) == dict(row, title='New', view_count=9)
+
+
+def test_policy_picks_old_and_most_watched(tmp_path, monkeypatch):
+    path = make_library(tmp_path)
+    monkeypatch.delenv('PIPEPIPE_CACHE_URL', raising=False)
+    cache = MetadataCache.in_directory(str(tmp_path / 'cache'))
+    now = time.time()
+    # Video 1 was fetched yesterday with the same values, video 3 a year ago
+    conn = sqlite3.connect(path)
+    row = conn.execute("SELECT title, uploader, duration, view_count, thumbnail_url FROM streams "
+                       "WHERE url = ?", (video_url(1),)).fetchone()
+    conn.close()
+    cache.put_many([(canonical_video_id(video_url(1)), dict(zip(
+        ('title', 'uploader', 'duration', 'view_count', 'thumbnail_url'), row)))], fetched_at=now - DAY)
+    cache.put_many([(canonical_video_id(video_url(3)), {'title': 'Cached'})], fetched_at=now - 365 * DAY)
+
+    conn = sqlite3.connect(path)
+    stale, fresh = select_stale_streams(conn, cache, max_age_days=30, now=now)
+    top, fresh_top = select_stale_streams(conn, cache, max_age_days=30, top_k=3, now=now)
+    conn.close()
+    cache.close()
+
+    # Fresh and unchanged: neither looked up nor copied
+    assert video_url(1) not in [url for uid, url, video_id, row in stale]
+    assert fresh == []
+    assert len(stale) == 9
+    # Without a watch history, the view count ranks the videos: most viewed first
+    assert [url for uid, url, video_id, row in stale][:2] == [video_url(19), video_url(17)]
+    assert [url for uid, url, video_id, row in top] == [video_url(19), video_url(17), video_url(15)]
+
+
+def test_call_budget_defers_the_rest(tmp_path, monkeypatch):
+    monkeypatch.delenv('PIPEPIPE_CACHE_URL', raising=False)
+    path = make_library(tmp_path)
+    cache = MetadataCache.in_directory(str(tmp_path / 'cache'))
+    resolver = InProcessResolver()
+
+    first = refresh_streams(path, resolver, cache, max_calls=4, log=quiet)
+    second = refresh_streams(path, resolver, cache, max_calls=100, log=quiet)
+    cache.close()
+
+    assert (first['stale'], first['refreshed'], first['deferred']) == (10, 4, 6)
+    # Refreshed videos are fresh now; only the deferred ones are looked up
+    assert (second['stale'], second['refreshed']) == (6, 6)
+    assert max(resolver.fetched.values()) == 1
+    conn = sqlite3.connect(path)
+    titles = [row[0] for row in conn.execute("SELECT title FROM streams WHERE uid % 2 = 0")]
+    conn.close()
+    assert all(title.startswith('Resolved') for title in titles)
+
+
+def test_fresh_cached_metadata_is_copied_without_lookups(tmp_path, monkeypatch):
+    monkeypatch.delenv('PIPEPIPE_CACHE_URL', raising=False)
+    path = make_library(tmp_path)
+    cache = MetadataCache.in_directory(str(tmp_path / 'cache'))
+    cache.put_many([(canonical_video_id(video_url(index)), {'title': f"Fresh {index}"})
+                    for index in range(1, STREAMS, 2)])
+    resolver = InProcessResolver()
+
+    result = refresh_streams(path, resolver, cache, log=quiet)
+    cache.close()
+
+    assert (result['stale'], result['from_cache']) == (0, 10)
+    assert not resolver.fetched
+    conn = sqlite3.connect(path)
+    assert conn.execute("SELECT title FROM streams WHERE uid = 2").fetchone()[0] == 'Fresh 1'
+    conn.close()
+
+
+def test_videos_gone_for_good_stop_using_the_budget(tmp_path, monkeypatch):
+    monkeypatch.delenv('PIPEPIPE_CACHE_URL', raising=False)
+    path = make_library(tmp_path)
+    cache = MetadataCache.in_directory(str(tmp_path / 'cache'))
+    # The most viewed video was removed
+    gone = video_url(19)
+
+    class RemovedResolver(InProcessResolver):
+        async def fetch_async(self, url, timeout=None):
+            if url == gone:
+                self.fetched[url] += 1
+                raise ResolveError(ERROR_REMOVED, 'Video unavailable')
+            return await super().fetch_async(url, timeout)
+
+    resolver = RemovedResolver()
+    first = refresh_streams(path, resolver, cache, max_calls=100, log=quiet)
+    second = refresh_streams(path, resolver, cache, max_calls=1, log=quiet)
+
+    assert (first['refreshed'], first['error_kinds']) == (9, {ERROR_REMOVED: 1})
+    # Recorded like a refresh: not looked up again while fresh
+    assert (second['stale'], second['resolver_calls']) == (0, 0)
+    assert resolver.fetched[gone] == 1
+
+    # Once everything is stale again, the removed video comes last
+    conn = sqlite3.connect(path)
+    stale, fresh = select_stale_streams(conn, cache, max_age_days=30, now=time.time() + 31 * DAY)
+    conn.close()
+    cache.close()
+    assert len(stale) == 10
+    assert [url for uid, url, video_id, row in stale][-1] == gone
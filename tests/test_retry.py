@@ -0,0 +1,171 @@
+"""
+Retry scheduler: backoff and give-up rules, ordering, adaptive timeouts,
+budgets and grouping, on a fake clock.
+"""
+
+import pytest
+
+from pipepipe_resolver import (
+    ERROR_NETWORK,
+    ERROR_PRIVATE,
+    ERROR_REMOVED,
+    ERROR_THROTTLED,
+    ERROR_UNKNOWN,
+    ResolveError,
+    classify_error,
+)
+from pipepipe_retry import AdaptiveTimeout, RetryScheduler, fetcher_for
+
+
+class FakeClock:
+    """A clock that only moves when slept on."""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def scheduler(clock, **kwargs):
+    return RetryScheduler(clock=clock, sleep=clock.sleep, rng=lambda: 0.5, **kwargs)
+
+
+@pytest.mark.parametrize('message, kind', [
+    ('ERROR: [youtube] abc: HTTP Error 429: Too Many Requests', ERROR_THROTTLED),
+    ("ERROR: Sign in to confirm you're not a bot", ERROR_THROTTLED),
+    ('ERROR: [youtube] abc: Video unavailable', ERROR_REMOVED),
+    ('ERROR: [youtube] abc: Private video', ERROR_PRIVATE),
+    ('ERROR: Unable to download webpage: The read operation timed out', ERROR_NETWORK),
+    ('ERROR: something else entirely', ERROR_UNKNOWN),
+])
+def test_classify_error(message, kind):
+    assert classify_error(message) == kind
+
+
+def test_transient_errors_are_retried_with_backoff():
+    clock = FakeClock()
+    failures = {'flaky': [ERROR_THROTTLED, ERROR_NETWORK]}
+    calls = []
+
+    def fetch(url, timeout):
+        calls.append(url)
+        if failures.get(url):
+            raise ResolveError(failures[url].pop(0))
+        return {'title': url}
+
+    retry = scheduler(clock, base_delay=2.0)
+    retry.add('a', 'flaky')
+    retry.add('b', 'steady')
+
+    outcomes = list(retry.run(fetch))
+
+    assert outcomes == [('b', 'steady', {'title': 'steady'}, None), ('a', 'flaky', {'title': 'flaky'}, None)]
+    # Retries come after fresh work; backoff doubles per attempt (jitter 0.5 -> factor 1.0)
+    assert calls == ['flaky', 'steady', 'flaky', 'flaky']
+    assert sum(clock.sleeps) == pytest.approx(2.0 + 4.0)
+    assert retry.retries == 2
+
+
+def test_permanent_errors_and_exhausted_retries_are_given_up():
+    clock = FakeClock()
+
+    def fetch(url, timeout):
+        raise ResolveError(ERROR_REMOVED if url == 'gone' else ERROR_THROTTLED)
+
+    retry = scheduler(clock, max_attempts=3)
+    retry.add('a', 'gone')
+    retry.add('b', 'throttled')
+
+    outcomes = sorted(retry.run(fetch))
+
+    assert outcomes == [('a', 'gone', None, ERROR_REMOVED), ('b', 'throttled', None, ERROR_THROTTLED)]
+    assert retry.attempts == 1 + 3
+
+
+def test_priority_orders_fresh_work():
+    retry = scheduler(FakeClock())
+    for key, priority in (('c', 3), ('a', 1), ('b', 2)):
+        retry.add(key, key, priority)
+
+    assert [key for key, url, metadata, error in retry.run(lambda url, timeout: {})] == ['a', 'b', 'c']
+
+
+def test_timeouts_follow_recent_lookups_and_double_after_a_timeout():
+    timeouts = AdaptiveTimeout(initial=30.0, minimum=5.0, maximum=60.0, factor=4.0)
+    assert timeouts.timeout() == 30.0
+    for duration in (1.0, 2.0, 3.0):
+        timeouts.record(duration)
+    assert timeouts.timeout() == 8.0
+    assert timeouts.timeout(1) == 16.0
+    assert timeouts.timeout(5) == 60.0
+    # Fast lookups bring the median down, but never below the minimum
+    timeouts.record(0.1)
+    timeouts.record(0.1)
+    assert timeouts.timeout() == 5.0
+
+
+def test_timed_out_attempt_gets_a_longer_timeout():
+    clock = FakeClock()
+    seen = []
+
+    def fetch(url, timeout):
+        seen.append(timeout)
+        if len(seen) == 1:
+            raise ResolveError(ERROR_NETWORK, 'timed out', timed_out=True)
+        return {}
+
+    retry = scheduler(clock, timeouts=AdaptiveTimeout(initial=10.0))
+    retry.add('a', 'url')
+    list(retry.run(fetch))
+
+    assert seen == [10.0, 20.0]
+
+
+def test_deadline_and_attempt_budget_skip_the_rest():
+    clock = FakeClock()
+
+    def slow_fetch(url, timeout):
+        clock.now += 10
+        return {}
+
+    retry = scheduler(clock, deadline=25)
+    for index in range(5):
+        retry.add(index, f"url{index}")
+    assert len(list(retry.run(slow_fetch))) == 3
+    assert retry.skipped == 2
+
+    retry = scheduler(FakeClock(), max_total_attempts=2)
+    for index in range(5):
+        retry.add(index, f"url{index}")
+    assert len(list(retry.run(lambda url, timeout: {}))) == 2
+    assert retry.skipped == 3
+
+
+def test_take_only_from_accepted_groups():
+    retry = scheduler(FakeClock())
+    retry.add('a', 'https://soundcloud.com/x', 0)
+    retry.add('b', 'https://youtube.com/y', 1)
+    retry.add('c', 'relative', 2, service_id=1)
+    retry.group_by(lambda url, service_id: 'soundcloud' if 'soundcloud' in url or service_id == 1 else 'youtube')
+
+    assert retry.take(lambda group: group == 'youtube')['key'] == 'b'
+    assert retry.take(lambda group: group == 'youtube') is None
+    assert [retry.take()['key'], retry.take()['key']] == ['a', 'c']
+
+
+def test_resolvers_with_only_resolve_fail_as_unknown():
+    class Legacy:
+        def resolve(self, url):
+            return None if url == 'missing' else {'title': url}
+
+    fetch = fetcher_for(Legacy())
+    assert fetch('found', 5) == {'title': 'found'}
+    with pytest.raises(ResolveError) as raised:
+        fetch('missing', 5)
+    assert raised.value.kind == ERROR_UNKNOWN
@@ -0,0 +1,87 @@
+"""
+Service lanes: picking a stream's lane and pausing a failing service.
+"""
+
+import sqlite3
+
+from conftest import InProcessResolver, build_database, video_url
+
+from pipepipe_async import run_async
+from pipepipe_resolver import ERROR_THROTTLED, ResolveError
+from pipepipe_retry import RetryScheduler
+from pipepipe_routing import CircuitBreaker, ServiceRouter, service_for
+from pipepipe_update import update_streams
+
+STREAMS = 40
+
+
+def quiet(message):
+    pass
+
+
+def test_service_for_falls_back_to_the_service_id():
+    assert service_for('https://www.youtube.com/watch?v=dQw4w9WgXcQ', 1) == 'youtube'
+    assert service_for('https://framatube.org/w/abc', 0) == 'framatube.org'
+    assert service_for('track/123', 1) == 'soundcloud'
+    assert service_for('track/123') == 'unknown'
+
+
+def test_update_routes_streams_without_a_host_by_service_id(tmp_path):
+    db_path = str(tmp_path / 'PipePipe.db')
+    placeholders = build_database(db_path, streams=STREAMS)
+    conn = sqlite3.connect(db_path)
+    conn.execute("UPDATE streams SET service_id = 1, url = 'track/123' WHERE uid = 1")
+    conn.commit()
+    conn.close()
+    router = ServiceRouter(InProcessResolver())
+
+    result = update_streams(db_path, router, delay=0, log=quiet)
+
+    assert result['updated'] == placeholders
+    stats = router.lane_stats()
+    assert stats['soundcloud']['calls'] == 1
+    assert stats['youtube']['calls'] == placeholders - 1
+    assert 'unknown' not in stats
+
+
+def test_breaker_opens_after_repeated_failures_and_probes_after_cooldown():
+    now = [0.0]
+    breaker = CircuitBreaker(threshold=3, cooldown=10, clock=lambda: now[0])
+    for attempt in range(3):
+        assert breaker.allow()
+        breaker.started()
+        breaker.record(ERROR_THROTTLED)
+    assert not breaker.allow()
+    assert breaker.trips == 1
+
+    now[0] = 11
+    assert breaker.allow()
+    breaker.started()
+    # Only one probe at a time
+    assert not breaker.allow()
+    breaker.record(None)
+    assert breaker.allow()
+
+
+def test_throttled_service_only_pauses_its_own_lane():
+    class ThrottledSoundCloud(InProcessResolver):
+        async def fetch_async(self, url, timeout=None):
+            if 'soundcloud' in url:
+                self.fetched[url] += 1
+                raise ResolveError(ERROR_THROTTLED, 'HTTP Error 429')
+            return await super().fetch_async(url, timeout)
+
+    resolver = ThrottledSoundCloud()
+    router = ServiceRouter(resolver, breaker_threshold=3, breaker_cooldown=600)
+    scheduler = RetryScheduler(base_delay=0.01, max_delay=0.05)
+    for index in range(10):
+        scheduler.add(index, f"https://soundcloud.com/artist/{index}", service_id=1)
+        scheduler.add(100 + index, video_url(index), service_id=0)
+
+    outcomes = {key: error_kind for key, url, metadata, error_kind in run_async(scheduler, router)}
+
+    # Every YouTube video is resolved; SoundCloud stops being called once its lane is paused
+    assert sorted(key for key, error_kind in outcomes.items() if error_kind is None) == list(range(100, 110))
+    assert sorted(key for key, error_kind in outcomes.items() if error_kind == ERROR_THROTTLED) == list(range(10))
+    assert router.lane_stats()['soundcloud']['trips'] == 1
+    assert sum(resolver.fetched[f"https://soundcloud.com/artist/{index}"] for index in range(10)) < 10 * 4
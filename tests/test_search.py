@@ -0,0 +1,96 @@
+"""
+Search index: matching and ranking, and incremental syncs after the
+library changes.
+"""
+
+import os
+import sqlite3
+
+import pytest
+
+from conftest import build_database, write_zip
+
+from pipepipe_search import SEARCH_INDEX_NAME, SearchIndex, match_expression, search_backup
+from pipepipe_workspace import WorkspaceManager
+
+STREAMS = 50
+
+
+@pytest.fixture
+def library(tmp_path):
+    path = str(tmp_path / 'PipePipe.db')
+    build_database(path, streams=STREAMS)
+    conn = sqlite3.connect(path)
+    conn.execute("UPDATE streams SET title = 'Never Gonna Give You Up', uploader = 'Rick Astley' WHERE uid = 2")
+    conn.execute("UPDATE streams SET title = 'Café tour', uploader = 'Gonna Travel' WHERE uid = 4")
+    conn.commit()
+    conn.close()
+    return path
+
+
+def test_match_expression_quotes_words_and_prefixes_the_last():
+    assert match_expression('never gon') == '"never" "gon"*'
+    assert match_expression('a OR b') == '"a" "OR" "b"*'
+    assert match_expression('  -- ') is None
+
+
+def test_title_matches_rank_first(library):
+    index = SearchIndex(library)
+    index.sync()
+    matches = index.search('gonna')
+    index.close()
+
+    assert [match['uid'] for match in matches] == [2, 4]
+    assert matches[0]['score'] > matches[1]['score']
+
+
+def test_search_ignores_case_and_diacritics(library):
+    index = SearchIndex(library)
+    index.sync()
+    assert [match['uid'] for match in index.search('CAFE')] == [4]
+    assert [match['uid'] for match in index.search('astl')] == [2]
+    index.close()
+
+
+def test_sync_only_indexes_changes(library):
+    index = SearchIndex(library)
+    assert index.sync()['indexed'] == STREAMS
+    # The database file is unchanged: nothing is read
+    report = index.sync()
+    assert (report['indexed'], report['removed']) == (0, 0)
+
+    conn = sqlite3.connect(library)
+    conn.execute("UPDATE streams SET title = 'Brand new title' WHERE uid = 2")
+    conn.execute("DELETE FROM streams WHERE uid = 4")
+    conn.commit()
+    conn.close()
+    report = index.sync(force=True)
+
+    assert (report['indexed'], report['removed']) == (1, 1)
+    assert index.search('gonna') == []
+    assert [match['uid'] for match in index.search('brand new')] == [2]
+    index.close()
+
+
+def test_search_backup_builds_the_index_in_the_work_folder(tmp_path, library):
+    backup_path = str(tmp_path / 'backup.zip')
+    write_zip(backup_path, library)
+    workspaces = WorkspaceManager(str(tmp_path / 'workspaces'))
+
+    matches = search_backup(backup_path, 'rick', workspaces=workspaces)
+
+    assert [match['title'] for match in matches] == ['Never Gonna Give You Up']
+    [(last_used, size, working_dir)] = workspaces.workspaces()
+    assert os.path.exists(os.path.join(working_dir, SEARCH_INDEX_NAME))
+
+
+def test_index_works_in_folders_with_uri_characters(tmp_path):
+    folder = tmp_path / 'my #1 videos 100%'
+    folder.mkdir()
+    path = str(folder / 'PipePipe.db')
+    build_database(path, streams=STREAMS)
+
+    index = SearchIndex(path)
+    assert index.sync()['indexed'] == STREAMS
+    index.close()
+    assert sorted(os.listdir(folder)) == sorted(['PipePipe.db', os.path.basename(index.path)])
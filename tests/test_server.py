@@ -0,0 +1,278 @@
+"""
+Job server: routes, upload errors, access checks, cancellation and how its
+files live alongside the work folders.
+"""
+
+import http.client
+import json
+import os
+import threading
+import time
+
+import pytest
+
+from conftest import InProcessResolver, build_database, write_zip
+
+from pipepipe_daemon import BackupProcessor
+from pipepipe_server import CANCELLED, DONE, JobServer, serve
+from pipepipe_workspace import WorkspaceManager
+
+
+def quiet(message):
+    pass
+
+
+def make_backup(tmp_path, name, streams=40):
+    db_path = str(tmp_path / f"{name}.db")
+    build_database(db_path, streams=streams)
+    backup_path = str(tmp_path / f"{name}.zip")
+    write_zip(backup_path, db_path)
+    os.remove(db_path)
+    return backup_path
+
+
+def wait_for(job, states=(DONE,), timeout=30):
+    deadline = time.monotonic() + timeout
+    while job.state not in states:
+        assert time.monotonic() < deadline, f"job stuck in {job.state}"
+        time.sleep(0.02)
+
+
+@pytest.fixture
+def job_server(tmp_path):
+    workspaces = WorkspaceManager(str(tmp_path / 'workspaces'))
+    processor = BackupProcessor(resolver=InProcessResolver(), workspaces=workspaces)
+    jobs = JobServer(processor=processor, allowed_dirs=[str(tmp_path)], log=quiet)
+    httpd = serve(jobs, port=0)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield jobs, httpd.server_address[1]
+    httpd.shutdown()
+    httpd.server_close()
+    jobs.close(cancel=True)
+
+
+def request(port, method, path, body=None, headers=None):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    conn.request(method, path, body, headers or {})
+    response = conn.getresponse()
+    data = response.read()
+    conn.close()
+    if response.getheader('Content-Type') == 'application/json':
+        data = json.loads(data)
+    return response.status, data
+
+
+def test_default_output_folder_is_outside_the_work_folders(job_server):
+    jobs, port = job_server
+    root = os.path.abspath(jobs.processor.workspaces.root)
+    assert not os.path.abspath(jobs.output_dir).startswith(root + os.sep)
+
+
+def test_eviction_keeps_other_folders_in_the_work_folder_root(tmp_path):
+    root = tmp_path / 'workspaces'
+    (root / 'server' / 'uploads').mkdir(parents=True)
+    (root / 'server' / 'uploads' / 'queued.zip').write_bytes(b'x' * 1000)
+    workspaces = WorkspaceManager(str(root), max_bytes=1)
+
+    first, reused = workspaces.acquire(make_backup(tmp_path, 'first'))
+    workspaces.release(first)
+    second, reused = workspaces.acquire(make_backup(tmp_path, 'second', streams=60))
+
+    assert not os.path.exists(first)
+    assert os.path.exists(second)
+    assert (root / 'server' / 'uploads' / 'queued.zip').exists()
+
+
+def test_server_results_survive_eviction(tmp_path):
+    workspaces = WorkspaceManager(str(tmp_path / 'workspaces'), max_bytes=1)
+    processor = BackupProcessor(resolver=InProcessResolver(), workspaces=workspaces)
+    jobs = JobServer(output_dir=os.path.join(workspaces.root, 'server'), processor=processor, log=quiet)
+    try:
+        job = jobs.submit(make_backup(tmp_path, 'first'))
+        wait_for(job)
+        # Another backup pushes the work folders over the cap
+        workspaces.acquire(make_backup(tmp_path, 'second', streams=60))
+        assert os.path.exists(job.output_path)
+    finally:
+        jobs.close()
+
+
+def test_upload_status_result_and_delete(job_server, tmp_path):
+    jobs, port = job_server
+    with open(make_backup(tmp_path, 'upload'), 'rb') as backup:
+        status, body = request(port, 'POST', '/jobs', backup.read(), {'Content-Type': 'application/zip'})
+    assert status == 202
+    job = jobs.jobs[body['id']]
+    wait_for(job)
+
+    status, body = request(port, 'GET', f"/jobs/{job.id}")
+    assert status == 200
+    assert body['state'] == DONE
+    assert body['result']['updated'] == 20
+
+    status, data = request(port, 'GET', f"/jobs/{job.id}/result")
+    assert status == 200
+    assert data[:2] == b'PK'
+
+    # The upload goes as soon as the job is done, the result when the job is deleted
+    assert not os.listdir(jobs.upload_dir)
+    status, body = request(port, 'DELETE', f"/jobs/{job.id}")
+    assert status == 200
+    assert not os.path.exists(job.output_path)
+    assert request(port, 'GET', f"/jobs/{job.id}")[0] == 404
+
+
+def test_submit_by_path_and_metrics(job_server, tmp_path):
+    jobs, port = job_server
+    backup_path = make_backup(tmp_path, 'by_path')
+    status, body = request(port, 'POST', '/jobs', json.dumps({'path': backup_path}),
+                           {'Content-Type': 'application/json'})
+    assert status == 202
+    wait_for(jobs.jobs[body['id']])
+
+    status, metrics = request(port, 'GET', '/metrics')
+    assert status == 200
+    assert metrics['completed'] == 1
+    assert metrics['videos_updated'] == 20
+    assert metrics['lookups_done_running'] == 0
+
+
+@pytest.mark.parametrize('length', ['abc', '-5'])
+def test_malformed_content_length_is_rejected(job_server, length):
+    jobs, port = job_server
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+    conn.putrequest('POST', '/jobs')
+    conn.putheader('Content-Type', 'application/zip')
+    conn.putheader('Content-Length', length)
+    conn.endheaders()
+    response = conn.getresponse()
+    assert response.status == 400
+    assert 'error' in json.loads(response.read())
+    conn.close()
+
+
+def test_truncated_upload_gets_a_json_error(job_server):
+    jobs, port = job_server
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+    conn.putrequest('POST', '/jobs')
+    conn.putheader('Content-Type', 'application/zip')
+    conn.putheader('Content-Length', '1000')
+    conn.endheaders()
+    conn.send(b'PK' * 10)
+    conn.sock.shutdown(1)
+    response = conn.getresponse()
+    assert response.status == 400
+    assert 'error' in json.loads(response.read())
+    conn.close()
+    assert not os.listdir(jobs.upload_dir)
+
+
+def test_unknown_routes(job_server):
+    jobs, port = job_server
+    assert request(port, 'GET', '/nope')[0] == 404
+    assert request(port, 'GET', '/jobs/missing')[0] == 404
+    assert request(port, 'DELETE', '/jobs/missing')[0] == 404
+
+
+def test_cancelled_queued_job_counts_as_cancelled(tmp_path):
+    started = threading.Event()
+    release = threading.Event()
+
+    class BlockingProcessor(BackupProcessor):
+        def process(self, *args, **kwargs):
+            started.set()
+            release.wait(30)
+            return super().process(*args, **kwargs)
+
+    workspaces = WorkspaceManager(str(tmp_path / 'workspaces'))
+    processor = BlockingProcessor(resolver=InProcessResolver(), workspaces=workspaces)
+    jobs = JobServer(output_dir=str(tmp_path / 'out'), processor=processor, workers=1, log=quiet)
+    try:
+        running = jobs.submit(make_backup(tmp_path, 'running'))
+        started.wait(30)
+        queued = jobs.submit(make_backup(tmp_path, 'queued'))
+        jobs.cancel(queued.id)
+        release.set()
+        wait_for(running)
+        wait_for(queued, states=(CANCELLED,))
+        deadline = time.monotonic() + 10
+        while jobs.scheduler.pending() and time.monotonic() < deadline:
+            time.sleep(0.02)
+        metrics = jobs.metrics()
+        assert metrics['completed'] == 1
+        assert metrics['cancelled'] == 1
+    finally:
+        jobs.close()
+
+
+def test_cancelling_a_queued_job_frees_its_slot(tmp_path):
+    started = threading.Event()
+    release = threading.Event()
+
+    class BlockingProcessor(BackupProcessor):
+        def process(self, *args, **kwargs):
+            started.set()
+            release.wait(30)
+            return super().process(*args, **kwargs)
+
+    workspaces = WorkspaceManager(str(tmp_path / 'workspaces'))
+    processor = BlockingProcessor(resolver=InProcessResolver(), workspaces=workspaces)
+    jobs = JobServer(output_dir=str(tmp_path / 'out'), processor=processor, workers=1, max_queued=1,
+                     log=quiet)
+    try:
+        running = jobs.submit(make_backup(tmp_path, 'running'))
+        started.wait(30)
+        upload = os.path.join(jobs.upload_dir, 'queued.zip')
+        os.replace(make_backup(tmp_path, 'queued'), upload)
+        queued = jobs.submit(upload, uploaded=True)
+        assert jobs.scheduler.full()
+
+        jobs.cancel(queued.id)
+        assert queued.state == CANCELLED
+        assert not os.path.exists(upload)
+        assert jobs.submit(make_backup(tmp_path, 'next')) is not None
+        assert jobs.metrics()['cancelled'] == 1
+    finally:
+        release.set()
+        jobs.close()
+
+
+def test_path_submissions_are_limited_to_the_allowed_folders(job_server, tmp_path):
+    jobs, port = job_server
+    outside = tmp_path.parent / f"{tmp_path.name}_outside"
+    outside.mkdir()
+    backup_path = make_backup(outside, 'elsewhere')
+    for path in (backup_path, str(tmp_path / '..' / outside.name / 'elsewhere.zip')):
+        status, body = request(port, 'POST', '/jobs', json.dumps({'path': path}),
+                               {'Content-Type': 'application/json'})
+        assert status == 403
+    assert not jobs.jobs
+
+
+@pytest.mark.parametrize('headers', [
+    {'Host': 'attacker.example:8765'},
+    {'Origin': 'http://attacker.example'},
+    {'Origin': 'null'},
+])
+def test_requests_not_addressed_to_the_local_host_are_refused(job_server, headers):
+    jobs, port = job_server
+    assert request(port, 'GET', '/jobs', headers=headers)[0] == 403
+    assert request(port, 'GET', '/jobs', headers={'Host': f"localhost:{port}"})[0] == 200
+
+
+def test_token_is_required_when_set(tmp_path):
+    workspaces = WorkspaceManager(str(tmp_path / 'workspaces'))
+    processor = BackupProcessor(resolver=InProcessResolver(), workspaces=workspaces)
+    jobs = JobServer(output_dir=str(tmp_path / 'out'), processor=processor, log=quiet)
+    httpd = serve(jobs, port=0, token='secret')
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    port = httpd.server_address[1]
+    try:
+        assert request(port, 'GET', '/metrics')[0] == 403
+        assert request(port, 'GET', '/metrics', headers={'X-Job-Token': 'wrong'})[0] == 403
+        assert request(port, 'GET', '/metrics', headers={'X-Job-Token': 'secret'})[0] == 200
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+        jobs.close()
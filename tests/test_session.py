@@ -0,0 +1,159 @@
+"""
+In-process lookups: where their threads come from, how their timeout is
+enforced, and that sessions are kept.
+"""
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+pytest.importorskip('yt_dlp')
+
+from pipepipe_resolver import ERROR_NETWORK, ResolveError
+from pipepipe_routing import ServiceRouter
+from pipepipe_session import SessionResolver
+
+YOUTUBE = 'https://www.youtube.com/watch?v=dQw4w9WgXcQ'
+SOUNDCLOUD = 'https://soundcloud.com/artist/track'
+
+
+class FakeYoutubeDL:
+    """Stands in for yt_dlp.YoutubeDL; answers from a function of (options, url)."""
+
+    opened = []
+    answer = None
+
+    def __init__(self, options):
+        self.options = options
+        self.closed = False
+        self.thread = threading.get_ident()
+        FakeYoutubeDL.opened.append(self)
+
+    def extract_info(self, url, download=True, process=True):
+        return FakeYoutubeDL.answer(self.options, url)
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def fake_yt_dlp(monkeypatch):
+    import yt_dlp
+
+    FakeYoutubeDL.opened = []
+    FakeYoutubeDL.answer = lambda options, url: {'title': 'A title', 'uploader': 'Someone', 'duration': 60}
+    monkeypatch.setattr(yt_dlp, 'YoutubeDL', FakeYoutubeDL)
+    return FakeYoutubeDL
+
+
+def test_thread_keeps_one_session_whatever_the_timeout(fake_yt_dlp):
+    resolver = SessionResolver(timeout=30)
+
+    async def lookups():
+        # The retry scheduler's adaptive and doubled timeouts
+        for timeout in (30, 7.2, 14.4, 60):
+            await resolver.fetch_async(YOUTUBE, timeout)
+
+    try:
+        resolver.fetch(YOUTUBE)
+        asyncio.run(lookups())
+        # One session per thread: the calling thread and the workers the pool started
+        assert len({session.thread for session in fake_yt_dlp.opened}) == len(fake_yt_dlp.opened) < 5
+        assert all(session.options['socket_timeout'] == 30 for session in fake_yt_dlp.opened)
+        assert not any(session.closed for session in fake_yt_dlp.opened)
+    finally:
+        resolver.close()
+
+
+def test_attempt_timeout_is_enforced_outside_the_session(fake_yt_dlp):
+    release = threading.Event()
+
+    def answer(options, url):
+        release.wait(10)
+        return {'title': 'Late', 'uploader': 'Someone'}
+
+    fake_yt_dlp.answer = answer
+    resolver = SessionResolver(timeout=30)
+    try:
+        started = time.monotonic()
+        with pytest.raises(ResolveError) as raised:
+            asyncio.run(resolver.fetch_async(YOUTUBE, 0.2))
+        assert time.monotonic() - started < 5
+    finally:
+        release.set()
+        resolver.close()
+    assert raised.value.kind == ERROR_NETWORK
+    assert raised.value.timed_out
+    assert [session.options['socket_timeout'] for session in fake_yt_dlp.opened] == [30]
+
+
+def test_socket_timeout_fails_as_timed_out_network_error(fake_yt_dlp):
+    import yt_dlp
+
+    def answer(options, url):
+        raise yt_dlp.utils.DownloadError('ERROR: Unable to download webpage: The read operation timed out')
+
+    fake_yt_dlp.answer = answer
+    resolver = SessionResolver()
+    try:
+        with pytest.raises(ResolveError) as raised:
+            resolver.fetch(YOUTUBE, 5)
+    finally:
+        resolver.close()
+    assert raised.value.kind == ERROR_NETWORK
+    assert raised.value.timed_out
+
+
+def test_waiting_for_a_worker_does_not_count_against_the_timeout(fake_yt_dlp):
+    def answer(options, url):
+        time.sleep(0.3)
+        return {'title': url[-1], 'uploader': 'Someone'}
+
+    fake_yt_dlp.answer = answer
+    resolver = SessionResolver(max_workers=1)
+
+    async def lookups():
+        # The second lookup waits 0.3 s for the only worker and runs 0.3 s,
+        # longer than its timeout in all
+        return await asyncio.gather(resolver.fetch_async(YOUTUBE + '1', 0.5),
+                                    resolver.fetch_async(YOUTUBE + '2', 0.5))
+
+    try:
+        results = asyncio.run(lookups())
+    finally:
+        resolver.close()
+    assert [metadata['title'] for metadata in results] == ['1', '2']
+
+
+def test_stalled_service_does_not_hold_up_other_lanes(fake_yt_dlp):
+    release = threading.Event()
+
+    def answer(options, url):
+        if 'soundcloud' in url:
+            release.wait(10)
+        return {'title': 'A title', 'uploader': 'Someone'}
+
+    fake_yt_dlp.answer = answer
+    resolver = SessionResolver(max_workers=2)
+    router = ServiceRouter(resolver, lanes={'soundcloud': (8, 0.0), 'youtube': (2, 0.0)})
+
+    async def lookups():
+        # More stalled SoundCloud lookups than the resolver has workers
+        stalled = [asyncio.ensure_future(router.fetch_async(f"{SOUNDCLOUD}{index}")) for index in range(8)]
+        await asyncio.sleep(0.1)
+        try:
+            metadata = await asyncio.wait_for(router.fetch_async(YOUTUBE), 5)
+            # Every lookup ran on its lane's pool, none on the resolver's own
+            assert resolver.executor is None
+            return metadata
+        finally:
+            release.set()
+            await asyncio.gather(*stalled)
+
+    try:
+        metadata = asyncio.run(lookups())
+    finally:
+        router.close()
+    assert metadata['title'] == 'A title'
@@ -0,0 +1,104 @@
+"""
+Library statistics: the counts of the report on a small library with one
+of each problem, and the stored lookup throughput.
+"""
+
+import os
+import sqlite3
+import tempfile
+
+import pytest
+
+from conftest import build_database, video_url, write_zip
+
+from pipepipe_db import PLACEHOLDER_TITLE, PLACEHOLDER_UPLOADER, canonical_video_id
+from pipepipe_stats import backup_stats, library_stats, load_throughput, record_throughput
+
+STREAMS = 20
+
+
+@pytest.fixture
+def library(tmp_path):
+    """
+    20 streams (10 placeholders, all in the first local playlist), plus an
+    orphan placeholder, a youtu.be copy of stream 4 in Music and a Music
+    entry pointing at a missing stream row.
+    """
+    path = str(tmp_path / 'PipePipe.db')
+    build_database(path, streams=STREAMS)
+    conn = sqlite3.connect(path)
+    conn.execute("""
+    INSERT INTO streams (uid, service_id, url, title, stream_type, duration, uploader)
+    VALUES (21, 0, ?, ?, 'VIDEO_STREAM', 0, ?), (22, 0, ?, 'Copy', 'VIDEO_STREAM', 0, 'Someone')
+    """, (video_url(100), PLACEHOLDER_TITLE, PLACEHOLDER_UPLOADER, 'https://youtu.be/' + video_url(3)[-11:]))
+    conn.execute("INSERT INTO playlist_stream_join VALUES (3, 22, 100), (3, 999, 101)")
+    conn.commit()
+    conn.close()
+    return path
+
+
+def test_stream_counts(library):
+    streams = library_stats(library)['streams']
+
+    assert streams == {
+        'total': 22,
+        'unique_videos': 21,
+        'placeholders': 11,
+        'needs_update': 10,
+        'orphans': 1,
+        'orphan_placeholders': 1,
+        'duplicate_videos': 1,
+        'duplicate_rows': 1,
+        'duplicate_examples': [{'video_id': canonical_video_id(video_url(3)), 'uids': [4, 22]}],
+    }
+
+
+def test_playlist_counts(library):
+    report = library_stats(library)
+
+    counts = [(p['uid'], p['entries'], p['unique_streams'], p['placeholders'], p['missing_streams'])
+              for p in report['playlists']]
+    # Largest playlist first
+    assert counts == [(1, 10, 10, 10, 0), (2, 10, 10, 0, 0), (3, 6, 6, 2, 1)]
+    assert report['playlist_entries'] == 26
+
+
+def test_update_estimate_uses_the_throughput(library):
+    assert library_stats(library, throughput=2.0)['update_estimate'] == {
+        'videos': 10, 'lookups_per_second': 2.0, 'measured': True, 'seconds': 5.0}
+    assert library_stats(library)['update_estimate']['measured'] is False
+
+
+def test_backup_report_matches_the_database_report(tmp_path, library):
+    backup_path = str(tmp_path / 'backup.zip')
+    write_zip(backup_path, library)
+
+    assert backup_stats(backup_path, 2.0) == library_stats(library, 2.0)
+
+
+def test_backup_extraction_is_removed_when_the_report_fails(tmp_path, library, monkeypatch):
+    backup_path = str(tmp_path / 'backup.zip')
+    write_zip(backup_path, library)
+    temp_dir = tmp_path / 'tmp'
+    temp_dir.mkdir()
+    monkeypatch.setattr(tempfile, 'tempdir', str(temp_dir))
+
+    def broken(db_path, throughput=None):
+        assert os.path.dirname(db_path) != str(tmp_path)
+        raise sqlite3.DatabaseError("file is not a database")
+
+    monkeypatch.setattr('pipepipe_stats.library_stats', broken)
+    with pytest.raises(sqlite3.DatabaseError):
+        backup_stats(backup_path)
+    assert not os.listdir(temp_dir)
+
+
+def test_throughput_is_smoothed_over_runs(tmp_path):
+    directory = str(tmp_path / 'workspaces')
+    assert load_throughput(directory) is None
+    # Runs without lookups are not measurements
+    assert record_throughput({'looked_up': 0, 'lookup_seconds': 0.0}, directory) is None
+
+    assert record_throughput({'looked_up': 10, 'lookup_seconds': 5.0}, directory) == 2.0
+    assert record_throughput({'looked_up': 40, 'lookup_seconds': 5.0}, directory) == 5.0
+    assert load_throughput(directory) == 5.0
@@ -0,0 +1,123 @@
+"""
+Backup validation: each check on a good backup and on one broken in the
+way it is meant to catch.
+"""
+
+import os
+import sqlite3
+import zipfile
+
+import pytest
+
+from conftest import SETTINGS, build_database, write_zip
+
+from pipepipe_validate import validate_backup
+
+STREAMS = 20
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / 'PipePipe.db')
+    build_database(path, streams=STREAMS)
+    sqlite3.connect(path).execute("PRAGMA user_version = 7").connection.close()
+    return path
+
+
+def write_backup(path, members):
+    """Write a zip of (name, data) members without compression."""
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_STORED) as zip_ref:
+        for name, data in members:
+            zip_ref.writestr(name, data)
+    return path
+
+
+def read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def test_good_backup(tmp_path, db_path):
+    backup_path = str(tmp_path / 'backup.zip')
+    write_zip(backup_path, db_path)
+
+    report = validate_backup(backup_path)
+
+    assert report['ok'], report['problems']
+    assert report['version'] == 7
+    # Checking the working copy instead of extracting it again
+    assert validate_backup(backup_path, db_path=db_path, check_crc=False)['ok']
+
+
+def test_not_a_zip(tmp_path):
+    path = tmp_path / 'backup.zip'
+    path.write_bytes(b'not a zip at all')
+
+    report = validate_backup(str(path))
+
+    assert not report['ok']
+    assert report['problems'][0].startswith('Not a readable zip archive')
+
+
+def test_missing_member(tmp_path, db_path):
+    backup_path = write_backup(str(tmp_path / 'backup.zip'), [('PipePipe.db', read(db_path))])
+
+    assert validate_backup(backup_path)['problems'] == ['PipePipe.settings not found in backup']
+
+
+def test_crc_mismatch(tmp_path, db_path):
+    backup_path = write_backup(str(tmp_path / 'backup.zip'),
+                               [('PipePipe.settings', SETTINGS), ('PipePipe.db', read(db_path))])
+    with zipfile.ZipFile(backup_path) as zip_ref:
+        info = zip_ref.getinfo('PipePipe.db')
+    # Flip a byte inside the stored database, past its local file header
+    offset = info.header_offset + 30 + len(info.filename) + len(info.extra) + info.file_size - 10
+    with open(backup_path, 'r+b') as f:
+        f.seek(offset)
+        byte = f.read(1)
+        f.seek(offset)
+        f.write(bytes([byte[0] ^ 0xff]))
+
+    report = validate_backup(backup_path)
+
+    assert not report['ok']
+    assert any(problem.startswith('PipePipe.db:') and 'CRC' in problem for problem in report['problems'])
+
+
+@pytest.mark.parametrize('settings, problem', [
+    (b'', 'PipePipe.settings is empty'),
+    (b'\x00garbage', 'PipePipe.settings is not a settings file'),
+    (b'{"theme": "dark"}', None),
+])
+def test_settings(tmp_path, db_path, settings, problem):
+    backup_path = write_backup(str(tmp_path / 'backup.zip'),
+                               [('PipePipe.db', read(db_path)), ('PipePipe.settings', settings)])
+
+    assert validate_backup(backup_path)['problems'] == ([problem] if problem else [])
+
+
+def test_database_without_required_columns(tmp_path):
+    path = str(tmp_path / 'old.db')
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+    CREATE TABLE streams (uid INTEGER PRIMARY KEY, service_id INTEGER, url TEXT, title TEXT, uploader TEXT);
+    CREATE TABLE playlists (uid INTEGER PRIMARY KEY, name TEXT);
+    """)
+    conn.close()
+    backup_path = str(tmp_path / 'backup.zip')
+    write_zip(backup_path, path)
+
+    problems = validate_backup(backup_path)['problems']
+
+    assert problems[0].startswith('PipePipe.db table streams lacks columns: uploader_url, duration')
+    assert problems[1] == 'PipePipe.db has no playlist_stream_join table'
+
+
+def test_database_that_is_not_a_database(tmp_path):
+    backup_path = write_backup(str(tmp_path / 'backup.zip'),
+                               [('PipePipe.db', os.urandom(8192)), ('PipePipe.settings', SETTINGS)])
+
+    report = validate_backup(backup_path)
+
+    assert not report['ok']
+    assert report['problems'][0].startswith('PipePipe.db is not a valid database')
@@ -0,0 +1,144 @@
+"""
+Work folders: reuse by backup content, incomplete backups, eviction order,
+leases and in-memory processing.
+"""
+
+import os
+import shutil
+import sqlite3
+import time
+import zipfile
+
+import pytest
+
+from conftest import build_database, write_zip
+
+from pipepipe_workspace import (
+    COMPLETE_MARKER,
+    LEASE_MAX_AGE,
+    LEASE_PREFIX,
+    PARTIAL_PREFIX,
+    WorkspaceManager,
+    backup_key,
+    directory_size,
+    is_in_memory,
+    open_database,
+    save_database,
+)
+
+
+def make_backup(tmp_path, name, streams=20):
+    db_path = str(tmp_path / f"{name}.db")
+    build_database(db_path, streams=streams)
+    backup_path = str(tmp_path / f"{name}.zip")
+    write_zip(backup_path, db_path)
+    os.remove(db_path)
+    return backup_path
+
+
+def test_same_content_reuses_the_work_folder(tmp_path):
+    workspaces = WorkspaceManager(str(tmp_path / 'workspaces'))
+    backup_path = make_backup(tmp_path, 'backup')
+    copy_path = str(tmp_path / 'renamed copy.zip')
+    shutil.copy(backup_path, copy_path)
+
+    first, reused = workspaces.acquire(backup_path)
+    assert not reused
+    assert workspaces.acquire(copy_path) == (first, True)
+    assert backup_key(copy_path) == os.path.basename(first)
+
+    # A different backup gets its own folder
+    other, reused = workspaces.acquire(make_backup(tmp_path, 'other', streams=30))
+    assert other != first and not reused
+
+
+def test_incomplete_backup_leaves_nothing_behind(tmp_path):
+    workspaces = WorkspaceManager(str(tmp_path / 'workspaces'))
+    backup_path = str(tmp_path / 'broken.zip')
+    with zipfile.ZipFile(backup_path, 'w') as zip_ref:
+        zip_ref.writestr('PipePipe.db', b'')
+
+    with pytest.raises(FileNotFoundError):
+        workspaces.acquire(backup_path)
+    assert not [name for name in os.listdir(workspaces.root) if name.startswith(PARTIAL_PREFIX)]
+    assert workspaces.workspaces() == []
+
+
+def test_least_recently_used_is_evicted_first(tmp_path):
+    workspaces = WorkspaceManager(str(tmp_path / 'workspaces'), max_bytes=10 ** 9)
+    first, reused = workspaces.acquire(make_backup(tmp_path, 'first'))
+    second, reused = workspaces.acquire(make_backup(tmp_path, 'second', streams=30))
+    third_path = make_backup(tmp_path, 'third', streams=10)
+    third_size = directory_size(WorkspaceManager(str(tmp_path / 'sizing')).acquire(third_path)[0])
+    # Using the first again makes the second the oldest
+    os.utime(os.path.join(second, COMPLETE_MARKER), (time.time() - 60, time.time() - 60))
+    workspaces.acquire(make_backup(tmp_path, 'first'))
+    for path in (first, first, second):
+        workspaces.release(path)
+
+    # Room for the first and the third, not for all three
+    workspaces.max_bytes = directory_size(first) + third_size
+    third, reused = workspaces.acquire(third_path)
+
+    assert [path for last_used, size, path in workspaces.workspaces()] == [first, third]
+    assert not os.path.exists(second)
+
+
+def test_leased_workspaces_and_extractions_are_never_evicted(tmp_path):
+    workspaces = WorkspaceManager(str(tmp_path / 'workspaces'), max_bytes=0)
+    first, reused = workspaces.acquire(make_backup(tmp_path, 'first'))
+    # Another job's extraction in progress
+    partial = os.path.join(workspaces.root, PARTIAL_PREFIX + 'other')
+    os.makedirs(partial)
+    with open(os.path.join(partial, 'PipePipe.db'), 'wb') as f:
+        f.write(b'\0' * 4096)
+
+    second, reused = workspaces.acquire(make_backup(tmp_path, 'second', streams=30))
+    assert os.path.exists(first) and os.path.exists(second) and os.path.exists(partial)
+
+    # Released workspaces go as soon as the next job makes room
+    workspaces.release(first)
+    workspaces.cleanup()
+    assert not os.path.exists(first)
+    assert os.path.exists(second) and os.path.exists(partial)
+
+
+def test_leases_of_other_processes_expire(tmp_path):
+    workspaces = WorkspaceManager(str(tmp_path / 'workspaces'), max_bytes=0)
+    path, reused = workspaces.acquire(make_backup(tmp_path, 'backup'))
+    workspaces.release(path)
+    lease = os.path.join(path, LEASE_PREFIX + '999999_crashed')
+    open(lease, 'w').close()
+
+    workspaces.cleanup()
+    assert os.path.exists(path)
+
+    old = time.time() - LEASE_MAX_AGE - 60
+    os.utime(lease, (old, old))
+    workspaces.cleanup()
+    assert not os.path.exists(path)
+
+
+def test_in_memory_database_is_written_back_on_save(tmp_path):
+    db_path = str(tmp_path / 'PipePipe.db')
+    build_database(db_path, streams=10)
+
+    conn = open_database(db_path)
+    assert is_in_memory(conn)
+    conn.execute("UPDATE streams SET title = 'Changed' WHERE uid = 1")
+    conn.commit()
+    # Nothing reaches the file before save_database()
+    assert sqlite3.connect(db_path).execute("SELECT title FROM streams WHERE uid = 1").fetchone()[0] != 'Changed'
+
+    save_database(conn, db_path)
+    conn.close()
+    assert sqlite3.connect(db_path).execute("SELECT title FROM streams WHERE uid = 1").fetchone()[0] == 'Changed'
+
+
+def test_large_database_is_opened_on_disk(tmp_path):
+    db_path = str(tmp_path / 'PipePipe.db')
+    build_database(db_path, streams=10)
+
+    conn = open_database(db_path, in_memory=False)
+    assert not is_in_memory(conn)
+    conn.close()